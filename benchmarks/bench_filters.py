@@ -0,0 +1,92 @@
+"""
+Сравнение векторного BatchFilter со скалярным PolyCopy.custom_filter.
+
+Запуск: python benchmarks/bench_filters.py
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+
+from src.core.PolyCopy import PolyCopy
+from src.core.PolyFilter import BatchFilter, REASONS
+from src.models.settings import Settings
+from src.models.position import Position
+
+
+def make_settings(n: int) -> list:
+    now = int(time.time())
+    return [
+        Settings(
+            exp_at=3600,
+            started_at=now,
+            first_bet=False,
+            min_amount=random.choice([1, 5, 10, 25, 50, 100]),
+            min_quote=random.choice([0.01, 0.1, 0.2, 0.3]),
+            max_quote=random.choice([0.7, 0.8, 0.9, 1.0]),
+        )
+        for _ in range(n)
+    ]
+
+
+def make_bets(n: int, markets: int = 40) -> list:
+    return [
+        Position(
+            slug=f"market-{i % markets}",
+            title=f"Market {i % markets}",
+            outcome=random.choice(["Yes", "No"]),
+            price=round(random.uniform(0.01, 0.99), 3),
+            token_id=str(i),
+            conditionId=f"0x{i % markets:064x}",
+            usdcSize=round(random.expovariate(1 / 40), 2),
+        )
+        for i in range(n)
+    ]
+
+
+async def run_scalar(settings: list, bets: list) -> np.ndarray:
+    reasons = np.zeros((len(settings), len(bets)), dtype=object)
+    for s, st in enumerate(settings):
+        copy = PolyCopy(st, scrapper=None)
+        for n, bet in enumerate(bets):
+            msg, _ = await copy.custom_filter(bet)
+            reasons[s, n] = msg
+    return reasons
+
+
+def run_batch(settings: list, bets: list) -> np.ndarray:
+    engine = BatchFilter(settings)
+    histories = [{} for _ in settings]
+    return engine.evaluate(bets, histories)
+
+
+def to_messages(codes: np.ndarray) -> np.ndarray:
+    return np.vectorize(REASONS.get, otypes=[object])(codes)
+
+
+def main():
+    random.seed(7)
+    print(f"{'подписчики':>10} {'ставки':>7} {'скаляр, мс':>11} {'NumPy, мс':>10} {'ускорение':>10}")
+    for n_subs, n_bets in [(10, 100), (100, 100), (100, 500), (1000, 500)]:
+        settings = make_settings(n_subs)
+        bets = make_bets(n_bets)
+
+        started = time.perf_counter()
+        scalar = asyncio.run(run_scalar(settings, bets))
+        scalar_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        batch = run_batch(settings, bets)
+        batch_ms = (time.perf_counter() - started) * 1000
+
+        assert (scalar == to_messages(batch)).all(), "результаты скалярного и векторного пути расходятся"
+        print(f"{n_subs:>10} {n_bets:>7} {scalar_ms:>11.1f} {batch_ms:>10.1f} {scalar_ms / batch_ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Память на монитор: N сессий PolySession (по 2 лидера) поверх общего
+пула кошельков и пользователей, как их собирает PolyEngine.build_monitor.
+
+Меряется прирост памяти (tracemalloc) от создания мониторов, без сети:
+живой клиент создается с готовыми API credentials.
+
+Запуск: python benchmarks/bench_memory.py
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from eth_account import Account
+
+from src.core.PolyClient import PolyClient
+from src.core.PolySession import PolySession
+from src.core.PolyCheckpoint import Checkpointer
+from src.models.settings import Settings
+
+LEADERS_PER_MONITOR = 2
+
+
+def make_settings() -> Settings:
+    return Settings(
+        exp_at=3600,
+        started_at=int(time.time()),
+        first_bet=False,
+        min_amount=5,
+        min_quote=0.05,
+        max_quote=0.95,
+        sl_percent=30,
+        tp_percent=50,
+    )
+
+
+def make_users(count: int) -> list:
+    users = []
+    for _ in range(count):
+        account = Account.create()
+        users.append((account.key.hex(), account.address))
+    return users
+
+
+def build(users: list, wallets: list, sessions: int) -> list:
+    monitors = []
+    for i in range(sessions):
+        private_key, funder = users[i % len(users)]
+        client = PolyClient.shared(private_key, funder, api_key="key", api_secret="c2VjcmV0", api_passphrase="pass")
+        session = PolySession(make_settings(), client=client)
+        for wallet in random.sample(wallets, LEADERS_PER_MONITOR):
+            session.add_leader(wallet, margin_amount=10)
+        session.attach_checkpoint(Checkpointer(None, f"monitor:{i}"))
+        monitors.append(session)
+    return monitors
+
+
+def measure(users_count: int, wallets_count: int, sessions: int):
+    users = make_users(users_count)
+    wallets = [Account.create().address for _ in range(wallets_count)]
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    monitors = build(users, wallets, sessions)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    assert len(monitors) == sessions
+    return used
+
+
+def main():
+    random.seed(7)
+    # Клиенты печатают при создании; для замера это шум
+    devnull = open(os.devnull, "w")
+
+    print(f"{'мониторы':>9} {'польз.':>7} {'кошельки':>9} {'всего, КБ':>10} {'байт/монитор':>13}")
+    for sessions, users_count, wallets_count in [
+        (10, 10, 20),
+        (100, 100, 50),
+        (1000, 1000, 200),
+        (1000, 100, 50),
+    ]:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            used = measure(users_count, wallets_count, sessions)
+        finally:
+            sys.stdout = stdout
+        print(f"{sessions:>9} {users_count:>7} {wallets_count:>9} {used / 1024:>10.0f} {used / sessions:>13.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(asyncio.sleep(0))
+    main()
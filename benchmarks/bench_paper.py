@@ -0,0 +1,105 @@
+"""
+Нагрузочный прогон движка копирования на бумажных счетах (PolyPaper).
+
+Много инстансов PolyCopy в одном процессе получают одни и те же ставки лидера,
+исполняют их по записанным стаканам, затем PolyRisk сверяет SL/TP по бумажным позициям.
+
+Запуск: python benchmarks/bench_paper.py [инстансов] [ставок]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import contextlib
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.core.PolyCopy import PolyCopy
+from src.core.PolyScrapper import PolyScrapper
+from src.core.PolyPaper import PolyPaper, RecordedBooks
+from src.models.settings import Settings
+from src.models.position import Position
+
+
+def make_book(mid: float, depth: int = 10) -> dict:
+    tick = 0.01
+    return {
+        "bids": [(round(mid - tick * (i + 1), 2), random.uniform(50, 500)) for i in range(depth)],
+        "asks": [(round(mid + tick * (i + 1), 2), random.uniform(50, 500)) for i in range(depth)],
+    }
+
+
+def make_bets(n: int, tokens: int) -> list:
+    now = int(time.time())
+    return [
+        Position(
+            slug=f"market-{i % tokens}",
+            title=f"Market {i % tokens}",
+            outcome="Yes",
+            price=round(random.uniform(0.15, 0.85), 2),
+            token_id=str(i % tokens),
+            conditionId=f"0xcond{i % tokens}",
+            usdcSize=round(random.uniform(1, 500), 2),
+            size=100.0,
+            timestamp=now,
+            transactionHash=f"0x{i:064x}",
+        )
+        for i in range(n)
+    ]
+
+
+async def bench(instances: int = 2000, n_bets: int = 50, tokens: int = 40):
+    random.seed(3)
+    books = RecordedBooks({str(t): [(0, make_book(random.uniform(0.2, 0.8)))] for t in range(tokens)})
+    bets = make_bets(n_bets, tokens)
+
+    tracemalloc.start()
+    copies = []
+    for i in range(instances):
+        settings = Settings(
+            exp_at=3600,
+            started_at=int(time.time()),
+            first_bet=False,
+            min_amount=random.choice([1, 10, 50]),
+            min_quote=0.1,
+            max_quote=0.9,
+            sl_percent=random.choice([10, 20, 30]),
+            tp_percent=random.choice([20, 50]),
+            fill_window=0,
+        )
+        paper = PolyPaper(books, balance=1000, slippage_bps=random.choice([0, 10, 50]))
+        copies.append(PolyCopy(settings, PolyScrapper(f"0xleader{i % 10}"), client=paper, margin_amount=5))
+    _, setup_peak = tracemalloc.get_traced_memory()
+
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        started = time.perf_counter()
+        now = time.time()
+        await asyncio.gather(*(copy.process_bets(bets, now) for copy in copies))
+        copy_elapsed = time.perf_counter() - started
+
+        # Рынок уходит вниз: часть позиций должна закрыться по SL
+        for t in range(tokens):
+            books.set_book(str(t), make_book(0.12), ts=1)
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(copy.risk.check() for copy in copies))
+        risk_elapsed = time.perf_counter() - started
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    trades = sum(copy.stats.trades_ok for copy in copies)
+    closed = sum(1 for result in results for _, ok, _ in result if ok)
+    pnl = sum(copy.client.summary()["realized_pnl"] for copy in copies)
+
+    print(f"Инстансов: {instances}, ставок лидера: {n_bets}")
+    print(f"Копирование: {instances * n_bets / copy_elapsed:,.0f} ставок/с, сделок {trades}")
+    print(f"SL/TP: {risk_elapsed:.2f}s, закрыто позиций {closed}, реализованный PnL ${pnl:,.2f}")
+    print(f"Память: ~{setup_peak / instances / 1024:.1f} КБ на инстанс, пик {peak / 1024 / 1024:.1f} МБ")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    asyncio.run(bench(*args))
@@ -0,0 +1,90 @@
+"""
+Пропускная способность WhaleFeed.ingest на синтетической ленте сделок
+и точность оценки уникальных кошельков (HyperLogLog) по рынкам.
+
+Запуск: python benchmarks/bench_whales.py
+"""
+import os
+import sys
+import time
+import random
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.core.PolyWhales import WhaleFeed
+
+
+def make_tape(n: int, markets: int, wallets: int, start_ts: int) -> list:
+    tape = []
+    for i in range(n):
+        m = int(random.paretovariate(1.2)) % markets
+        tape.append({
+            "proxyWallet": f"0x{random.randrange(wallets):040x}",
+            "side": random.choice(("BUY", "SELL")),
+            "asset": f"{m}{random.randrange(2)}",
+            "conditionId": f"0xcond{m}",
+            "size": round(random.lognormvariate(3, 1.5), 2),
+            "price": round(random.uniform(0.01, 0.99), 3),
+            "timestamp": start_ts + i // 50,
+            "title": f"Market {m}",
+            "slug": f"market-{m}",
+            "transactionHash": f"0x{i:064x}",
+        })
+    # API отдает новые сделки первыми
+    tape.reverse()
+    return tape
+
+
+def bench(n_trades: int = 200_000, markets: int = 3000, wallets: int = 50_000, batch: int = 500):
+    random.seed(7)
+    tape = make_tape(n_trades, markets, wallets, int(time.time()))
+
+    batches = [tape[i:i + batch] for i in range(len(tape) - batch, -1, -batch)]
+
+    def run():
+        feed = WhaleFeed(max_markets=markets)
+        rnd = random.Random(11)
+        for sub in range(100):
+            chosen = {f"market-{rnd.randrange(markets)}" for _ in range(20)}
+            feed.subscribe(sub, lambda *_: None, threshold=rnd.choice([500, 1000, 5000]), markets=chosen)
+        feed.subscribe(1000, lambda *_: None, threshold=20000)
+
+        alerts = 0
+        for chunk in batches:
+            alerts += len(feed.ingest(chunk))
+            # Повторная выдача той же страницы (как при частом опросе) должна отсекаться
+            alerts += len(feed.ingest(chunk))
+        return feed, alerts
+
+    started = time.perf_counter()
+    feed, alerts = run()
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"Сделок: {feed.trades_ingested} (подано {2 * n_trades}), алертов: {alerts}")
+    print(f"Время: {elapsed:.2f}s, {2 * n_trades / elapsed:,.0f} строк ленты/с")
+    print(f"Пик памяти ingest: {peak / 1024 / 1024:.1f} МБ, рынков: {len(feed.markets)}")
+
+    exact = {}
+    for trade in tape:
+        exact.setdefault(trade["conditionId"], set()).add(trade["proxyWallet"])
+
+    errors = []
+    for key, stats in feed.markets.items():
+        real = len(exact[key])
+        if real >= 100:
+            errors.append(abs(stats.wallets.count() - real) / real)
+    if errors:
+        print(f"HLL: рынков с >=100 кошельков: {len(errors)}, "
+              f"средняя ошибка {sum(errors) / len(errors):.1%}, макс. {max(errors):.1%}")
+
+    assert feed.trades_ingested == n_trades
+
+
+if __name__ == "__main__":
+    bench()
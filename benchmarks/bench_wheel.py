@@ -0,0 +1,108 @@
+"""
+Стоимость тиков мониторов: sleep-цикл на монитор против общего TimingWheel.
+
+Каждый монитор раз в секунду делает опрос: пустой (нечего ждать) или
+с одной приостановкой (как запрос в сеть). Для обоих подходов меряется
+одно и то же: CPU процесса за окно и число колбэков, поставленных
+в цикл событий (call_soon + call_at), в пересчете на тик монитора.
+
+Запуск: python benchmarks/bench_wheel.py
+"""
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.core.PolyWheel import TimingWheel
+
+WINDOW = 3.0
+INTERVAL = 1.0
+
+
+class CountingLoop(asyncio.SelectorEventLoop):
+    """Цикл событий, считающий поставленные колбэки."""
+
+    def __init__(self):
+        super().__init__()
+        self.callbacks = 0
+
+    def call_soon(self, *args, **kwargs):
+        self.callbacks += 1
+        return super().call_soon(*args, **kwargs)
+
+    def call_at(self, *args, **kwargs):
+        self.callbacks += 1
+        return super().call_at(*args, **kwargs)
+
+
+async def idle_poll():
+    return None
+
+
+async def io_poll():
+    await asyncio.sleep(0)
+
+
+async def sleep_loops(monitors: int, poll) -> int:
+    ticks = 0
+
+    async def monitor():
+        nonlocal ticks
+        while True:
+            await poll()
+            ticks += 1
+            await asyncio.sleep(INTERVAL)
+
+    tasks = [asyncio.create_task(monitor()) for _ in range(monitors)]
+    await asyncio.sleep(WINDOW)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return ticks
+
+
+async def wheel_jobs(monitors: int, poll) -> int:
+    wheel = TimingWheel()
+    ticks = 0
+
+    async def job():
+        nonlocal ticks
+        await poll()
+        ticks += 1
+
+    jobs = [wheel.every(INTERVAL, job, jitter=True) for _ in range(monitors)]
+    await asyncio.sleep(WINDOW)
+    for periodic in jobs:
+        await periodic.stop()
+    return ticks
+
+
+def measure(scenario, monitors: int, poll):
+    with asyncio.Runner(loop_factory=CountingLoop) as runner:
+        loop = runner.get_loop()
+        started = time.process_time()
+        ticks = runner.run(scenario(monitors, poll))
+        cpu = (time.process_time() - started) * 1000
+        return cpu, loop.callbacks / max(ticks, 1), cpu * 1000 / max(ticks, 1)
+
+
+def main():
+    for title, poll in (("пустой опрос", idle_poll), ("опрос с ожиданием", io_poll)):
+        print(f"\n{title}")
+        print(
+            f"{'мониторы':>9} {'sleep, мс CPU':>14} {'колбэков/тик':>13} {'мкс/тик':>8}"
+            f" {'колесо, мс CPU':>15} {'колбэков/тик':>13} {'мкс/тик':>8}"
+        )
+        for monitors in [100, 1000, 5000, 20000]:
+            loop_ms, loop_cb, loop_us = measure(sleep_loops, monitors, poll)
+            wheel_ms, wheel_cb, wheel_us = measure(wheel_jobs, monitors, poll)
+            print(
+                f"{monitors:>9} {loop_ms:>14.1f} {loop_cb:>13.2f} {loop_us:>8.1f}"
+                f" {wheel_ms:>15.1f} {wheel_cb:>13.2f} {wheel_us:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -21,9 +21,29 @@ class DBSettings:
 
 class Config:
     BOT_TOKEN: str = os.getenv("BOT_TOKEN")
-    ATTEMPS: int = 3
+    ATTEMPTS: int = 3
     DELAY: int = 15
 
+    # Лимиты супервизора мониторов
+    MAX_MONITORS: int = int(os.getenv("MAX_MONITORS", 500))
+    MAX_MONITORS_PER_USER: int = int(os.getenv("MAX_MONITORS_PER_USER", 1))
+
+    # Процессы-воркеры движка мониторинга (0 - мониторы в процессе бота)
+    ENGINE_WORKERS: int = int(os.getenv("ENGINE_WORKERS", 0))
+
+    # Дедлайн обработки апдейта Telegram в секундах (все сетевые вызовы хендлера)
+    UPDATE_DEADLINE: float = float(os.getenv("UPDATE_DEADLINE", 30))
+
+    # Пул потоков для синхронного py_clob_client (подпись и отправка ордеров)
+    CLOB_THREADS: int = int(os.getenv("CLOB_THREADS", 8))
+    CLOB_THREADS_PER_USER: int = int(os.getenv("CLOB_THREADS_PER_USER", 2))
+
+    # Сколько секунд без обращений держать готовый клиент пользователя в пуле
+    CLIENT_IDLE_TTL: float = float(os.getenv("CLIENT_IDLE_TTL", 1800))
+
+    # Бюджет плавной остановки в секундах (дренаж мониторов и очередей, закрытие соединений)
+    SHUTDOWN_TIMEOUT: float = float(os.getenv("SHUTDOWN_TIMEOUT", 30))
+
     # Тип БД: "sqlite" или "postgresql"
     DATABASE_TYPE: str = os.getenv("DATABASE_TYPE", "sqlite")
     
@@ -31,11 +31,9 @@ class Database:
             self.sqlalchemy_manager = SQLAlchemyManager()
             self.sqlalchemy_manager.init()
 
-            session = self.sqlalchemy_manager.get_session()
-
             self.repo = UsersFactory.create(
                 DatabaseType.SQLALCHEMY, 
-                session
+                self.sqlalchemy_manager.session_maker
             )
 
             db_url = Config.get_database_url()
@@ -73,4 +73,37 @@ class UsersBase(ABC):
     async def get_api_credentials(
         self, tg_id: int
     ) -> Tuple[Optional[str], Optional[str], Optional[str]]:
-        ...
\ No newline at end of file
+        ...
+
+    @abstractmethod
+    async def append_checkpoint(self, monitor_id: str, entries: List[Tuple[str, str, Optional[str]]]) -> bool:
+        """Дописывает дельты состояния монитора: (kind, key, value JSON или None - удаление)."""
+        ...
+
+    @abstractmethod
+    async def load_checkpoint(self, monitor_id: str) -> List[Dict]:
+        """Все записи монитора в порядке записи: dict(kind, key, value)."""
+        ...
+
+    @abstractmethod
+    async def compact_checkpoint(self, monitor_id: str, entries: List[Tuple[str, str, Optional[str]]]) -> bool:
+        """Атомарно заменяет журнал монитора снимком entries."""
+        ...
+
+    @abstractmethod
+    async def delete_checkpoint(self, monitor_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def save_monitor(self, monitor_id: str, tg_id: int, definition: Dict, expires_at: float) -> bool:
+        """Сохраняет (или заменяет) определение монитора для восстановления после рестарта."""
+        ...
+
+    @abstractmethod
+    async def get_active_monitors(self, now: float) -> List[Dict]:
+        """Неистекшие мониторы: dict(monitor_id, tg_id, definition, expires_at)."""
+        ...
+
+    @abstractmethod
+    async def delete_monitor(self, monitor_id: str) -> bool:
+        ...
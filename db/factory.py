@@ -18,7 +18,7 @@ class UsersFactory:
         
         Args:
             db_type: Тип базы данных
-            connection: Подключение к БД (AsyncDatabaseManager или AsyncSession)
+            connection: Подключение к БД (AsyncDatabaseManager или async_sessionmaker)
             
         Returns:
             Экземпляр UsersBase (UsersSQL или UsersORM)
@@ -1,18 +1,20 @@
+import time
 import logging
 from typing import Dict, List, Optional, Tuple
 
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy import select, update, delete, insert, func
 
-from db.sqlalchemy.models import Users
+from db.sqlalchemy.models import Users, MonitorCheckpoints, Monitors
 from db.models import UserModel
 
 from db.database_protocol import UsersBase
 from db.models import to_user_model
 
 class UsersORM(UsersBase):
-    def __init__(self, session: AsyncSession):
-        self.session = session
+    def __init__(self, session_maker: async_sessionmaker):
+        self.session_maker = session_maker
+        self.session: AsyncSession = session_maker()
         self.logger = logging.getLogger(self.__class__.__name__)
 
     async def create_tables(self) -> bool:
@@ -230,3 +232,108 @@ class UsersORM(UsersBase):
         except Exception as e:
             self.logger.error(f"Error getting API credentials for {tg_id}: {e}")
             return None, None, None
+
+    def _checkpoint_rows(self, monitor_id: str, entries: List[Tuple[str, str, Optional[str]]]) -> List[Dict]:
+        now = time.time()
+        return [
+            {"monitor_id": monitor_id, "kind": kind, "key": key, "value": value, "created_at": now}
+            for kind, key, value in entries
+        ]
+
+    async def append_checkpoint(self, monitor_id: str, entries: List[Tuple[str, str, Optional[str]]]) -> bool:
+        # Чекпоинты пишут все мониторы параллельно: своя сессия на операцию,
+        # AsyncSession не допускает одновременных операций
+        try:
+            if entries:
+                async with self.session_maker.begin() as session:
+                    await session.execute(
+                        insert(MonitorCheckpoints), self._checkpoint_rows(monitor_id, entries)
+                    )
+            return True
+        except Exception as e:
+            self.logger.error(f"Error appending checkpoint {monitor_id}: {e}")
+            return False
+
+    async def load_checkpoint(self, monitor_id: str) -> List[Dict]:
+        try:
+            async with self.session_maker() as session:
+                result = await session.execute(
+                    select(MonitorCheckpoints.kind, MonitorCheckpoints.key, MonitorCheckpoints.value)
+                    .where(MonitorCheckpoints.monitor_id == monitor_id)
+                    .order_by(MonitorCheckpoints.id)
+                )
+                return [{"kind": row.kind, "key": row.key, "value": row.value} for row in result]
+        except Exception as e:
+            self.logger.error(f"Error loading checkpoint {monitor_id}: {e}")
+            return []
+
+    async def compact_checkpoint(self, monitor_id: str, entries: List[Tuple[str, str, Optional[str]]]) -> bool:
+        try:
+            async with self.session_maker.begin() as session:
+                await session.execute(
+                    delete(MonitorCheckpoints).where(MonitorCheckpoints.monitor_id == monitor_id)
+                )
+                if entries:
+                    await session.execute(
+                        insert(MonitorCheckpoints), self._checkpoint_rows(monitor_id, entries)
+                    )
+            return True
+        except Exception as e:
+            self.logger.error(f"Error compacting checkpoint {monitor_id}: {e}")
+            return False
+
+    async def delete_checkpoint(self, monitor_id: str) -> bool:
+        try:
+            async with self.session_maker.begin() as session:
+                await session.execute(
+                    delete(MonitorCheckpoints).where(MonitorCheckpoints.monitor_id == monitor_id)
+                )
+            return True
+        except Exception as e:
+            self.logger.error(f"Error deleting checkpoint {monitor_id}: {e}")
+            return False
+
+    async def save_monitor(self, monitor_id: str, tg_id: int, definition: Dict, expires_at: float) -> bool:
+        # Запуск, остановка и восстановление мониторов идут параллельно: сессия на операцию
+        try:
+            async with self.session_maker.begin() as session:
+                await session.merge(Monitors(
+                    monitor_id=monitor_id,
+                    tg_id=tg_id,
+                    definition=definition,
+                    expires_at=expires_at,
+                ))
+            return True
+        except Exception as e:
+            self.logger.error(f"Error saving monitor {monitor_id}: {e}")
+            return False
+
+    async def get_active_monitors(self, now: float) -> List[Dict]:
+        try:
+            async with self.session_maker() as session:
+                result = await session.execute(
+                    select(Monitors).where(Monitors.expires_at > now)
+                )
+                return [
+                    {
+                        "monitor_id": m.monitor_id,
+                        "tg_id": m.tg_id,
+                        "definition": m.definition,
+                        "expires_at": m.expires_at,
+                    }
+                    for m in result.scalars().all()
+                ]
+        except Exception as e:
+            self.logger.error(f"Error getting active monitors: {e}")
+            return []
+
+    async def delete_monitor(self, monitor_id: str) -> bool:
+        try:
+            async with self.session_maker.begin() as session:
+                await session.execute(
+                    delete(Monitors).where(Monitors.monitor_id == monitor_id)
+                )
+            return True
+        except Exception as e:
+            self.logger.error(f"Error deleting monitor {monitor_id}: {e}")
+            return False
@@ -1,6 +1,6 @@
 from typing import Annotated
 from sqlalchemy.ext.mutable import MutableList
-from sqlalchemy import Integer, JSON, String
+from sqlalchemy import Float, Index, Integer, JSON, String, Text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 strnullable = Annotated[str | None, mapped_column(String, nullable=True)]
@@ -20,4 +20,27 @@ class Users(Base):
     private_key: Mapped[strnullable] 
     api_key: Mapped[strnullable] 
     api_secret: Mapped[strnullable] 
-    api_passphrase: Mapped[strnullable] 
\ No newline at end of file
+    api_passphrase: Mapped[strnullable] 
+
+
+class MonitorCheckpoints(Base):
+    """Журнал состояния мониторов: дельты (kind, key, value) и периодические снимки."""
+    __tablename__ = "monitor_checkpoints"
+    __table_args__ = (Index("ix_monitor_checkpoints_monitor_id", "monitor_id", "id"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    monitor_id: Mapped[str] = mapped_column(String, nullable=False)
+    kind: Mapped[str] = mapped_column(String, nullable=False)
+    key: Mapped[str] = mapped_column(String, nullable=False)
+    value: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[float] = mapped_column(Float, nullable=False)
+
+
+class Monitors(Base):
+    """Определения запущенных мониторов (восстанавливаются после рестарта)."""
+    __tablename__ = "monitors"
+
+    monitor_id: Mapped[str] = mapped_column(String, primary_key=True)
+    tg_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    definition: Mapped[dict] = mapped_column(JSON, nullable=False)
+    expires_at: Mapped[float] = mapped_column(Float, nullable=False)
@@ -1,4 +1,5 @@
 import json
+import time
 import logging
 from typing import Dict, List, Optional, Tuple
 from db.sqlite.manager import AsyncDatabaseManager
@@ -18,7 +19,16 @@ from db.sqlite.schemas import (
     delete_user_sql,
     count_users_sql,
     user_exists_sql,
-    select_user_address_sql
+    select_user_address_sql,
+    create_checkpoints_table_sql,
+    create_checkpoints_index_sql,
+    insert_checkpoint_sql,
+    select_checkpoint_sql,
+    delete_checkpoint_sql,
+    create_monitors_table_sql,
+    upsert_monitor_sql,
+    select_active_monitors_sql,
+    delete_monitor_sql
 )
 from db.database_protocol import UsersBase
 from db.models import UserModel, to_user_model
@@ -31,6 +41,9 @@ class UsersSQL(UsersBase):
     async def create_tables(self) -> bool:
         try:
             await self.db.execute(create_users_table_sql())
+            await self.db.execute(create_checkpoints_table_sql())
+            await self.db.execute(create_checkpoints_index_sql())
+            await self.db.execute(create_monitors_table_sql())
             return True
         except Exception as e:
             self.logger.error(f"Error creating tables: {e}")
@@ -224,4 +237,78 @@ class UsersSQL(UsersBase):
             return None, None, None
         except Exception as e:
             self.logger.error(f"Error getting API credentials for {tg_id}: {e}")
-            return None, None, None
\ No newline at end of file
+            return None, None, None
+
+    def _checkpoint_rows(self, monitor_id: str, entries: List[Tuple[str, str, Optional[str]]]) -> List[Dict]:
+        now = time.time()
+        return [
+            {"monitor_id": monitor_id, "kind": kind, "key": key, "value": value, "created_at": now}
+            for kind, key, value in entries
+        ]
+
+    async def append_checkpoint(self, monitor_id: str, entries: List[Tuple[str, str, Optional[str]]]) -> bool:
+        try:
+            await self.db.execute_batch([
+                (insert_checkpoint_sql(), self._checkpoint_rows(monitor_id, entries)),
+            ])
+            return True
+        except Exception as e:
+            self.logger.error(f"Error appending checkpoint {monitor_id}: {e}")
+            return False
+
+    async def load_checkpoint(self, monitor_id: str) -> List[Dict]:
+        try:
+            return await self.db.fetchall(select_checkpoint_sql(), {"monitor_id": monitor_id})
+        except Exception as e:
+            self.logger.error(f"Error loading checkpoint {monitor_id}: {e}")
+            return []
+
+    async def compact_checkpoint(self, monitor_id: str, entries: List[Tuple[str, str, Optional[str]]]) -> bool:
+        try:
+            await self.db.execute_batch([
+                (delete_checkpoint_sql(), [{"monitor_id": monitor_id}]),
+                (insert_checkpoint_sql(), self._checkpoint_rows(monitor_id, entries)),
+            ])
+            return True
+        except Exception as e:
+            self.logger.error(f"Error compacting checkpoint {monitor_id}: {e}")
+            return False
+
+    async def delete_checkpoint(self, monitor_id: str) -> bool:
+        try:
+            await self.db.execute(delete_checkpoint_sql(), {"monitor_id": monitor_id})
+            return True
+        except Exception as e:
+            self.logger.error(f"Error deleting checkpoint {monitor_id}: {e}")
+            return False
+
+    async def save_monitor(self, monitor_id: str, tg_id: int, definition: Dict, expires_at: float) -> bool:
+        try:
+            await self.db.execute(upsert_monitor_sql(), {
+                "monitor_id": monitor_id,
+                "tg_id": tg_id,
+                "definition": json.dumps(definition),
+                "expires_at": expires_at,
+            })
+            return True
+        except Exception as e:
+            self.logger.error(f"Error saving monitor {monitor_id}: {e}")
+            return False
+
+    async def get_active_monitors(self, now: float) -> List[Dict]:
+        try:
+            rows = await self.db.fetchall(select_active_monitors_sql(), {"now": now})
+            for row in rows:
+                row["definition"] = json.loads(row["definition"])
+            return rows
+        except Exception as e:
+            self.logger.error(f"Error getting active monitors: {e}")
+            return []
+
+    async def delete_monitor(self, monitor_id: str) -> bool:
+        try:
+            await self.db.execute(delete_monitor_sql(), {"monitor_id": monitor_id})
+            return True
+        except Exception as e:
+            self.logger.error(f"Error deleting monitor {monitor_id}: {e}")
+            return False
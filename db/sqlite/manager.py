@@ -1,11 +1,15 @@
+import asyncio
 import aiosqlite
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from utils.customprint import CustomPrint
 
 class AsyncDatabaseManager:
     def __init__(self, db_path: str):
         self.db_path = db_path
         self._conn: Optional[aiosqlite.Connection] = None
+        # Соединение одно на процесс: транзакции записи идут по очереди,
+        # иначе rollback одного вызова отменяет незакоммиченные строки другого
+        self._write_lock = asyncio.Lock()
 
     async def connect(self):
         if self._conn is None:
@@ -24,11 +28,16 @@ class AsyncDatabaseManager:
 
     async def execute(self, query: str, params: Dict = None):
         await self.connect()
-        if params:
-            await self._conn.execute(query, params)
-        else:
-            await self._conn.execute(query)
-        await self._conn.commit()
+        async with self._write_lock:
+            try:
+                if params:
+                    await self._conn.execute(query, params)
+                else:
+                    await self._conn.execute(query)
+                await self._conn.commit()
+            except Exception:
+                await self._conn.rollback()
+                raise
 
     async def fetchall(self, query: str, params: Dict = None) -> List[Dict]:
         await self.connect()
@@ -40,4 +49,17 @@ class AsyncDatabaseManager:
         await self.connect()
         cursor = await self._conn.execute(query, params or {})
         row = await cursor.fetchone()
-        return dict(row) if row else None
\ No newline at end of file
+        return dict(row) if row else None
+
+    async def execute_batch(self, statements: List[Tuple[str, List[Dict]]]):
+        """Несколько executemany в одной транзакции (один commit); запросы без строк пропускаются."""
+        await self.connect()
+        async with self._write_lock:
+            try:
+                for query, params in statements:
+                    if params:
+                        await self._conn.executemany(query, params)
+                await self._conn.commit()
+            except Exception:
+                await self._conn.rollback()
+                raise
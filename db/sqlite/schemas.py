@@ -87,3 +87,61 @@ def get_api_creds() -> str:
     FROM users 
     WHERE tg_id = :tg_id
     """
+
+
+def create_checkpoints_table_sql() -> str:
+    return """
+    CREATE TABLE IF NOT EXISTS monitor_checkpoints (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        monitor_id TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT,
+        created_at REAL NOT NULL
+    )
+    """
+
+
+def create_checkpoints_index_sql() -> str:
+    return "CREATE INDEX IF NOT EXISTS ix_monitor_checkpoints_monitor_id ON monitor_checkpoints (monitor_id, id)"
+
+
+def insert_checkpoint_sql() -> str:
+    return """
+    INSERT INTO monitor_checkpoints (monitor_id, kind, key, value, created_at)
+    VALUES (:monitor_id, :kind, :key, :value, :created_at)
+    """
+
+
+def select_checkpoint_sql() -> str:
+    return "SELECT kind, key, value FROM monitor_checkpoints WHERE monitor_id = :monitor_id ORDER BY id"
+
+
+def delete_checkpoint_sql() -> str:
+    return "DELETE FROM monitor_checkpoints WHERE monitor_id = :monitor_id"
+
+
+def create_monitors_table_sql() -> str:
+    return """
+    CREATE TABLE IF NOT EXISTS monitors (
+        monitor_id TEXT PRIMARY KEY,
+        tg_id INTEGER NOT NULL,
+        definition TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    """
+
+
+def upsert_monitor_sql() -> str:
+    return """
+    INSERT OR REPLACE INTO monitors (monitor_id, tg_id, definition, expires_at)
+    VALUES (:monitor_id, :tg_id, :definition, :expires_at)
+    """
+
+
+def select_active_monitors_sql() -> str:
+    return "SELECT * FROM monitors WHERE expires_at > :now"
+
+
+def delete_monitor_sql() -> str:
+    return "DELETE FROM monitors WHERE monitor_id = :monitor_id"
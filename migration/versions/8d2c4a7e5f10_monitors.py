@@ -0,0 +1,34 @@
+"""monitors
+
+Revision ID: 8d2c4a7e5f10
+Revises: 3b9e1f6c2a47
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2c4a7e5f10'
+down_revision: Union[str, Sequence[str], None] = '3b9e1f6c2a47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('monitors',
+    sa.Column('monitor_id', sa.String(), nullable=False),
+    sa.Column('tg_id', sa.Integer(), nullable=False),
+    sa.Column('definition', sa.JSON(), nullable=False),
+    sa.Column('expires_at', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('monitor_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('monitors')
@@ -1,18 +1,38 @@
-import asyncio
 import logging
-from typing import Dict
 
 from aiogram import Bot, Dispatcher
 from aiogram.types import BotCommand
 
 from data.config import Config
 from db.database import database
+from src.core.PolySupervisor import MonitorSupervisor
+from src.core.PolyWorkers import EnginePool
+from src.core.PolyScrapper import PolyScrapper
+from src.core.PolyOrders import clob_pool
+from src.core.PolyClient import client_pool
+from src.core.PolyMarkets import market_meta
+from src.core.PolyShutdown import CLOSE_RESERVE, Shutdown
+from src.core.PolyExits import exits
+from src.core.PolyConsensus import consensus
+from src.core.PolyWhales import whales
 
 logging.basicConfig(level=logging.INFO)
 
 bot = Bot(token=Config.BOT_TOKEN)
 dp = Dispatcher()
-active_monitors: Dict[int, asyncio.Task] = {}
+
+# Мониторы в процессе бота или в процессах-воркерах (ENGINE_WORKERS > 0)
+if Config.ENGINE_WORKERS > 0:
+    engine = EnginePool(
+        Config.ENGINE_WORKERS,
+        max_monitors=Config.MAX_MONITORS,
+        max_per_user=Config.MAX_MONITORS_PER_USER,
+    )
+else:
+    engine = MonitorSupervisor(
+        max_monitors=Config.MAX_MONITORS,
+        max_per_user=Config.MAX_MONITORS_PER_USER,
+    )
 
 
 async def set_commands(bot: Bot):
@@ -20,6 +40,7 @@ async def set_commands(bot: Bot):
     commands = [
         BotCommand(command="start", description="Главное меню"),
         BotCommand(command="copy_trade", description="Отслеживать и повторять новые сделки кошельков"),
+        BotCommand(command="whales", description="Алерты о крупных сделках на рынках"),
     ]
     await bot.set_my_commands(commands)
 
@@ -30,13 +51,27 @@ async def main():
         
         await set_commands(bot)
         
-        from src.bot.handlers import start, positions, leaderboard, copy_trade, charts
+        from src.bot.handlers import start, positions, leaderboard, copy_trade, charts, whales
+        from src.bot.utils.deadline import DeadlineMiddleware
+        
+        dp.update.outer_middleware(DeadlineMiddleware(Config.UPDATE_DEADLINE))
         
         dp.include_router(start.router)
         dp.include_router(positions.router)
         dp.include_router(leaderboard.router)
         dp.include_router(copy_trade.router)
         dp.include_router(charts.router)
+        dp.include_router(whales.router)
+        
+        # Мониторы, работавшие до рестарта, поднимаются из БД
+        from src.bot.utils.monitoring import BotNotifier
+        from src.core.PolyEngine import monitor_factory
+        notifier = BotNotifier(bot)
+        if isinstance(engine, EnginePool):
+            engine.setup(database.get(), notifier)
+        else:
+            engine.setup(database.get(), monitor_factory(database.get(), notifier, engine))
+        await engine.restore()
         
         print("🚀 Бот запущен")
         await dp.start_polling(bot)
@@ -45,5 +80,28 @@ async def main():
         logging.exception("❌ Критическая ошибка в боте:")
         
     finally:
-        await bot.session.close()
-        await database.close()
\ No newline at end of file
+        await graceful_shutdown()
+
+
+async def graceful_shutdown():
+    """
+    Плавная остановка: polling уже остановлен, дальше по порядку
+    прием -> мониторы (начатые ордера и уведомления дорабатывают, чекпоинты
+    дописываются) -> очереди выходов, сигналов и уведомлений -> соединения.
+    Бот и БД закрываются последними: через них уходят уведомления и чекпоинты.
+    """
+    shutdown = Shutdown(Config.SHUTDOWN_TIMEOUT)
+    await shutdown.step("лента китов", whales.stop, timeout=CLOSE_RESERVE)
+    await shutdown.monitors(engine.shutdown)
+    await shutdown.drain(exits.inflight, CLOSE_RESERVE)
+    await shutdown.drain(consensus.inflight, CLOSE_RESERVE)
+    if isinstance(engine, EnginePool):
+        await shutdown.drain(engine.notifications, CLOSE_RESERVE)
+    await shutdown.drain(whales.inflight, CLOSE_RESERVE)
+    await shutdown.drain(client_pool.warming, CLOSE_RESERVE)
+    await shutdown.step("пул CLOB", clob_pool.close, timeout=CLOSE_RESERVE)
+    await shutdown.step("HTTP-сессии", PolyScrapper.close_shared, timeout=CLOSE_RESERVE)
+    await shutdown.step("метаданные CLOB", market_meta.close, timeout=CLOSE_RESERVE)
+    await shutdown.step("сессия бота", bot.session.close, timeout=CLOSE_RESERVE)
+    await shutdown.step("БД", database.close, timeout=CLOSE_RESERVE)
+    shutdown.report("Бот остановлен")
\ No newline at end of file
@@ -3,5 +3,6 @@ from . import positions
 from . import leaderboard
 from . import charts
 from . import copy_trade
+from . import whales
 
-__all__ = ['start', 'positions', 'leaderboard', 'charts', 'copy_trade']
\ No newline at end of file
+__all__ = ['start', 'positions', 'leaderboard', 'charts', 'copy_trade', 'whales']
\ No newline at end of file
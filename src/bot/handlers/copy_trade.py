@@ -1,6 +1,5 @@
-import asyncio
 from itertools import islice
-from src.bot.cfg import active_monitors, database
+from src.bot.cfg import database, engine
 
 from aiogram.filters import Command
 from aiogram import Router, F, types
@@ -15,12 +14,19 @@ from src.bot.keyboards import (
 )
 
 from src.bot.utils.monitoring import start_monitoring_task
+from src.core.PolyEngine import monitor_id
 from src.core.PolyScrapper import PolyScrapper
+from src.core.PolyRules import compile_rule, RuleError
 from utils.formatters import format_money, format_pnl
 
 router = Router()
 
 
+def _code_span(text: str) -> str:
+    """Текст для `...` в Markdown: обратную кавычку внутри моноширинного блока не экранировать, она заменяется на похожий символ."""
+    return text.replace("`", "ʼ")
+
+
 @router.message(Command('copy_trade'))
 async def cmd_copy_trade(message: types.Message):
     """Команда /copy_trade"""
@@ -473,7 +479,7 @@ async def start_copy_trade_flow(callback: CallbackQuery, state: FSMContext):
     
     await state.update_data(
         track_addresses=track_addresses,
-        selected_wallet=None,
+        selected_wallets=[],
         duration=3600,
         min_amount=5,
         first_bet=False,
@@ -481,7 +487,10 @@ async def start_copy_trade_flow(callback: CallbackQuery, state: FSMContext):
         max_quote=1.0,
         margin_amount=10,
         sl_percent=30,
-        tp_percent=50
+        tp_percent=50,
+        rule=None,
+        consensus_k=None,
+        paper=False
     )
     
     await show_quick_setup_menu(callback.message, state)
@@ -492,7 +501,7 @@ async def show_quick_setup_menu(message, state: FSMContext):
     """Показывает меню быстрой настройки"""
     data = await state.get_data()
     
-    selected_wallet = data.get("selected_wallet")
+    selected_wallets = data.get("selected_wallets", [])
     duration = data.get("duration", 3600)
     min_amount = data.get("min_amount", 5)
     first_bet = data.get("first_bet", False)
@@ -501,12 +510,20 @@ async def show_quick_setup_menu(message, state: FSMContext):
     margin_amount = data.get("margin_amount", 10)
     sl_percent = data.get("sl_percent", 30)
     tp_percent = data.get("tp_percent", 50)
+    rule = data.get("rule")
+    consensus_k = data.get("consensus_k")
+    paper = data.get("paper", False)
     
     duration_text = f"{duration // 60} мин" if duration < 3600 else f"{duration // 3600} ч"
     first_bet_text = "✅ Да" if first_bet else "❌ Нет"
+    rule_text = rule if rule else "нет"
+    rule_button = rule_text if len(rule_text) <= 30 else rule_text[:27] + "..."
+    consensus_text = f"{consensus_k} из {len(data.get('track_addresses', []))}" if consensus_k else "выкл"
+    paper_text = "🧪 бумажный" if paper else "реальный"
     
     wallet_text = "Не выбран"
-    if selected_wallet:
+    if len(selected_wallets) == 1:
+        selected_wallet = selected_wallets[0]
         try:
             scrapper = PolyScrapper(selected_wallet)
             lead_data = await scrapper.check_leaderboard()
@@ -514,15 +531,20 @@ async def show_quick_setup_menu(message, state: FSMContext):
             wallet_text = f"{name} ({selected_wallet[:6]}...)"
         except:
             wallet_text = f"{selected_wallet[:6]}...{selected_wallet[-4:]}"
+    elif selected_wallets:
+        wallet_text = f"{len(selected_wallets)} шт."
     
     kb = InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text=f"👛 Кошелек: {wallet_text}", callback_data="quick_select_wallet")],
+            [InlineKeyboardButton(text=f"👛 Кошельки: {wallet_text}", callback_data="quick_select_wallet")],
             [InlineKeyboardButton(text=f"⏱ Длительность: {duration_text}", callback_data="quick_duration")],
             [InlineKeyboardButton(text=f"💰 Мин. сумма: ${min_amount}", callback_data="quick_min_amount")],
             [InlineKeyboardButton(text=f"🎯 Первые ставки: {first_bet_text}", callback_data="quick_first_bet")],
             [InlineKeyboardButton(text=f"📊 Котировки: {min_quote} - {max_quote}", callback_data="quick_quotes")],
+            [InlineKeyboardButton(text=f"🧩 Правило: {rule_button}", callback_data="quick_rule")],
+            [InlineKeyboardButton(text=f"🤝 Консенсус: {consensus_text}", callback_data="quick_consensus")],
             [InlineKeyboardButton(text=f"💵 Маржа: ${margin_amount}", callback_data="quick_margin")],
+            [InlineKeyboardButton(text=f"💼 Счет: {paper_text}", callback_data="quick_paper")],
             [InlineKeyboardButton(text=f"🛑 SL (%): {sl_percent}%", callback_data="quick_sl")],
             [InlineKeyboardButton(text=f"🎯 TP (%): {tp_percent}%", callback_data="quick_tp")],
             [InlineKeyboardButton(text="🚀 Запустить мониторинг", callback_data="quick_start_monitoring")],
@@ -533,12 +555,15 @@ async def show_quick_setup_menu(message, state: FSMContext):
     text = (
         "⚙️ **Быстрая настройка Copy-Trade**\n\n"
         "Нажмите на параметр, чтобы изменить его:\n\n"
-        f"👛 **Кошелек:** {wallet_text}\n"
+        f"👛 **Кошельки:** {wallet_text}\n"
         f"⏱ **Длительность:** {duration_text}\n"
         f"💰 **Мин. сумма ставки:** ${min_amount}\n"
         f"🎯 **Только первые ставки:** {first_bet_text}\n"
         f"📊 **Диапазон котировок:** {min_quote} - {max_quote}\n"
+        f"🧩 **Правило:** `{_code_span(rule_text)}`\n"
+        f"🤝 **Консенсус кошельков:** {consensus_text}\n"
         f"💵 **Маржа на сделку:** ${margin_amount}\n"
+        f"💼 **Счет:** {paper_text}\n"
         f"🛑 **Stop Loss:** {sl_percent}%\n"
         f"🎯 **Take Profit:** {tp_percent}%\n\n"
         f"Когда всё готово — нажмите '🚀 Запустить мониторинг'"
@@ -563,9 +588,16 @@ async def quick_setup_back(callback: CallbackQuery, state: FSMContext):
 
 @router.callback_query(F.data == "quick_select_wallet")
 async def quick_select_wallet(callback: CallbackQuery, state: FSMContext):
-    """Выбор кошелька"""
+    """Выбор кошельков (можно несколько — одна сессия на всех)"""
+    await show_wallet_selection(callback.message, state)
+    await callback.answer()
+
+
+async def show_wallet_selection(message, state: FSMContext):
+    """Список кошельков на треке с отметками выбранных"""
     data = await state.get_data()
     track_addresses = data.get("track_addresses", [])
+    selected_wallets = data.get("selected_wallets", [])
     
     keyboard = []
     for i, address in enumerate(track_addresses):
@@ -576,35 +608,43 @@ async def quick_select_wallet(callback: CallbackQuery, state: FSMContext):
         except:
             name = 'Unknown'
         
+        mark = "✅ " if address in selected_wallets else ""
         keyboard.append([InlineKeyboardButton(
-            text=f"{name} ({address[:6]}...{address[-4:]})",
+            text=f"{mark}{name} ({address[:6]}...{address[-4:]})",
             callback_data=f"qw_{i}"
         )])
     
-    keyboard.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="quick_back")])
+    keyboard.append([InlineKeyboardButton(text="✅ Готово", callback_data="quick_back")])
     
     kb = InlineKeyboardMarkup(inline_keyboard=keyboard)
     
-    await callback.message.edit_text(
-        "👛 **Выберите кошелек для мониторинга:**",
+    await message.edit_text(
+        "👛 **Выберите кошельки для мониторинга:**\n\n"
+        "Нажатие добавляет или убирает кошелек.",
         parse_mode="Markdown",
         reply_markup=kb
     )
-    await callback.answer()
 
 
 @router.callback_query(F.data.startswith("qw_"))
 async def quick_wallet_selected(callback: CallbackQuery, state: FSMContext):
-    """Сохранение выбранного кошелька"""
+    """Добавление/удаление кошелька из выбранных"""
     wallet_index = int(callback.data.split("_")[-1])
     data = await state.get_data()
     track_addresses = data.get("track_addresses", [])
+    selected_wallets = list(data.get("selected_wallets", []))
     
     if wallet_index < len(track_addresses):
-        await state.update_data(selected_wallet=track_addresses[wallet_index])
-        await callback.answer("✅ Кошелек выбран")
+        address = track_addresses[wallet_index]
+        if address in selected_wallets:
+            selected_wallets.remove(address)
+            await callback.answer("➖ Кошелек убран")
+        else:
+            selected_wallets.append(address)
+            await callback.answer("✅ Кошелек добавлен")
+        await state.update_data(selected_wallets=selected_wallets)
     
-    await show_quick_setup_menu(callback.message, state)
+    await show_wallet_selection(callback.message, state)
 
 
 @router.callback_query(F.data == "quick_duration")
@@ -824,6 +864,112 @@ async def quick_quotes_selected(callback: CallbackQuery, state: FSMContext):
     await show_quick_setup_menu(callback.message, state)
 
 
+@router.callback_query(F.data == "quick_rule")
+async def quick_rule(callback: CallbackQuery, state: FSMContext):
+    """Ввод правила фильтрации"""
+    kb = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text="🗑 Убрать правило", callback_data="quick_rule_reset")],
+            [InlineKeyboardButton(text="⬅️ Назад", callback_data="quick_back")]
+        ]
+    )
+    
+    await callback.message.edit_text(
+        "🧩 **Правило фильтрации**\n\n"
+        "Проверяется вместе с остальными фильтрами.\n\n"
+        "Поля: `usdcSize`, `price`, `outcome`, `title`, `slug`\n"
+        "Операторы: `==`, `!=`, `<`, `<=`, `>`, `>=`, `between`, `in`, `contains`, `and`, `or`, `not`\n\n"
+        "Примеры:\n"
+        "`usdcSize >= 50 and price between 0.1 and 0.8 and outcome == \"Yes\"`\n"
+        "`not (title contains \"bitcoin\") or usdcSize > 1000`\n\n"
+        "Отправьте правило в чат:",
+        parse_mode="Markdown",
+        reply_markup=kb
+    )
+    await state.set_state(CopyTradeState.setting_rule)
+    await callback.answer()
+
+
+@router.callback_query(F.data == "quick_rule_reset")
+async def quick_rule_reset(callback: CallbackQuery, state: FSMContext):
+    """Сброс правила фильтрации"""
+    await state.set_state(None)
+    await state.update_data(rule=None)
+    await callback.answer("✅ Правило убрано")
+    await show_quick_setup_menu(callback.message, state)
+
+
+@router.message(CopyTradeState.setting_rule)
+async def quick_rule_input(message: types.Message, state: FSMContext):
+    """Обработка правила фильтрации"""
+    rule = message.text.strip()
+    
+    try:
+        compile_rule(rule)
+    except RuleError as e:
+        await message.answer(f"⚠️ Ошибка в правиле: {e}\nПопробуйте снова:")
+        return
+    
+    await state.set_state(None)
+    await state.update_data(rule=rule)
+    
+    await message.answer("✅ Правило сохранено\n\nВозвращаюсь к настройкам...")
+    await show_quick_setup_menu_new_message(message, state)
+
+
+@router.callback_query(F.data == "quick_consensus")
+async def quick_consensus(callback: CallbackQuery, state: FSMContext):
+    """Выбор консенсус-режима: копировать, когда K кошельков на треке купили один исход"""
+    data = await state.get_data()
+    total = len(data.get("track_addresses", []))
+    
+    if total < 2:
+        await callback.answer("❌ Для консенсуса нужно минимум 2 кошелька на треке", show_alert=True)
+        return
+    
+    options = [k for k in (2, 3, 4, 5) if k <= total]
+    kb = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text=f"{k} из {total}", callback_data=f"qcons_{k}") for k in options],
+            [InlineKeyboardButton(text="❌ Выключить", callback_data="qcons_0")],
+            [InlineKeyboardButton(text="⬅️ Назад", callback_data="quick_back")]
+        ]
+    )
+    
+    await callback.message.edit_text(
+        "🤝 **Консенсус-режим**\n\n"
+        "Сделка копируется, только когда несколько ваших кошельков на треке\n"
+        "купили один и тот же исход в течение 10 минут.\n\n"
+        "Выбор кошельков в этом режиме не нужен — учитываются все на треке.",
+        parse_mode="Markdown",
+        reply_markup=kb
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("qcons_"))
+async def quick_consensus_selected(callback: CallbackQuery, state: FSMContext):
+    """Сохранение консенсус-режима"""
+    k = int(callback.data.split("_")[-1])
+    await state.update_data(consensus_k=k or None)
+    await show_quick_setup_menu(callback.message, state)
+    await callback.answer(f"✅ Консенсус: {k} кошелька" if k else "✅ Консенсус выключен")
+
+
+@router.callback_query(F.data == "quick_paper")
+async def quick_paper(callback: CallbackQuery, state: FSMContext):
+    """Переключение реального и бумажного счета"""
+    data = await state.get_data()
+    paper = not data.get("paper", False)
+    await state.update_data(paper=paper)
+    await show_quick_setup_menu(callback.message, state)
+    await callback.answer(
+        "🧪 Бумажная торговля: сделки симулируются по стаканам (баланс $1000)" if paper
+        else "💼 Реальный счет",
+        show_alert=paper
+    )
+
+
 @router.callback_query(F.data == "quick_margin")
 async def quick_margin(callback: CallbackQuery, state: FSMContext):
     """Выбор маржи"""
@@ -918,7 +1064,7 @@ async def show_quick_setup_menu_new_message(message, state: FSMContext):
     """Показывает меню быстрой настройки в новом сообщении"""
     data = await state.get_data()
     
-    selected_wallet = data.get("selected_wallet")
+    selected_wallets = data.get("selected_wallets", [])
     duration = data.get("duration", 3600)
     min_amount = data.get("min_amount", 5)
     first_bet = data.get("first_bet", False)
@@ -927,22 +1073,34 @@ async def show_quick_setup_menu_new_message(message, state: FSMContext):
     margin_amount = data.get("margin_amount", 10)
     sl_percent = data.get("sl_percent", 30)
     tp_percent = data.get("tp_percent", 50)
+    rule = data.get("rule")
+    consensus_k = data.get("consensus_k")
+    paper = data.get("paper", False)
     
     duration_text = f"{duration // 60} мин" if duration < 3600 else f"{duration // 3600} ч"
     first_bet_text = "✅ Да" if first_bet else "❌ Нет"
+    rule_text = rule if rule else "нет"
+    rule_button = rule_text if len(rule_text) <= 30 else rule_text[:27] + "..."
+    consensus_text = f"{consensus_k} из {len(data.get('track_addresses', []))}" if consensus_k else "выкл"
+    paper_text = "🧪 бумажный" if paper else "реальный"
     
     wallet_text = "Не выбран"
-    if selected_wallet:
-        wallet_text = f"{selected_wallet[:6]}...{selected_wallet[-4:]}"
+    if len(selected_wallets) == 1:
+        wallet_text = f"{selected_wallets[0][:6]}...{selected_wallets[0][-4:]}"
+    elif selected_wallets:
+        wallet_text = f"{len(selected_wallets)} шт."
     
     kb = InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text=f"👛 Кошелек: {wallet_text}", callback_data="quick_select_wallet")],
+            [InlineKeyboardButton(text=f"👛 Кошельки: {wallet_text}", callback_data="quick_select_wallet")],
             [InlineKeyboardButton(text=f"⏱ Длительность: {duration_text}", callback_data="quick_duration")],
             [InlineKeyboardButton(text=f"💰 Мин. сумма: ${min_amount}", callback_data="quick_min_amount")],
             [InlineKeyboardButton(text=f"🎯 Первые ставки: {first_bet_text}", callback_data="quick_first_bet")],
             [InlineKeyboardButton(text=f"📊 Котировки: {min_quote} - {max_quote}", callback_data="quick_quotes")],
+            [InlineKeyboardButton(text=f"🧩 Правило: {rule_button}", callback_data="quick_rule")],
+            [InlineKeyboardButton(text=f"🤝 Консенсус: {consensus_text}", callback_data="quick_consensus")],
             [InlineKeyboardButton(text=f"💵 Маржа: ${margin_amount}", callback_data="quick_margin")],
+            [InlineKeyboardButton(text=f"💼 Счет: {paper_text}", callback_data="quick_paper")],
             [InlineKeyboardButton(text=f"🛑 SL (%): {sl_percent}%", callback_data="quick_sl")],
             [InlineKeyboardButton(text=f"🎯 TP (%): {tp_percent}%", callback_data="quick_tp")],
             [InlineKeyboardButton(text="🚀 Запустить мониторинг", callback_data="quick_start_monitoring")],
@@ -953,12 +1111,15 @@ async def show_quick_setup_menu_new_message(message, state: FSMContext):
     text = (
         "⚙️ **Быстрая настройка Copy-Trade**\n\n"
         "Нажмите на параметр, чтобы изменить его:\n\n"
-        f"👛 **Кошелек:** {wallet_text}\n"
+        f"👛 **Кошельки:** {wallet_text}\n"
         f"⏱ **Длительность:** {duration_text}\n"
         f"💰 **Мин. сумма ставки:** ${min_amount}\n"
         f"🎯 **Только первые ставки:** {first_bet_text}\n"
         f"📊 **Диапазон котировок:** {min_quote} - {max_quote}\n"
+        f"🧩 **Правило:** `{_code_span(rule_text)}`\n"
+        f"🤝 **Консенсус кошельков:** {consensus_text}\n"
         f"💵 **Маржа на сделку:** ${margin_amount}\n"
+        f"💼 **Счет:** {paper_text}\n"
         f"🛑 **Stop Loss:** {sl_percent}%\n"
         f"🎯 **Take Profit:** {tp_percent}%\n\n"
         f"Когда всё готово - нажмите '🚀 Запустить мониторинг'"
@@ -1052,8 +1213,8 @@ async def quick_start_monitoring(callback: CallbackQuery, state: FSMContext):
     """Запуск мониторинга из быстрой настройки"""
     data = await state.get_data()
     
-    if not data.get("selected_wallet"):
-        await callback.answer("❌ Выберите кошелек!", show_alert=True)
+    if not data.get("selected_wallets") and not data.get("consensus_k"):
+        await callback.answer("❌ Выберите хотя бы один кошелек!", show_alert=True)
         return
     
     await confirm_and_start_monitoring(callback, state)
@@ -1066,7 +1227,8 @@ async def confirm_and_start_monitoring(callback: CallbackQuery, state: FSMContex
     data = await state.get_data()
     db = database.get()
     
-    if tg_id in active_monitors and not active_monitors[tg_id].done():
+    status = await engine.status(monitor_id(tg_id))
+    if status is not None and status["running"]:
         kb = InlineKeyboardMarkup(
             inline_keyboard=[
                 [InlineKeyboardButton(text="🛑 Остановить текущий", callback_data="stop_monitoring")],
@@ -1081,6 +1243,11 @@ async def confirm_and_start_monitoring(callback: CallbackQuery, state: FSMContex
         await callback.answer()
         return
     
+    if data.get("paper"):
+        # Бумажному счету ключи и API credentials не нужны
+        await start_monitoring_task(callback, state, tg_id, data, None, None, None, None, None)
+        return
+    
     private_key = await db.get_private_key(tg_id)
     user_address = await db.select_user_address(tg_id)
     api_key, api_secret, api_passphrase = await db.get_api_credentials(tg_id)
@@ -1136,21 +1303,10 @@ async def stop_monitoring(callback: CallbackQuery, state: FSMContext):
     """Остановка мониторинга"""
     tg_id = callback.from_user.id
     
-    if tg_id not in active_monitors:
+    if not await engine.stop(monitor_id(tg_id)):
         await callback.answer("❌ Нет активного мониторинга", show_alert=True)
         return
     
-    task = active_monitors[tg_id]
-    task.cancel()
-    
-    try:
-        await task
-    except asyncio.CancelledError:
-        pass
-    
-    if tg_id in active_monitors:
-        del active_monitors[tg_id]
-    
     kb = InlineKeyboardMarkup(
         inline_keyboard=[
             [InlineKeyboardButton(text="🔄 Запустить новый", callback_data="start_copy_trade")],
@@ -1174,21 +1330,18 @@ async def show_monitoring_stats(callback: CallbackQuery):
     """Показать статистику текущего мониторинга"""
     tg_id = callback.from_user.id
     
-    if tg_id not in active_monitors:
+    status = await engine.status(monitor_id(tg_id))
+    if status is None:
         await callback.answer("❌ Нет активного мониторинга", show_alert=True)
         return
     
-    task = active_monitors[tg_id]
-    
-    if task.done():
-        status = "Завершен"
-    elif task.cancelled():
-        status = "Отменен"
-    else:
-        status = "Активен ✅"
+    text = f"📊 Статус мониторинга: {'Активен ✅' if status['running'] else 'Завершен'}\n"
+    stats = status.get("stats")
+    if stats:
+        text += (
+            f"👀 Ставок лидера: {stats['bets_seen']}, найдено: {stats['total_found']}\n"
+            f"💰 Скопировано: {stats['trades_ok']} на ${stats['notional_copied']}\n"
+        )
+    text += "Вы получите детальную статистику после завершения."
     
-    await callback.answer(
-        f"📊 Статус мониторинга: {status}\n"
-        f"Вы получите детальную статистику после завершения.",
-        show_alert=True
-    )
\ No newline at end of file
+    await callback.answer(text, show_alert=True)
\ No newline at end of file
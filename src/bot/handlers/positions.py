@@ -1,4 +1,3 @@
-import time
 import logging
 from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
@@ -8,8 +7,7 @@ from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardBut
 from db.database import database
 from src.bot.keyboards import get_positions_keyboard, get_back_button
 from src.core.PolyScrapper import PolyScrapper
-from src.core.PolyCopy import PolyCopy
-from src.models.settings import Settings
+from src.bot.utils.clients import user_client
 
 router = Router()
 
@@ -204,7 +202,6 @@ async def execute_close_position(callback: CallbackQuery, state: FSMContext):
     
     private_key = await db.get_private_key(tg_id)
     user_address = await db.select_user_address(tg_id)
-    api_key, api_secret, api_passphrase = await db.get_api_credentials(tg_id)
     
     if not private_key:
         try:
@@ -240,25 +237,10 @@ async def execute_close_position(callback: CallbackQuery, state: FSMContext):
     try:
         scrapper = PolyScrapper(user_address)
         
-        temp_settings = Settings(
-            exp_at=60,
-            started_at=int(time.time()),
-            first_bet=False,
-            min_amount=1,
-            min_quote=0.01,
-            max_quote=0.99
-        )
-        
-        poly_copy = PolyCopy(
-            temp_settings,
-            scrapper,
-            private_key=private_key,
-            margin_amount=1,
-            funder=user_address,
-            api_key=api_key,
-            api_secret=api_secret,
-            api_passphrase=api_passphrase
-        )
+        # Клиент из пула: прогрет при открытии меню или уже работает в мониторах пользователя
+        poly_client = await user_client(tg_id)
+        if poly_client is None or not poly_client.is_ready():
+            raise RuntimeError("не удалось инициализировать клиент Polymarket")
         
         current_positions = await scrapper.get_account_positions()
         
@@ -303,7 +285,9 @@ async def execute_close_position(callback: CallbackQuery, state: FSMContext):
             await callback.answer()
             return
         
-        success = await poly_copy.close_position(token_id, size)
+        success, message = await poly_client.close_position(token_id, size)
+        if not success:
+            logging.warning(f"Позиция {token_id} не закрыта: {message}")
         
         kb = InlineKeyboardMarkup(
             inline_keyboard=[
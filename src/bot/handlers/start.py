@@ -5,6 +5,7 @@ from aiogram.fsm.context import FSMContext
 
 from db.database import database
 from src.bot.states import RegisterState
+from src.bot.utils.clients import warm_user_client
 from src.bot.keyboards import (
     get_main_menu_keyboard, 
     get_api_setup_keyboard, 
@@ -31,6 +32,7 @@ async def cmd_start(message: types.Message, state: FSMContext):
         )
         await state.set_state(RegisterState.waiting_for_address)
     else:
+        warm_user_client(tg_id)
         await message.answer(
             f"✅ Добро пожаловать!\n\n"
             f"Ваш адрес: `{address}`\n\n"
@@ -224,6 +226,7 @@ async def get_api_passphrase(message: types.Message, state: FSMContext):
     await db.update_api_credentials(tg_id, api_key, api_secret, api_passphrase)
     
     await state.clear()
+    warm_user_client(tg_id)
     
     await message.answer(
         f"✅ **Регистрация полностью завершена!**\n\n"
@@ -301,6 +304,7 @@ async def reset_private_key(message: types.Message, state: FSMContext):
     await db.update_private_key(tg_id, private_key)
 
     await state.clear()
+    warm_user_client(tg_id)
     await message.answer(
         f"✅ Данные обновлены!\n\n"
         f"📍 Новый адрес: `{new_address}`\n"
@@ -326,6 +330,7 @@ async def show_main_menu(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
         return
     
+    warm_user_client(tg_id)
     await callback.message.edit_text(
         f"✅ Главное меню\n"
         f"Ваш адрес: `{address}`\n\n"
@@ -0,0 +1,158 @@
+import logging
+from aiogram import Router, F, types
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.types import CallbackQuery
+
+from src.bot.cfg import bot
+from src.bot.states import WhaleState
+from src.bot.keyboards import get_whales_keyboard, get_back_button
+from src.core.PolyWhales import whales
+
+router = Router()
+
+
+async def send_whale_alert(tg_id: int, alert: dict):
+    """Алерт о крупной сделке"""
+    trade = alert["trade"]
+    market = alert["market"]
+    wallet = trade.get("proxyWallet") or ""
+    side = "🟢 Покупка" if trade.get("side") == "BUY" else "🔴 Продажа"
+
+    text = (
+        f"🐋 **Крупная сделка: ${alert['notional']:,.0f}**\n\n"
+        f"📝 {trade.get('title', '')}\n"
+        f"🎲 Исход: {trade.get('outcome', '')}\n"
+        f"{side} по {float(trade.get('price') or 0):.3f}\n"
+        f"👛 `{wallet[:6]}...{wallet[-4:]}`\n\n"
+        f"📊 Рынок: объем ${market.volume:,.0f}, "
+        f"крупных сделок {market.large_trades}, "
+        f"кошельков ~{market.wallets.count()}"
+    )
+
+    try:
+        await bot.send_message(tg_id, text, parse_mode="Markdown")
+    except Exception as e:
+        logging.error(f"❌ Ошибка отправки алерта пользователю {tg_id}: {e}")
+
+
+async def show_whales_menu(message, state: FSMContext, edit: bool = True):
+    """Меню ленты крупных сделок"""
+    data = await state.get_data()
+    tg_id = message.chat.id
+    threshold = data.get("whale_threshold", 10000)
+    markets = data.get("whale_markets") or []
+    active = tg_id in whales.subscriptions
+
+    markets_text = ", ".join(markets) if markets else "все рынки"
+    text = (
+        "🐋 **Крупные сделки**\n\n"
+        "Алерты о сделках из общей ленты Polymarket выше порога.\n\n"
+        f"💰 **Порог:** ${threshold:,}\n"
+        f"🎯 **Рынки:** {markets_text}\n"
+        f"📡 **Статус:** {'включены ✅' if active else 'выключены'}"
+    )
+
+    kb = get_whales_keyboard(active)
+    if edit:
+        await message.edit_text(text, parse_mode="Markdown", reply_markup=kb)
+    else:
+        await message.answer(text, parse_mode="Markdown", reply_markup=kb)
+
+
+@router.message(Command("whales"))
+async def cmd_whales(message: types.Message, state: FSMContext):
+    await show_whales_menu(message, state, edit=False)
+
+
+@router.callback_query(F.data == "whales_menu")
+async def whales_menu(callback: CallbackQuery, state: FSMContext):
+    await state.set_state(None)
+    await show_whales_menu(callback.message, state)
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("whale_threshold_"))
+async def whale_threshold(callback: CallbackQuery, state: FSMContext):
+    """Смена порога; активная подписка обновляется сразу"""
+    threshold = int(callback.data.split("_")[-1])
+    await state.update_data(whale_threshold=threshold)
+
+    tg_id = callback.from_user.id
+    if tg_id in whales.subscriptions:
+        await subscribe(tg_id, state)
+
+    await show_whales_menu(callback.message, state)
+    await callback.answer(f"✅ Порог: ${threshold:,}")
+
+
+@router.callback_query(F.data == "whales_markets")
+async def whales_markets(callback: CallbackQuery, state: FSMContext):
+    await state.set_state(WhaleState.waiting_for_markets)
+    await callback.message.edit_text(
+        "🎯 Отправьте slug или conditionId рынков через запятую\n"
+        "(например: `will-bitcoin-hit-100k, us-election-2028`)\n\n"
+        "Отправьте `все`, чтобы получать алерты по всем рынкам.",
+        parse_mode="Markdown",
+        reply_markup=get_back_button("whales_menu")
+    )
+    await callback.answer()
+
+
+@router.message(WhaleState.waiting_for_markets)
+async def whales_markets_input(message: types.Message, state: FSMContext):
+    text = (message.text or "").strip()
+    markets = [] if text.lower() in ("все", "all") else [m.strip() for m in text.split(",") if m.strip()]
+
+    await state.update_data(whale_markets=markets)
+    await state.set_state(None)
+
+    if message.from_user.id in whales.subscriptions:
+        await subscribe(message.from_user.id, state)
+
+    await show_whales_menu(message, state, edit=False)
+
+
+async def subscribe(tg_id: int, state: FSMContext):
+    data = await state.get_data()
+    whales.subscribe(
+        tg_id,
+        send_whale_alert,
+        threshold=data.get("whale_threshold", 10000),
+        markets=set(data.get("whale_markets") or []) or None,
+    )
+    whales.ensure_running()
+
+
+@router.callback_query(F.data == "whales_start")
+async def whales_start(callback: CallbackQuery, state: FSMContext):
+    await subscribe(callback.from_user.id, state)
+    logging.info(f"🐋 Алерты крупных сделок включены для {callback.from_user.id}")
+    await show_whales_menu(callback.message, state)
+    await callback.answer("✅ Алерты включены")
+
+
+@router.callback_query(F.data == "whales_stop")
+async def whales_stop(callback: CallbackQuery, state: FSMContext):
+    whales.unsubscribe(callback.from_user.id)
+    await show_whales_menu(callback.message, state)
+    await callback.answer("🛑 Алерты выключены")
+
+
+@router.callback_query(F.data == "whales_top")
+async def whales_top(callback: CallbackQuery):
+    """Топ рынков по объему из бегущей статистики ленты"""
+    top = whales.top_markets(limit=10)
+    if not top:
+        await callback.answer("⏳ Статистика появится после включения алертов", show_alert=True)
+        return
+
+    text = "📊 **Топ рынков по объему (с момента запуска ленты)**\n\n"
+    for i, market in enumerate(top, 1):
+        text += (
+            f"{i}. {market['title'][:60]}\n"
+            f"   💵 ${market['volume']:,.0f} • 🐋 {market['large_trades']} • 👛 ~{market['unique_wallets']}\n"
+        )
+
+    await callback.message.edit_text(text, parse_mode="Markdown", reply_markup=get_back_button("whales_menu"))
+    await callback.answer()
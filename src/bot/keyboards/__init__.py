@@ -6,6 +6,7 @@ from .inline import (
     get_positions_keyboard,
     get_api_setup_keyboard,
     get_monitoring_keyboard,
+    get_whales_keyboard,
     get_back_button
 )
 
@@ -17,5 +18,6 @@ __all__ = [
     'get_positions_keyboard',
     'get_api_setup_keyboard',
     'get_monitoring_keyboard',
+    'get_whales_keyboard',
     'get_back_button'
 ]
\ No newline at end of file
@@ -7,7 +7,8 @@ def get_main_menu_keyboard():
             [InlineKeyboardButton(text='📊 Мои позиции', callback_data='show_positions')],
             [InlineKeyboardButton(text='🏆 Рейтинг', callback_data='show_leaderboard')],
             [InlineKeyboardButton(text='🔄 Сменить кошелек', callback_data='reset_wallet')],
-            [InlineKeyboardButton(text='📋 Copy Trade', callback_data='copy_trade_menu')]
+            [InlineKeyboardButton(text='📋 Copy Trade', callback_data='copy_trade_menu')],
+            [InlineKeyboardButton(text='🐋 Крупные сделки', callback_data='whales_menu')]
         ]
     )
 
@@ -80,6 +81,28 @@ def get_monitoring_keyboard():
     )
 
 
+def get_whales_keyboard(active: bool):
+    """Клавиатура ленты крупных сделок"""
+    toggle = (
+        InlineKeyboardButton(text="🛑 Остановить алерты", callback_data="whales_stop") if active
+        else InlineKeyboardButton(text="🚀 Включить алерты", callback_data="whales_start")
+    )
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(text="$1k", callback_data="whale_threshold_1000"),
+                InlineKeyboardButton(text="$5k", callback_data="whale_threshold_5000"),
+                InlineKeyboardButton(text="$10k", callback_data="whale_threshold_10000"),
+                InlineKeyboardButton(text="$50k", callback_data="whale_threshold_50000"),
+            ],
+            [InlineKeyboardButton(text="🎯 Рынки", callback_data="whales_markets")],
+            [toggle],
+            [InlineKeyboardButton(text="📊 Топ рынков", callback_data="whales_top")],
+            [InlineKeyboardButton(text="⬅️ Главное меню", callback_data="main_menu")]
+        ]
+    )
+
+
 def get_back_button(callback_data: str = "main_menu"):
     """Простая кнопка назад"""
     return InlineKeyboardMarkup(
@@ -24,4 +24,10 @@ class CopyTradeState(StatesGroup):
     setting_custom_margin = State()
     setting_min_quote = State()
     setting_max_quote = State()
-    monitoring = State()
\ No newline at end of file
+    setting_rule = State()
+    monitoring = State()
+
+
+class WhaleState(StatesGroup):
+    """Состояния ленты крупных сделок"""
+    waiting_for_markets = State()
@@ -1,3 +1,4 @@
 from .monitoring import start_monitoring_task
+from .clients import user_client, warm_user_client
 
-__all__ = ['start_monitoring_task']
\ No newline at end of file
+__all__ = ['start_monitoring_task', 'user_client', 'warm_user_client']
\ No newline at end of file
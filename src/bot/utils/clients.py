@@ -0,0 +1,35 @@
+import logging
+from typing import Optional
+
+from db.database import database
+from src.core.PolyClient import PolyClient, client_pool
+
+
+async def user_client(tg_id: int) -> Optional[PolyClient]:
+    """
+    Торговый клиент пользователя из общего пула (тот же, что у его мониторов).
+    None - нет приватного ключа или адреса.
+    """
+    db = database.get()
+    private_key = await db.get_private_key(tg_id)
+    address = await db.select_user_address(tg_id)
+    if not (private_key and address):
+        return None
+
+    api_key, api_secret, api_passphrase = await db.get_api_credentials(tg_id)
+    if not all([api_key, api_secret, api_passphrase]):
+        api_key = api_secret = api_passphrase = None
+
+    return await client_pool.get(private_key, address, api_key, api_secret, api_passphrase)
+
+
+async def _warm(tg_id: int):
+    try:
+        await user_client(tg_id)
+    except Exception as e:
+        logging.warning(f"⚠️ Прогрев клиента {tg_id} не удался: {e}")
+
+
+def warm_user_client(tg_id: int):
+    """Создает клиент пользователя в фоне, не задерживая ответ хендлера."""
+    client_pool.warming.spawn(_warm(tg_id))
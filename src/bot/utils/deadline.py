@@ -0,0 +1,29 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from utils.deadline import DeadlineExceeded, deadline, timeout_metrics
+
+
+class DeadlineMiddleware(BaseMiddleware):
+    """
+    Дедлайн на обработку апдейта: все запросы к data-api и CLOB из хендлера
+    получают таймауты из остатка бюджета, зависший сокет не вешает хендлер.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        with deadline(self.seconds, root=True):
+            try:
+                return await handler(event, data)
+            except DeadlineExceeded as e:
+                logging.warning(f"⏱ Апдейт не уложился в {self.seconds:.0f}s: {e} {timeout_metrics.snapshot()}")
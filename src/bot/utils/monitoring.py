@@ -1,140 +1,60 @@
 import time
-import asyncio
 import logging
+from typing import Optional
+from aiogram import Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 from src.bot.states import CopyTradeState
-from src.bot.cfg import bot, active_monitors
+from src.bot.cfg import bot, engine
 
-from src.core.PolyCopy import PolyCopy
-from src.core.PolyClient import PolyClient
-from src.core.PolyScrapper import PolyScrapper
+from src.core.PolyEngine import Buttons, Notifier, DEFINITION_KEYS, monitor_id
+from src.core.PolySupervisor import MonitorLimitError
 
-from src.models.settings import Settings
-from src.models.position import Position
 
+class BotNotifier(Notifier):
+    """Уведомления движка через Telegram-бота."""
 
-async def start_monitoring_task(callback, state, tg_id, data, private_key, user_address, api_key, api_secret, api_passphrase):
-    """Запуск мониторинга кошелька с поддержкой режима без API"""
-
-    settings = Settings(
-        exp_at=data.get("duration", 3600),
-        started_at=int(time.time()),
-        first_bet=data.get("first_bet", False),
-        min_amount=data.get("min_amount", 1),
-        min_quote=data.get("min_quote", 0.01),
-        max_quote=data.get("max_quote", 0.99),
-    )
-
-    selected_wallet = data.get("selected_wallet", "")
-    margin_amount = data.get("margin_amount", 0)
-
-    scrapper = PolyScrapper(selected_wallet)
-
-    api_enabled = all([api_key, api_secret, api_passphrase])
-
-    poly_client = PolyClient(
-        private_key=private_key,
-        funder=user_address,
-        api_key=api_key if api_enabled else None,
-        api_secret=api_secret if api_enabled else None,
-        api_passphrase=api_passphrase if api_enabled else None
-    )
-
-    poly_copy = PolyCopy(
-        settings,
-        scrapper,
-        margin_amount=margin_amount,
-        client=poly_client
-    )
-
-    async def notify_found_position(position: Position, message: str, trade_executed: bool, trade_message: str):
-        """Уведомление о найденной позиции"""
-        emoji = "✅" if trade_executed else "⏳"
-        status = "Сделка исполнена!" if trade_executed else (
-            "Только мониторинг" if not api_enabled else "Ошибка при исполнении"
-        )
-
-        text = (
-            f"{emoji} **Найдена подходящая сделка!**\n\n"
-            f"📝 {position.title}\n"
-            f"💰 Сумма: ${round(position.usdcSize, 2)}\n"
-            f"📊 Котировка: {round(position.price, 3)}\n"
-            f"🎲 Исход: {position.outcome}\n"
-        )
-
-        if api_enabled:
-            text += f"💵 Маржа: ${margin_amount}\n"
-
-        text += f"\n📌 {message}\n🔄 {status}\n"
-
-        if trade_message:
-            text += f"\n🗒 {trade_message}"
+    def __init__(self, bot: Bot):
+        self.bot = bot
 
-        if api_enabled:
-            text += "\n\nМониторинг продолжается..."
-        else:
-            text += "\n\n⚠️ Режим: только мониторинг (без автоисполнения)"
-
-        try:
-            await bot.send_message(tg_id, text, parse_mode="Markdown")
-            logging.info(f"✅ Уведомление отправлено пользователю {tg_id}")
-        except Exception as e:
-            logging.error(f"❌ Ошибка отправки уведомления пользователю {tg_id}: {e}")
-
-    async def run_monitoring():
-        """Основной цикл мониторинга"""
-        try:
-            logging.info(f"🚀 Мониторинг запущен для пользователя {tg_id}")
-            await poly_copy.monitoring_wallets(callback_func=notify_found_position)
-
-            stats = poly_copy.get_statistics()
-            summary = (
-                f"✅ **Мониторинг завершен!**\n\n"
-                f"📊 Найдено сделок: {stats['total_found']}\n"
-                f"🎯 Отслежено рынков: {stats['markets_tracked']}"
-            )
-
-            kb = InlineKeyboardMarkup(
+    async def send(self, tg_id: int, text: str, parse_mode: Optional[str] = None, buttons: Optional[Buttons] = None):
+        reply_markup = None
+        if buttons:
+            reply_markup = InlineKeyboardMarkup(
                 inline_keyboard=[
-                    [InlineKeyboardButton(text="🔄 Запустить новый", callback_data="start_copy_trade")],
-                    [InlineKeyboardButton(text="⬅️ Главное меню", callback_data="main_menu")]
+                    [InlineKeyboardButton(text=label, callback_data=data) for label, data in row]
+                    for row in buttons
                 ]
             )
+        await self.bot.send_message(tg_id, text, parse_mode=parse_mode, reply_markup=reply_markup)
+        logging.info(f"✅ Уведомление отправлено пользователю {tg_id}")
 
-            await bot.send_message(tg_id, summary, parse_mode="Markdown", reply_markup=kb)
-            logging.info(f"✅ Мониторинг завершен для пользователя {tg_id}")
 
-        except asyncio.CancelledError:
-            stats = poly_copy.get_statistics()
-            cancel_text = (
-                f"🛑 **Мониторинг остановлен**\n\n"
-                f"📊 Найдено сделок: {stats['total_found']}\n"
-                f"🎯 Отслежено рынков: {stats['markets_tracked']}"
-            )
-
-            kb = InlineKeyboardMarkup(
-                inline_keyboard=[
-                    [InlineKeyboardButton(text="🔄 Запустить новый", callback_data="start_copy_trade")],
-                    [InlineKeyboardButton(text="⬅️ Главное меню", callback_data="main_menu")]
-                ]
-            )
+async def start_monitoring_task(callback, state, tg_id, data, private_key, user_address, api_key, api_secret, api_passphrase):
+    """Запуск мониторинга кошельков (одна сессия на пользователя) под супервизором, с поддержкой режима без API"""
 
-            await bot.send_message(tg_id, cancel_text, parse_mode="Markdown", reply_markup=kb)
-            logging.info(f"🛑 Мониторинг остановлен пользователем {tg_id}")
+    paper_mode = bool(data.get("paper"))
+    api_enabled = paper_mode or all([api_key, api_secret, api_passphrase])
 
-        except Exception as e:
-            err = f"❌ **Ошибка при мониторинге:** `{str(e)}`"
-            logging.error(f"Ошибка мониторинга: {e}", exc_info=True)
-            await bot.send_message(tg_id, err, parse_mode="Markdown")
+    definition = {key: data[key] for key in DEFINITION_KEYS if key in data}
+    definition["started_at"] = int(time.time())
+    definition["with_api"] = all([api_key, api_secret, api_passphrase])
+    expires_at = definition["started_at"] + data.get("duration", 3600)
 
-        finally:
-            if tg_id in active_monitors:
-                del active_monitors[tg_id]
-                logging.info(f"🧹 Очищен мониторинг пользователя {tg_id}")
+    try:
+        await engine.start(monitor_id(tg_id), tg_id, definition, expires_at)
+    except MonitorLimitError as e:
+        await callback.message.edit_text(
+            f"⚠️ Мониторинг не запущен: {e}",
+            reply_markup=InlineKeyboardMarkup(
+                inline_keyboard=[[InlineKeyboardButton(text="⬅️ Главное меню", callback_data="main_menu")]]
+            )
+        )
+        await callback.answer()
+        return
 
-    task = asyncio.create_task(run_monitoring())
-    active_monitors[tg_id] = task
+    selected_wallets = data.get("selected_wallets") or [data.get("selected_wallet", "")]
+    margin_amount = data.get("margin_amount", 0)
 
     kb = InlineKeyboardMarkup(
         inline_keyboard=[
@@ -144,15 +64,25 @@ async def start_monitoring_task(callback, state, tg_id, data, private_key, user_
     )
 
     duration_text = f"{data.get('duration', 0) // 60} мин" if data.get('duration', 0) < 3600 else f"{data.get('duration', 0) // 3600} ч"
-    mode_text = (
-        "✨ Подходящие сделки будут автоматически исполняться!" if api_enabled
-        else "⚠️ Режим: только мониторинг (уведомления без исполнения)"
-    )
+    if data.get("consensus_k"):
+        consensus_wallets = data.get("track_addresses") or selected_wallets
+        wallets_text = f"🤝 Консенсус: {data['consensus_k']} из {len(consensus_wallets)} кошельков"
+    elif len(selected_wallets) == 1:
+        wallets_text = f"👛 Кошелек: `{selected_wallets[0][:8]}...{selected_wallets[0][-6:]}`"
+    else:
+        wallets_text = f"👛 Кошельков: {len(selected_wallets)}"
+
+    if paper_mode:
+        mode_text = "🧪 Бумажная торговля: сделки исполняются по стаканам без реальных ордеров"
+    elif api_enabled:
+        mode_text = "✨ Подходящие сделки будут автоматически исполняться!"
+    else:
+        mode_text = "⚠️ Режим: только мониторинг (уведомления без исполнения)"
 
     try:
         await callback.message.edit_text(
             f"🚀 **Мониторинг запущен!**\n\n"
-            f"👛 Кошелек: `{selected_wallet[:8]}...{selected_wallet[-6:]}`\n"
+            f"{wallets_text}\n"
             f"⏱ Длительность: {duration_text}\n"
             f"💵 Маржа: ${margin_amount}\n\n"
             f"{mode_text}\n\n"
@@ -165,7 +95,7 @@ async def start_monitoring_task(callback, state, tg_id, data, private_key, user_
         await bot.send_message(
             tg_id,
             f"🚀 **Мониторинг запущен!**\n\n"
-            f"👛 Кошелек: `{selected_wallet[:8]}...{selected_wallet[-6:]}`\n"
+            f"{wallets_text}\n"
             f"⏱ Длительность: {duration_text}\n"
             f"💵 Маржа: ${margin_amount}\n\n"
             f"{mode_text}\n\n"
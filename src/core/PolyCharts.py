@@ -4,6 +4,7 @@ import pandas as pd
 from typing import Tuple
 import matplotlib.pyplot as plt
 
+from utils.deadline import TimeoutScope, client_timeout
 from src.models.datacreator import DataCreator
 
 
@@ -13,11 +14,15 @@ class PolyCharts:
         self.datacreator = DataCreator()
         self.condition_id = condition_id
         self.base_url = "https://clob.polymarket.com/prices-history"
+        # Лимит запроса истории цен (урезается до дедлайна апдейта)
+        self.timeout = 10.0
 
     async def create_chart(self) -> Tuple[bool, io.BytesIO]:
-        async with aiohttp.ClientSession() as session:
+        async with TimeoutScope("charts"), aiohttp.ClientSession() as session:
             params, headers = self.datacreator.create_chart_request_data(self.condition_id)
-            response = await session.get(self.base_url, params=params, headers=headers)
+            response = await session.get(
+                self.base_url, params=params, headers=headers, timeout=client_timeout("charts", self.timeout)
+            )
             response_json = await response.json()
 
             data = response_json.get("history", [])
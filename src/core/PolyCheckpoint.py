@@ -0,0 +1,178 @@
+import json
+import time
+import asyncio
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.core.PolyWheel import wheel
+
+# Снимок состояния монитора: [(kind, key, value), ...]
+Entries = List[Tuple[str, str, Any]]
+
+
+class Checkpointer:
+    """
+    Инкрементальный чекпоинт состояния монитора в БД (UsersBase.*_checkpoint).
+
+    - На горячем пути record() только кладет дельту в память (повторные
+      изменения одного ключа до сброса схлопываются)
+    - run() раз в interval секунд (таймер TimingWheel) дописывает накопленные дельты одной пачкой
+    - После compact_every записанных дельт журнал заменяется снимком state_func()
+    - restore() читает журнал одним запросом и проигрывает его (None - удаление)
+    """
+
+    __slots__ = (
+        "repo", "monitor_id", "interval", "compact_every", "state_func", "pending", "appended",
+    )
+
+    def __init__(
+        self,
+        repo,
+        monitor_id: str,
+        interval: float = 1.0,
+        compact_every: int = 1000,
+    ):
+        """
+        Args:
+            repo: репозиторий БД (database.get())
+            monitor_id: идентификатор монитора (например, monitor:<tg_id>)
+            interval: период сброса дельт в секундах
+            compact_every: после скольких дельт делать снимок
+        """
+        self.repo = repo
+        self.monitor_id = monitor_id
+        self.interval = interval
+        self.compact_every = compact_every
+
+        self.state_func: Optional[Callable[[], Entries]] = None
+        self.pending: Dict[Tuple[str, str], Any] = {}
+        self.appended = 0
+
+    def record(self, kind: str, key: str, value: Any = None):
+        """Дельта состояния (value=None - ключ удален)."""
+        self.pending[(kind, key)] = value
+
+    def _encode(self, entries) -> List[Tuple[str, str, Optional[str]]]:
+        return [
+            (kind, key, None if value is None else json.dumps(value))
+            for kind, key, value in entries
+        ]
+
+    async def restore(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Состояние из журнала: kind -> {key: value}.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: пустой dict, если чекпоинта нет
+        """
+        started = time.perf_counter()
+        rows = await self.repo.load_checkpoint(self.monitor_id)
+
+        state: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            values = state.setdefault(row["kind"], {})
+            if row["value"] is None:
+                values.pop(row["key"], None)
+            else:
+                values[row["key"]] = json.loads(row["value"])
+
+        if rows:
+            elapsed = (time.perf_counter() - started) * 1000
+            print(f"💾 Восстановлен чекпоинт {self.monitor_id}: {len(rows)} записей за {elapsed:.0f} мс")
+        return state
+
+    async def flush(self) -> bool:
+        if not self.pending:
+            return True
+
+        pending, self.pending = self.pending, {}
+        entries = [(kind, key, value) for (kind, key), value in pending.items()]
+        if not await self.repo.append_checkpoint(self.monitor_id, self._encode(entries)):
+            # Не потерять дельты: вернуть их (более новые значения важнее)
+            pending.update(self.pending)
+            self.pending = pending
+            return False
+
+        self.appended += len(entries)
+        return True
+
+    async def compact(self) -> bool:
+        """Заменяет журнал снимком текущего состояния."""
+        if self.state_func is None:
+            return False
+
+        # Снимок уже включает все несброшенные дельты
+        entries = self._encode(self.state_func())
+        if not entries:
+            # Пустой снимок (все ставки старше TTL, позиций нет): повторять компактизацию
+            # каждую секунду незачем, даже если запись не удастся
+            self.appended = 0
+        pending, self.pending = self.pending, {}
+        if not await self.repo.compact_checkpoint(self.monitor_id, entries):
+            pending.update(self.pending)
+            self.pending = pending
+            return False
+        self.appended = 0
+        return True
+
+    async def clear(self):
+        """Удаляет чекпоинт (монитор завершился штатно)."""
+        self.pending.clear()
+        self.state_func = None
+        await self.repo.delete_checkpoint(self.monitor_id)
+
+    async def _tick(self):
+        try:
+            await self.flush()
+            if self.appended >= self.compact_every:
+                await self.compact()
+        except Exception as e:
+            print(f"⚠️ Ошибка чекпоинта {self.monitor_id}: {e}")
+            traceback.print_exc()
+
+    async def run(self):
+        """Фоновый сброс дельт и компактизация; при отмене дописывает остаток."""
+        job = wheel.every(self.interval, self._tick, jitter=True)
+        try:
+            # Сам run не просыпается: сбросы делает таймер колеса
+            await asyncio.get_running_loop().create_future()
+        finally:
+            # Начатую запись не прерываем, иначе ее дельты потеряются
+            await job.stop(cancel_running=False)
+            if self.state_func is not None:
+                try:
+                    await self.flush()
+                except Exception as e:
+                    print(f"⚠️ Не удалось сбросить чекпоинт {self.monitor_id}: {e}")
+
+
+# Ключи дедупликации старше этого не восстанавливаются (как в PolyCopy._prune)
+PROCESSED_TTL = 3600
+
+
+def shared_entries(processed_bets: Dict[str, float], risk) -> Entries:
+    """Общая часть состояния (дедупликация и позиции под SL/TP) для снимка."""
+    now = time.time()
+    entries: Entries = [
+        ("bet", key, ts) for key, ts in processed_bets.items() if now - ts < PROCESSED_TTL
+    ]
+    if risk is not None:
+        entries += [("pos", token_id, position) for token_id, position in risk.tracked_positions.items()]
+    return entries
+
+
+def restore_shared(state: Dict[str, Dict[str, Any]], processed_bets: Dict[str, float], risk):
+    """Восстанавливает дедупликацию и позиции под SL/TP (до подключения чекпоинта)."""
+    now = time.time()
+    for key, ts in state.get("bet", {}).items():
+        if now - ts < PROCESSED_TTL:
+            processed_bets[key] = ts
+    if risk is not None:
+        for token_id, position in state.get("pos", {}).items():
+            risk.track(token_id, position)
+
+
+def attach_shared(checkpoint: Checkpointer, risk):
+    """Изменения позиций под SL/TP пишутся в чекпоинт."""
+    if risk is not None:
+        risk.on_change = lambda token_id, position: checkpoint.record("pos", token_id, position)
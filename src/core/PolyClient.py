@@ -1,25 +1,83 @@
 import time
+import asyncio
+import weakref
 import traceback
-from typing import Tuple, Optional
+from collections import OrderedDict
+from typing import Dict, Iterable, Tuple, Optional
 
+import requests
 from py_clob_client.client import ClobClient
-from py_clob_client.clob_types import ApiCreds, MarketOrderArgs, OrderType
-from py_clob_client.exceptions import PolyApiException
+from py_clob_client.clob_types import ApiCreds, OrderType
+from py_clob_client.http_helpers import helpers as clob_http
 from py_clob_client.order_builder.constants import BUY, SELL
 
+from data.config import Config
+from utils.deadline import detached, expired, timeout_for, timeout_metrics
+from src.core.PolyOrders import OrderSubmitter, clob_pool
+from src.core.PolyMarkets import market_meta
+from src.core.PolyShutdown import Inflight
+
 HOST = "https://clob.polymarket.com"
 CHAIN_ID = 137
 
+# Лимит одного HTTP-запроса ClobClient (урезается до дедлайна тика/апдейта)
+CLOB_HTTP_TIMEOUT = 10.0
+
+
+class _DeadlineRequests:
+    """
+    requests для py_clob_client с таймаутом: сам клиент зовет requests.request
+    без timeout, и зависший сокет навсегда занимает поток. Дедлайн вызывающего
+    приходит в поток через contextvars (clob_pool копирует контекст в поток).
+    """
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+    @staticmethod
+    def request(method, url, **kwargs):
+        kwargs.setdefault("timeout", timeout_for("clob", CLOB_HTTP_TIMEOUT))
+        try:
+            return requests.request(method, url, **kwargs)
+        except requests.Timeout:
+            timeout_metrics.inc("clob", "deadline" if expired() else "timeout")
+            raise
+
+
+clob_http.requests = _DeadlineRequests()
+
+
+class _CachedClobClient(ClobClient):
+    """
+    ClobClient с метаданными токенов из общего кеша market_meta (с TTL):
+    create_market_order спрашивает tick size, neg-risk и fee rate перед каждой
+    подписью, собственный кеш клиента бессрочный и свой у каждого пользователя.
+    """
+
+    def get_tick_size(self, token_id: str):
+        return market_meta.fetch(token_id, "tick_size")
+
+    def get_neg_risk(self, token_id: str) -> bool:
+        return market_meta.fetch(token_id, "neg_risk")
+
+    def get_fee_rate_bps(self, token_id: str) -> int:
+        return market_meta.fetch(token_id, "fee_rate")
+
 
 class PolyClient:
     """
     Клиент для торговли на Polymarket.
     Отвечает за:
     - Инициализацию ClobClient
-    - Управление API credentials (refresh)
-    - Исполнение сделок (покупка/продажа)
+    - Управление API credentials (фоновое обновление, см. _refresher)
+    - Исполнение сделок (покупка/продажа) через идемпотентный OrderSubmitter
+    
+    PolyClient.shared() отдает один клиент на набор ключей: мониторы
+    пользователя делят ClobClient, credentials и историю ордеров.
     """
     
+    _registry: "weakref.WeakValueDictionary[tuple, PolyClient]" = weakref.WeakValueDictionary()
+    
     def __init__(
         self,
         private_key: str,
@@ -37,9 +95,33 @@ class PolyClient:
         self.client: Optional[ClobClient] = None
         self._last_creds_refresh = 0
         self._creds_refresh_interval = 50 * 60  # 50 минут
+        self._creds_retry_interval = 60  # пауза после неудачного фонового обновления
+        self._creds_min_gap = 30  # 401 сразу после обновления - повтор со свежими, без нового обновления
+        self._refreshing: Optional[asyncio.Future] = None
+        self._refresher: Optional[asyncio.Task] = None
+        
+        # Повторы, 401 и сверка после таймаутов - внутри OrderSubmitter
+        self.orders = OrderSubmitter(self)
         
         self._initialize_client()
     
+    @classmethod
+    def shared(
+        cls,
+        private_key: str,
+        funder: str,
+        api_key: Optional[str] = None,
+        api_secret: Optional[str] = None,
+        api_passphrase: Optional[str] = None,
+    ) -> "PolyClient":
+        """Клиент из реестра процесса (живет, пока на него ссылается хотя бы один монитор)."""
+        key = (private_key, funder, api_key, api_secret, api_passphrase)
+        client = cls._registry.get(key)
+        if client is None or not client.is_ready():
+            client = cls(private_key, funder, api_key, api_secret, api_passphrase)
+            cls._registry[key] = client
+        return client
+    
     def _initialize_client(self) -> bool:
         if self.client:
             return True
@@ -49,7 +131,7 @@ class PolyClient:
             return False
         
         try:
-            self.client = ClobClient(
+            self.client = _CachedClobClient(
                 HOST,
                 key=self.private_key,
                 chain_id=CHAIN_ID,
@@ -110,6 +192,11 @@ class PolyClient:
         return False
     
     def refresh_credentials(self) -> bool:
+        """
+        Синхронное обновление (сетевые вызовы ClobClient). Новые credentials
+        ставятся одним set_api_creds: ордер в другом потоке подписывается
+        либо старыми, либо новыми целиком.
+        """
         if not self.client:
             return False
         
@@ -138,9 +225,53 @@ class PolyClient:
         print("❌ Не удалось обновить credentials")
         return False
     
-    def _check_credentials_refresh(self):
-        if time.time() - self._last_creds_refresh > self._creds_refresh_interval:
-            self.refresh_credentials()
+    async def refresh(self, force: bool = False) -> bool:
+        """
+        Обновление credentials в пуле clob_pool, одно на клиент: конкурентные
+        вызовы (фоновый цикл, 401 у нескольких ордеров) ждут одно и то же.
+
+        Args:
+            force: обновить, даже если обновлялись меньше _creds_min_gap секунд назад
+        """
+        if self._refreshing is None:
+            if not force and time.time() - self._last_creds_refresh < self._creds_min_gap:
+                return True
+            # Без owner: обновление не занимает слоты ордеров пользователя в пуле
+            self._refreshing = asyncio.ensure_future(clob_pool.run(self.refresh_credentials))
+            self._refreshing.add_done_callback(self._refreshed)
+        return await asyncio.shield(self._refreshing)
+    
+    def _refreshed(self, future: asyncio.Future):
+        self._refreshing = None
+        if not future.cancelled():
+            future.exception()
+    
+    def ensure_refresher(self):
+        """Запускает фоновое обновление credentials (один цикл на клиент и цикл событий)."""
+        if self._refresher is None or self._refresher.done():
+            self._refresher = detached(self._refresher_loop(weakref.ref(self)), name=f"creds:{self.funder[:8]}")
+    
+    @staticmethod
+    async def _refresher_loop(ref: "weakref.ref[PolyClient]"):
+        """
+        Обновляет credentials до истечения интервала, а не в пути ордера.
+        Между итерациями держит только weakref: клиент без мониторов удаляется из реестра,
+        и цикл завершается.
+        """
+        while True:
+            client = ref()
+            if client is None or not client.is_ready():
+                return
+            delay = client._last_creds_refresh + client._creds_refresh_interval - time.time()
+            if delay <= 0:
+                try:
+                    ok = await client.refresh(force=True)
+                except Exception as e:
+                    print(f"⚠️ Фоновое обновление credentials: {e}")
+                    ok = False
+                delay = client._creds_refresh_interval if ok else client._creds_retry_interval
+            del client
+            await asyncio.sleep(delay)
     
     def is_ready(self) -> bool:
         return self.client is not None
@@ -149,8 +280,13 @@ class PolyClient:
         self,
         token_id: str,
         amount: float,
-        order_type: OrderType = OrderType.FOK
+        order_type: OrderType = OrderType.FOK,
+        idempotency_key: Optional[str] = None,
     ) -> Tuple[bool, str]:
+        """
+        Args:
+            idempotency_key: ключ логической сделки; повтор с тем же ключом не шлет второй ордер
+        """
         if not self.is_ready():
             return False, "Клиент не инициализирован"
         
@@ -160,53 +296,24 @@ class PolyClient:
         if not token_id:
             return False, "Отсутствует token_id"
         
-        self._check_credentials_refresh()
+        self.ensure_refresher()
         
-        order_args = MarketOrderArgs(
-            token_id=str(token_id),
-            amount=amount,
-            side=BUY,
-            order_type=order_type
-        )
+        print(f"🛒 Покупка: token_id={token_id}, amount=${amount}")
+        success, message = await self.orders.submit(str(token_id), amount, BUY, order_type, idempotency_key)
         
-        try:
-            print(f"🛒 Покупка: token_id={token_id}, amount=${amount}")
-            
-            signed = self.client.create_market_order(order_args)
-            response = self.client.post_order(signed, order_type)
-            
-            print(f"✅ Покупка успешна: {response}")
+        if success:
+            print(f"✅ Покупка успешна: {message}")
             return True, "Покупка выполнена"
-            
-        except PolyApiException as e:
-            if getattr(e, "status_code", None) == 401:
-                print("🔐 401 Unauthorized - обновляем credentials...")
-                
-                if self.refresh_credentials():
-                    try:
-                        signed = self.client.create_market_order(order_args)
-                        response = self.client.post_order(signed, order_type)
-                        print(f"✅ Покупка успешна после обновления: {response}")
-                        return True, "Покупка выполнена после обновления credentials"
-                    except Exception as retry_error:
-                        print(f"❌ Повторная попытка неудачна: {retry_error}")
-                        return False, f"Ошибка после обновления: {retry_error}"
-                else:
-                    return False, "Не удалось обновить credentials"
-            
-            print(f"❌ PolyApiException: {e}")
-            return False, f"Ошибка API: {e}"
-            
-        except Exception as e:
-            print(f"❌ Ошибка покупки: {e}")
-            traceback.print_exc()
-            return False, f"Ошибка: {e}"
+        
+        print(f"❌ Ошибка покупки: {message}")
+        return False, message
     
     async def sell(
         self,
         token_id: str,
         amount: float,
-        order_type: OrderType = OrderType.GTC
+        order_type: OrderType = OrderType.GTC,
+        idempotency_key: Optional[str] = None,
     ) -> Tuple[bool, str]:
         if not self.is_ready():
             return False, "Клиент не инициализирован"
@@ -217,47 +324,103 @@ class PolyClient:
         if not token_id:
             return False, "Отсутствует token_id"
         
-        self._check_credentials_refresh()
+        self.ensure_refresher()
         
-        order_args = MarketOrderArgs(
-            token_id=str(token_id),
-            amount=amount,
-            side=SELL,
-            order_type=order_type
-        )
+        print(f"💸 Продажа: token_id={token_id}, amount={amount}")
+        success, message = await self.orders.submit(str(token_id), amount, SELL, order_type, idempotency_key)
         
-        try:
-            print(f"💸 Продажа: token_id={token_id}, amount={amount}")
-            
-            signed = self.client.create_market_order(order_args)
-            response = self.client.post_order(signed, order_type)
-            
-            print(f"✅ Продажа успешна: {response}")
+        if success:
+            print(f"✅ Продажа успешна: {message}")
             return True, "Продажа выполнена"
-            
-        except PolyApiException as e:
-            if getattr(e, "status_code", None) == 401:
-                print("🔐 401 Unauthorized - обновляем credentials...")
-                
-                if self.refresh_credentials():
-                    try:
-                        signed = self.client.create_market_order(order_args)
-                        response = self.client.post_order(signed, order_type)
-                        print(f"✅ Продажа успешна после обновления: {response}")
-                        return True, "Продажа выполнена после обновления credentials"
-                    except Exception as retry_error:
-                        print(f"❌ Повторная попытка неудачна: {retry_error}")
-                        return False, f"Ошибка после обновления: {retry_error}"
-                else:
-                    return False, "Не удалось обновить credentials"
-            
-            print(f"❌ PolyApiException: {e}")
-            return False, f"Ошибка API: {e}"
-            
-        except Exception as e:
-            print(f"❌ Ошибка продажи: {e}")
-            traceback.print_exc()
-            return False, f"Ошибка: {e}"
+        
+        print(f"❌ Ошибка продажи: {message}")
+        return False, message
     
     async def close_position(self, token_id: str, size: float) -> Tuple[bool, str]:
-        return await self.sell(token_id, size)
\ No newline at end of file
+        return await self.sell(token_id, size)
+    
+    async def prefetch(self, token_ids: Iterable[str]) -> int:
+        """Прогрев метаданных токенов (tick size, neg-risk, fee rate) до первой сделки."""
+        return await market_meta.prefetch(token_ids)
+
+
+class ClientPool:
+    """
+    Готовые PolyClient по пользователям (ключам) для мониторов и хендлеров.
+
+    - Создание ClobClient и derive credentials - в пуле clob_pool, не в цикле событий;
+      параллельные запросы одного клиента ждут одно создание
+    - Прогрев заранее (регистрация, открытие меню) - фоновый get() в warming:
+      первый ордер не платит за инициализацию
+    - Пул держит клиент, пока тот нужен хотя бы раз в idle_ttl секунд; мониторы
+      держат его сами (реестр PolyClient.shared), вытеснение из пула их не трогает
+    """
+
+    def __init__(self, idle_ttl: float = 1800, max_clients: int = 1000):
+        """
+        Args:
+            idle_ttl: через сколько секунд без обращений клиент вытесняется
+            max_clients: максимум клиентов в пуле (LRU)
+        """
+        self.idle_ttl = idle_ttl
+        self.max_clients = max_clients
+
+        self.clients: "OrderedDict[tuple, Tuple[float, PolyClient]]" = OrderedDict()
+        self.pending: Dict[tuple, asyncio.Future] = {}
+        self.warming = Inflight("прогрев клиентов")
+        self.counters: Dict[str, int] = {"hits": 0, "created": 0, "failed": 0, "evicted": 0}
+
+    def _evict(self, now: float):
+        while self.clients:
+            key, (used_at, _) = next(iter(self.clients.items()))
+            if now - used_at <= self.idle_ttl and len(self.clients) <= self.max_clients:
+                break
+            del self.clients[key]
+            self.counters["evicted"] += 1
+
+    async def _create(self, key: tuple) -> PolyClient:
+        client = await clob_pool.run(PolyClient.shared, *key)
+        if client.is_ready():
+            self.counters["created"] += 1
+            self.clients[key] = (time.time(), client)
+            self._evict(time.time())
+        else:
+            self.counters["failed"] += 1
+        return client
+
+    def _created(self, key: tuple, future: asyncio.Future):
+        self.pending.pop(key, None)
+        if not future.cancelled():
+            future.exception()
+
+    async def get(
+        self,
+        private_key: str,
+        funder: str,
+        api_key: Optional[str] = None,
+        api_secret: Optional[str] = None,
+        api_passphrase: Optional[str] = None,
+    ) -> PolyClient:
+        """Готовый клиент из пула или новый, созданный вне цикла событий."""
+        key = (private_key, funder, api_key, api_secret, api_passphrase)
+        now = time.time()
+        self._evict(now)
+
+        cached = self.clients.get(key)
+        if cached is not None and cached[1].is_ready():
+            self.counters["hits"] += 1
+            self.clients[key] = (now, cached[1])
+            self.clients.move_to_end(key)
+            return cached[1]
+
+        future = self.pending.get(key)
+        if future is None:
+            future = self.pending[key] = asyncio.ensure_future(self._create(key))
+            future.add_done_callback(lambda done: self._created(key, done))
+        return await asyncio.shield(future)
+
+    def snapshot(self) -> Dict:
+        return {**self.counters, "clients": len(self.clients), "pending": len(self.pending)}
+
+
+client_pool = ClientPool(Config.CLIENT_IDLE_TTL)
@@ -0,0 +1,291 @@
+import time
+import asyncio
+import traceback
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from src.models.position import Position
+from src.core.PolyCopy import PolyCopy
+from src.core.PolyScrapper import PolyScrapper
+from src.core.PolyFills import fill_key
+from src.core.PolyWheel import Periodic, wheel
+from src.core.PolyShutdown import Inflight
+from utils.deadline import deadline, detached
+
+MarketKey = Tuple[str, str]  # (conditionId, outcome)
+
+
+class _MarketWindow:
+    """
+    Скользящее окно одного рынка: кошелек -> время последней покупки.
+
+    OrderedDict упорядочен по времени (move_to_end при повторной покупке),
+    поэтому устаревшие кошельки снимаются с начала за O(1).
+    """
+
+    __slots__ = ("last_seen", "last_bet")
+
+    def __init__(self):
+        self.last_seen: "OrderedDict[str, float]" = OrderedDict()
+        self.last_bet: Dict[str, Position] = {}
+
+    def add(self, wallet: str, bet: Position, now: float):
+        self.last_seen[wallet] = now
+        self.last_seen.move_to_end(wallet)
+        self.last_bet[wallet] = bet
+
+    def expire(self, cutoff: float):
+        while self.last_seen:
+            wallet, ts = next(iter(self.last_seen.items()))
+            if ts >= cutoff:
+                break
+            self.last_seen.popitem(last=False)
+            self.last_bet.pop(wallet, None)
+
+    def wallets_since(self, cutoff: float, wallets: Set[str]) -> List[str]:
+        """Кошельки из wallets, покупавшие не раньше cutoff (от свежих к старым)."""
+        found = []
+        for wallet in reversed(self.last_seen):
+            if self.last_seen[wallet] < cutoff:
+                break
+            if wallet in wallets:
+                found.append(wallet)
+        return found
+
+
+class ConsensusWatcher:
+    """
+    Подписка пользователя: сигнал, когда k из его кошельков купили
+    один и тот же исход (conditionId, outcome) за window секунд.
+
+    Сработавший сигнал проходит обычный путь PolyCopy (фильтры + исполнение).
+    """
+
+    def __init__(
+        self,
+        copy: PolyCopy,
+        wallets: List[str],
+        k: int = 2,
+        window: float = 600,
+        callback_func: Optional[Callable] = None,
+    ):
+        """
+        Args:
+            copy: PolyCopy пользователя (фильтры, маржа, клиент, SL/TP)
+            wallets: кошельки на треке
+            k: сколько разных кошельков нужно для сигнала
+            window: окно в секундах
+            callback_func: async (wallets, position, message, trade_executed, trade_message)
+        """
+        self.copy = copy
+        self.wallets: Set[str] = set(wallets)
+        self.k = max(1, min(k, len(self.wallets))) if self.wallets else k
+        self.window = window
+        self.callback_func = callback_func
+
+        self.fired: Dict[MarketKey, float] = {}
+        self.scrappers = {wallet: PolyScrapper.shared(wallet) for wallet in self.wallets}
+
+        self.hub: Optional["ConsensusHub"] = None
+        self.sl_tp_job: Optional[Periodic] = None
+
+    def should_fire(self, market: MarketKey, now: float) -> bool:
+        fired_at = self.fired.get(market)
+        return fired_at is None or now - fired_at >= self.window
+
+    async def on_signal(self, market: MarketKey, bet: Position, wallets: List[str]) -> bool:
+        print(f"\n🤝 Консенсус {len(wallets)}/{len(self.wallets)}: {bet.title[:50]} — {bet.outcome}")
+        self.copy.stats.record_bet(bet)
+
+        callback = None
+        if self.callback_func:
+            async def callback(*args):
+                await self.callback_func(wallets, *args)
+
+        # first_bet проверяется по кошельку, замкнувшему консенсус. Скраппер передается
+        # в вызов, а не подменяется в общем PolyCopy: сигналы обрабатываются параллельно
+        return await self.copy.copy_bet(bet, callback, scrapper=self.scrappers.get(wallets[0]))
+
+    async def run(self, hub: "ConsensusHub") -> Tuple[str, Optional[Position]]:
+        """
+        Подписка на время settings.exp_at (аналог PolyCopy.monitoring_wallets).
+
+        Returns:
+            Tuple[str, Optional[Position]]: (причина остановки, последняя позиция)
+        """
+        settings = self.copy.settings
+        stop_at = settings.started_at + settings.exp_at
+        risk = self.copy.risk
+
+        print(f"\n🤝 Консенсус-режим: {self.k} из {len(self.wallets)} за {self.window:.0f}s")
+
+        sl_tp_job = self.sl_tp_job = None
+        if self.copy.is_trading_enabled() and risk is not None and risk.is_enabled():
+            sl_tp_job = self.sl_tp_job = wheel.every(risk.interval, risk.check, jitter=True)
+
+        self.hub = hub
+        hub.subscribe(self)
+        hub.ensure_running()
+        try:
+            await wheel.sleep(stop_at - time.time())
+            print(f"\n⏰ Время консенсус-мониторинга истекло")
+            return ("время истекло", None)
+        finally:
+            hub.unsubscribe(self)
+            await self.copy.stats.export()
+            if risk is not None:
+                risk.release()
+            if sl_tp_job is not None:
+                await sl_tp_job.stop()
+
+    async def drain(self):
+        """
+        Остановка приема перед рестартом: отписка от хаба и сверок SL/TP,
+        уже сработавшие сигналы (фильтры + ордер) дорабатывают. Сам run() завершает отмена.
+        """
+        if self.hub is not None:
+            self.hub.unsubscribe(self)
+            await self.hub.inflight.wait()
+        if self.sl_tp_job is not None:
+            await self.sl_tp_job.stop(cancel_running=False)
+
+
+class ConsensusHub:
+    """
+    Потоковое объединение сделок кошельков для консенсус-режима.
+
+    - Каждый кошелек опрашивается один раз, сколько бы пользователей его ни отслеживали
+    - Окна рынков общие для всех подписчиков (хранятся на максимальное окно)
+    - Новая покупка проверяет только подписчиков этого кошелька
+    """
+
+    def __init__(self, interval: float = 2, max_age: int = 5):
+        self.interval = interval
+        # Бюджет одной итерации опроса (запросы и сработавшие из нее сигналы с ордерами)
+        self.budget = 10.0
+        self.max_age = max_age
+
+        self.watchers: Set[ConsensusWatcher] = set()
+        self.by_wallet: Dict[str, Set[ConsensusWatcher]] = {}
+        self.markets: Dict[MarketKey, _MarketWindow] = {}
+        self.seen: Dict[str, float] = {}
+
+        self.max_window = 0.0
+
+        self._task: Optional[asyncio.Task] = None
+        self._last_prune = 0.0
+        # Сработавшие сигналы (фильтры + ордер) дожидаются при остановке
+        self.inflight = Inflight("сигналы консенсуса")
+
+    def subscribe(self, watcher: ConsensusWatcher):
+        self.watchers.add(watcher)
+        for wallet in watcher.wallets:
+            self.by_wallet.setdefault(wallet, set()).add(watcher)
+        self.max_window = max(self.max_window, watcher.window)
+
+    def unsubscribe(self, watcher: ConsensusWatcher):
+        self.watchers.discard(watcher)
+        for wallet in watcher.wallets:
+            subscribers = self.by_wallet.get(wallet)
+            if subscribers is None:
+                continue
+            subscribers.discard(watcher)
+            if not subscribers:
+                del self.by_wallet[wallet]
+        self.max_window = max((w.window for w in self.watchers), default=0.0)
+
+    def on_trade(
+        self,
+        wallet: str,
+        bet: Position,
+        now: Optional[float] = None,
+    ) -> List[Tuple[ConsensusWatcher, MarketKey, Position, List[str]]]:
+        """
+        Учитывает покупку кошелька и возвращает сработавшие подписки.
+
+        Returns:
+            List: (подписчик, рынок, ставка, кошельки консенсуса)
+        """
+        if bet.side != "BUY":
+            return []
+
+        now = now if now is not None else time.time()
+        market = (bet.conditionId, bet.outcome)
+        window = self.markets.get(market)
+        if window is None:
+            window = self.markets[market] = _MarketWindow()
+        window.expire(now - self.max_window)
+        window.add(wallet, bet, now)
+
+        triggered = []
+        for watcher in self.by_wallet.get(wallet, ()):
+            wallets = window.wallets_since(now - watcher.window, watcher.wallets)
+            if len(wallets) >= watcher.k and watcher.should_fire(market, now):
+                watcher.fired[market] = now
+                triggered.append((watcher, market, bet, wallets))
+        return triggered
+
+    def prune(self, now: float):
+        """Снимает пустые окна рынков и старые ключи (раз в минуту)."""
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+
+        cutoff = now - self.max_window
+        for market in list(self.markets):
+            window = self.markets[market]
+            window.expire(cutoff)
+            if not window.last_seen:
+                del self.markets[market]
+
+        for key in [k for k, ts in self.seen.items() if now - ts > self.max_age * 120]:
+            del self.seen[key]
+
+        for watcher in self.watchers:
+            for market in [m for m, ts in watcher.fired.items() if now - ts >= watcher.window]:
+                del watcher.fired[market]
+
+    async def _dispatch(self, watcher: ConsensusWatcher, market: MarketKey, bet: Position, wallets: List[str]):
+        try:
+            await watcher.on_signal(market, bet, wallets)
+        except Exception as e:
+            print(f"❌ Ошибка обработки консенсуса: {e}")
+            traceback.print_exc()
+
+    async def _poll(self, wallet: str, scrapper: PolyScrapper, now: float):
+        for bet in await scrapper.get_last_activity(self.max_age):
+            key = f"{wallet}_{fill_key(bet)}"
+            if key in self.seen:
+                continue
+            self.seen[key] = now
+            for trigger in self.on_trade(wallet, bet, now):
+                self.inflight.spawn(self._dispatch(*trigger))
+
+    async def run(self):
+        """
+        Общий цикл опроса; завершается, когда не осталось подписчиков.
+        Скрапперы общие на процесс (PolyScrapper.shared, общая HTTP-сессия) и живут,
+        пока кошелек есть у подписчиков: отписанные кошельки не копятся.
+        """
+        while self.watchers:
+            now = time.time()
+            wallets = list(self.by_wallet)
+
+            with deadline(self.budget, root=True):
+                results = await asyncio.gather(
+                    *(self._poll(wallet, PolyScrapper.shared(wallet), now) for wallet in wallets),
+                    return_exceptions=True,
+                )
+            for wallet, result in zip(wallets, results):
+                if isinstance(result, Exception):
+                    print(f"⚠️ Ошибка опроса {wallet[:8]}...: {result}")
+
+            self.prune(now)
+            await asyncio.sleep(self.interval)
+
+    def ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = detached(self.run())
+
+
+consensus = ConsensusHub()
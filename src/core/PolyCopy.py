@@ -3,11 +3,16 @@ import asyncio
 import traceback
 from typing import Tuple, Optional, Dict, List, Callable
 
-from utils.decorator import retry_async
 from src.models.settings import Settings
 from src.models.position import Position
 from src.core.PolyScrapper import PolyScrapper
 from src.core.PolyClient import PolyClient
+from src.core.PolyRisk import PolyRisk
+from src.core.PolyPaper import PolyPaper
+from src.core.PolyRules import compile_rule
+from src.core.PolyStats import PolyStats
+from src.core.PolyFills import FillAggregator, fill_key
+from src.core.PolyCheckpoint import Checkpointer, Entries, shared_entries, restore_shared, attach_shared
 
 
 class PolyCopy:
@@ -18,8 +23,20 @@ class PolyCopy:
     - Мониторинг новых сделок (только отслеживание)
     - Копирование сделок 
     - Управление SL/TP
+    - Зеркалирование выходов лидера (SELL / REDEEM)
     - Фильтрация сделок
+    - Контроль задержки: запаздывающие сигналы копируются меньшим размером или пропускаются
+    - Чекпоинт состояния в БД (дедупликация, позиции, выходы) для быстрого рестарта
     """
+
+    __slots__ = (
+        "settings", "scrapper", "client", "margin_amount", "_owns_risk", "risk", "rule", "stats",
+        "market_transactions", "processed_bets", "fills", "leader_sizes", "copied_positions",
+        "last_processed_timestamp", "_last_prune", "checkpoint",
+    )
+    
+    # Доля размера копии при задержке max_staleness (между stale_after и max_staleness - линейно)
+    MIN_STALE_FACTOR = 0.25
     
     def __init__(
         self,
@@ -27,26 +44,101 @@ class PolyCopy:
         scrapper: PolyScrapper,
         client: Optional[PolyClient] = None,
         margin_amount: float = 0,
+        risk: Optional[PolyRisk] = None,
+        stats: Optional[PolyStats] = None,
+        processed_bets: Optional[Dict[str, float]] = None,
     ):
+        """
+        Args:
+            risk: общий контроль SL/TP (PolySession); если не передан, создается свой
+            processed_bets: общий индекс дедупликации (PolySession)
+        """
         self.settings = settings
         self.scrapper = scrapper
         self.client = client
         self.margin_amount = margin_amount
         
-        # Списки для хранения данных
-        self.found_positions: List[Position] = []
-        self.tracked_positions: List[Dict] = []
+        # Чужой (общий) risk запускает и освобождает его владелец
+        self._owns_risk = risk is None
+        
+        # SL/TP считается по собственному аккаунту (client.funder), а не по лидеру
+        if risk is None:
+            risk = PolyRisk.for_client(client, settings)
+        self.risk = risk
+        
+        # Правило компилируется один раз на монитор (и кешируется между мониторами)
+        self.rule = compile_rule(settings.rule) if settings.rule else None
+        
+        # Статистика с ограниченной памятью
+        self.stats = stats or PolyStats()
         
         # Дедупликация и защита от накрутки
         self.market_transactions: Dict[str, List[float]] = {}
-        self.processed_bets: Dict[str, float] = {}
+        self.processed_bets: Dict[str, float] = processed_bets if processed_bets is not None else {}
+        
+        # Частичные исполнения лидера склеиваются в одну сделку до фильтров
+        self.fills = FillAggregator(window=settings.fill_window)
+        
+        # Зеркалирование выходов: позиции лидера (по наблюдаемым покупкам)
+        # и наши скопированные позиции этого лидера, по token_id
+        self.leader_sizes: Dict[str, float] = {}
+        self.copied_positions: Dict[str, Dict] = {}
         
         self.last_processed_timestamp = 0
+        self._last_prune = 0.0
+        
+        self.checkpoint: Optional[Checkpointer] = None
+    
+    def _save(self, kind: str, key: str, value, shared: bool = False):
+        """Дельта состояния в чекпоинт; ключи лидера префиксуются его адресом."""
+        if self.checkpoint is not None:
+            self.checkpoint.record(kind, key if shared else f"{self.scrapper.address}|{key}", value)
+    
+    def checkpoint_entries(self, include_shared: bool = True) -> Entries:
+        """Снимок состояния для компактизации журнала."""
+        prefix = f"{self.scrapper.address}|"
+        entries: Entries = [("copy", prefix + k, v) for k, v in self.copied_positions.items()]
+        entries += [("leader", prefix + k, v) for k, v in self.leader_sizes.items()]
+        entries += [("mtx", prefix + k, v) for k, v in self.market_transactions.items() if v]
+        if include_shared:
+            entries += shared_entries(self.processed_bets, self.risk)
+        return entries
+    
+    def restore_state(self, state: Dict[str, Dict], include_shared: bool = True):
+        """Восстанавливает состояние из Checkpointer.restore() (до attach_checkpoint)."""
+        prefix = f"{self.scrapper.address}|"
+        for kind, target in (
+            ("copy", self.copied_positions),
+            ("leader", self.leader_sizes),
+            ("mtx", self.market_transactions),
+        ):
+            for key, value in state.get(kind, {}).items():
+                if key.startswith(prefix):
+                    target[key[len(prefix):]] = value
+        if include_shared:
+            restore_shared(state, self.processed_bets, self.risk)
+    
+    def attach_checkpoint(self, checkpoint: Checkpointer, include_shared: bool = True):
+        """
+        Подключает чекпоинт. include_shared=False - общую часть (дедупликация, SL/TP)
+        пишет владелец (PolySession).
+        """
+        self.checkpoint = checkpoint
+        if include_shared:
+            checkpoint.state_func = self.checkpoint_entries
+            attach_shared(checkpoint, self.risk)
     
     
     def _get_bet_key(self, bet: Position) -> str:
-        """Создает уникальный ключ для ставки."""
-        return f"{bet.conditionId}_{bet.title}_{bet.outcome}_{round(bet.price, 4)}"
+        """
+        Создает уникальный ключ для ставки.
+        
+        Индекс дедупликации общий на сессию: в ключе покупки адрес лидера,
+        иначе такая же покупка второго лидера отбрасывается как дубль.
+        """
+        if bet.side != "BUY":
+            return f"{bet.side}_{bet.transactionHash or bet.timestamp}_{bet.conditionId}_{bet.token_id}"
+        return f"{self.scrapper.address}_{bet.conditionId}_{bet.title}_{bet.outcome}_{round(bet.price, 4)}"
     
     def _is_bet_processed(self, bet: Position, current_time: float) -> bool:
         bet_key = self._get_bet_key(bet)
@@ -57,6 +149,16 @@ class PolyCopy:
                 return True
         
         self.processed_bets[bet_key] = current_time
+        self._save("bet", bet_key, current_time, shared=True)
+        self._prune(current_time)
+        
+        return False
+    
+    def _prune(self, current_time: float, every: float = 60):
+        """Чистит старые ключи дедупликации и пустые рынки не чаще раза в минуту."""
+        if current_time - self._last_prune < every:
+            return
+        self._last_prune = current_time
         
         old_keys = [
             k for k, t in self.processed_bets.items() 
@@ -65,11 +167,26 @@ class PolyCopy:
         for k in old_keys:
             del self.processed_bets[k]
         
-        return False
+        stale_markets = [
+            k for k, timestamps in self.market_transactions.items()
+            if not timestamps or current_time - timestamps[-1] > 3600
+        ]
+        for k in stale_markets:
+            del self.market_transactions[k]
     
     def is_trading_enabled(self) -> bool:
         return self.client is not None and self.margin_amount > 0
     
+    @property
+    def found_positions(self) -> List[Position]:
+        """Последние найденные позиции (кольцевой буфер)."""
+        return list(self.stats.recent_found or ())
+    
+    @property
+    def tracked_positions(self) -> Dict[str, Dict]:
+        """Отслеживаемые позиции по token_id."""
+        return self.risk.tracked_positions if self.risk else {}
+    
     
     async def _check_multiple_orders(
         self,
@@ -92,21 +209,49 @@ class PolyCopy:
             return False
         
         self.market_transactions[market_key].append(now)
+        self._save("mtx", market_key, self.market_transactions[market_key])
         return True
     
-    async def custom_filter(self, bet: Position) -> Tuple[str, Optional[Position]]:
+    def save_market_transactions(self, bets: List[Position]):
+        """Пишет в чекпоинт историю рынков после пакетной проверки накрутки (BatchFilter)."""
+        for market_key in {f"{bet.title}_{bet.outcome}" for bet in bets}:
+            self._save("mtx", market_key, self.market_transactions.get(market_key, []))
+    
+    async def _basic_filter(self, bet: Position) -> Optional[str]:
+        """Сумма, цена, правило и накрутка (то, что BatchFilter считает пакетно). None - прошла."""
+        if bet.usdcSize < self.settings.min_amount:
+            return "слишком маленькая сумма"
+        
+        if not (self.settings.min_quote < bet.price < self.settings.max_quote):
+            return "не подходит по цене"
+        
+        if self.rule is not None and not self.rule(bet):
+            return "не подходит под правило"
+        
+        if not await self._check_multiple_orders(bet):
+            return "обнаружена накрутка транзакций"
+        
+        return None
+    
+    async def custom_filter(
+        self,
+        bet: Position,
+        scrapper: Optional[PolyScrapper] = None,
+        prefiltered: bool = False,
+    ) -> Tuple[str, Optional[Position]]:
+        """
+        Args:
+            scrapper: кошелек, по которому проверяется first_bet (по умолчанию - лидер этого PolyCopy)
+            prefiltered: сумма, цена, правило и накрутка уже проверены BatchFilter
+        """
         try:
-            if bet.usdcSize < self.settings.min_amount:
-                return ("слишком маленькая сумма", None)
-            
-            if not (self.settings.min_quote < bet.price < self.settings.max_quote):
-                return ("не подходит по цене", None)
-            
-            if not await self._check_multiple_orders(bet):
-                return ("обнаружена накрутка транзакций", None)
+            if not prefiltered:
+                reason = await self._basic_filter(bet)
+                if reason is not None:
+                    return (reason, None)
             
             if self.settings.first_bet:
-                positions = await self.scrapper.get_last_bets()
+                positions = await (scrapper or self.scrapper).get_last_bets()
                 
                 if positions is None:
                     return ("не удалось получить последние ставки", None)
@@ -127,8 +272,53 @@ class PolyCopy:
             return (f"ошибка: {e}", None)
     
 
-    @retry_async(attempts=3)
-    async def execute_trade(self, bet: Position) -> Tuple[bool, str]:
+    def _signal_age(self, bet: Position, now: Optional[float] = None) -> Optional[float]:
+        """Задержка от сделки лидера в секундах (None, если время сделки неизвестно)."""
+        if not bet.timestamp:
+            return None
+        return max(0.0, (now or time.time()) - float(bet.timestamp))
+    
+    def is_stale(self, bet: Position) -> bool:
+        """Сигнал запоздал настолько, что copy_bet отсечет его до фильтров."""
+        return self._stale_factor(self._signal_age(bet)) == 0
+    
+    def _stale_factor(self, age: Optional[float]) -> float:
+        """Множитель размера копии по задержке: 1 - свежий сигнал, 0 - пропустить."""
+        if age is None:
+            return 1.0
+        
+        max_staleness = self.settings.max_staleness
+        if max_staleness is not None and age > max_staleness:
+            return 0.0
+        
+        stale_after = self.settings.stale_after
+        if stale_after is None or age <= stale_after:
+            return 1.0
+        if max_staleness is None or max_staleness <= stale_after:
+            return self.MIN_STALE_FACTOR
+        
+        progress = (age - stale_after) / (max_staleness - stale_after)
+        return 1.0 - progress * (1.0 - self.MIN_STALE_FACTOR)
+    
+    def _reject_stale(self, age: float) -> str:
+        reason = f"устаревший сигнал: {age:.0f}s > {self.settings.max_staleness}s"
+        print(f"   ⌛ Пропуск: {reason}")
+        self.stats.record_rejection(reason)
+        return reason
+    
+    def _order_key(self, bet: Position, token_id: Optional[str] = None) -> str:
+        """Ключ идемпотентности ордера: одна ставка (выход) лидера - не больше одного нашего ордера."""
+        owner = getattr(self.client, "funder", "") or id(self)
+        return f"{owner}:{self._get_bet_key(bet)}:{token_id or bet.token_id}"
+    
+    async def execute_trade(self, bet: Position, amount: Optional[float] = None) -> Tuple[bool, str]:
+        """
+        Покупка по ставке лидера.
+        
+        Повторы (с ключом идемпотентности и сверкой ордеров) делает клиент,
+        здесь не повторяем: слепой повтор после таймаута мог дублировать ордер.
+        """
+        amount = self.margin_amount if amount is None else amount
 
         if not self.is_trading_enabled():
             return False, "Торговля не включена (режим мониторинга)"
@@ -139,13 +329,14 @@ class PolyCopy:
         try:
             print(f"🔍 Исполняю сделку:")
             print(f"   Token ID: {bet.token_id}")
-            print(f"   Amount: ${self.margin_amount}")
+            print(f"   Amount: ${amount}")
             print(f"   Market: {bet.title[:50]}")
             print(f"   Outcome: {bet.outcome}")
             
             success, message = await self.client.buy(
                 token_id=str(bet.token_id),
-                amount=self.margin_amount
+                amount=amount,
+                idempotency_key=self._order_key(bet)
             )
             
             return success, message
@@ -156,89 +347,136 @@ class PolyCopy:
             return False, f"Ошибка: {str(e)}"
     
     
-    async def check_sl_tp(self):
-        if not self.is_trading_enabled():
+    def _observe_leader_buy(self, bet: Position, current_time: float):
+        """Учитывает покупку лидера в его позиции (каждый fill один раз)."""
+        key = f"FILL_{fill_key(bet)}"
+        if key in self.processed_bets:
             return
-        
+        self.processed_bets[key] = current_time
+        self._save("bet", key, current_time, shared=True)
+        if bet.size:
+            token_id = str(bet.token_id)
+            self.leader_sizes[token_id] = self.leader_sizes.get(token_id, 0.0) + float(bet.size)
+            self._save("leader", token_id, self.leader_sizes[token_id])
+    
+    def _remember_copy(self, bet: Position, amount: float):
+        token_id = str(bet.token_id)
+        size = float(amount) / bet.price if bet.price else 0.0
+        copied = self.copied_positions.setdefault(token_id, {
+            "conditionId": bet.conditionId,
+            "title": bet.title,
+            "size": 0.0,
+        })
+        copied["size"] += size
+        self._save("copy", token_id, copied)
+    
+    async def _leader_holding(self, bet: Position) -> Optional[float]:
+        """Текущий размер позиции лидера по токену выхода (None - не удалось узнать)."""
         try:
-            sl_percent = getattr(self.settings, "sl_percent", None)
-            tp_percent = getattr(self.settings, "tp_percent", None)
+            return await self.scrapper.get_position_size(bet.conditionId, str(bet.token_id))
+        except Exception as e:
+            print(f"⚠️ Не удалось получить позицию лидера: {e}")
+            return None
+    
+    async def _exit_targets(self, bet: Position) -> List[Tuple[str, float]]:
+        """
+        Сопоставляет выход лидера с нашими позициями: (token_id, доля на продажу).
+        
+        Доля = проданное / позиция лидера до продажи (текущая по data-api + проданное):
+        наблюдаемые монитором покупки не видят позицию, набранную до его старта.
+        Все продаем только при REDEEM или если позиция лидера обнулилась;
+        если позиция не получена (ошибка, таймаут, токена нет в ответе) - доля
+        по наблюдаемым покупкам, а если и их нет - выход пропускается.
+        """
+        if bet.side == "REDEEM" or not bet.token_id:
+            targets = [
+                token_id for token_id, copied in self.copied_positions.items()
+                if copied["conditionId"] == bet.conditionId
+            ]
+            for token_id in targets:
+                if self.leader_sizes.pop(token_id, None) is not None:
+                    self._save("leader", token_id, None)
+            return [(token_id, 1.0) for token_id in targets]
+        
+        token_id = str(bet.token_id)
+        if token_id not in self.copied_positions:
+            return []
+        
+        sold = float(bet.size or 0)
+        if sold <= 0:
+            print(f"⚠️ Размер продажи лидера по {token_id[:10]}... неизвестен, выход не зеркалируется")
+            return []
+        
+        current = await self._leader_holding(bet)
+        if current is not None:
+            fraction = 1.0 if current <= 1e-6 else min(1.0, sold / (current + sold))
+        else:
+            held = self.leader_sizes.get(token_id, 0.0)
+            if held <= 0 or sold <= 0:
+                print(f"⚠️ Позиция лидера по {token_id[:10]}... неизвестна, выход не зеркалируется")
+                return []
+            fraction = min(1.0, sold / held)
+            current = max(0.0, held - sold)
+        
+        self.leader_sizes[token_id] = current
+        self._save("leader", token_id, current)
+        return [(token_id, fraction)]
+    
+    async def mirror_exit(self, bet: Position) -> List[Tuple[str, bool, str]]:
+        """
+        Быстрый путь для выхода лидера: без фильтров покупок,
+        сразу продаем пропорциональную долю нашей позиции через PolyClient.sell.
+        
+        Returns:
+            List[Tuple[str, bool, str]]: (token_id, успех, сообщение)
+        """
+        if not self.is_trading_enabled():
+            return []
+        
+        results = []
+        for token_id, fraction in await self._exit_targets(bet):
+            copied = self.copied_positions[token_id]
+            size = copied["size"] * fraction
             
-            if sl_percent is None and tp_percent is None:
-                return
+            # Реальный размер из сверки с аккаунтом точнее нашей оценки margin / price
+            tracked = self.tracked_positions.get(token_id)
+            if tracked and tracked.get("size"):
+                size = min(size, float(tracked["size"])) if fraction < 1 else float(tracked["size"])
             
-            positions = await self.scrapper.get_account_positions()
+            if size <= 0:
+                continue
             
-            if not positions:
-                return
+            print(f"🏃 Лидер вышел ({bet.side}): {copied['title'][:50]}")
+            print(f"   Продаем {fraction:.0%} позиции: {size:.4f} шейров")
             
-            for tracked in list(self.tracked_positions):
-                title = tracked.get("title")
-                token_id = tracked.get("token_id")
-                
-                pm_pos = next(
-                    (p for p in positions if p.get("title") == title),
-                    None
+            try:
+                success, message = await self.client.sell(
+                    token_id, size, idempotency_key=self._order_key(bet, token_id)
                 )
-                
-                if pm_pos is None:
-                    size = float(pm_pos.get("size", 0)) if pm_pos else 0
-                    if size <= 0:
-                        try:
-                            self.tracked_positions.remove(tracked)
-                        except ValueError:
-                            pass
-                    continue
-                
-                pnl = pm_pos.get("percentRealizedPnl")
-                size = float(pm_pos.get("size", 0))
-                
-                if pnl is None:
-                    continue
-                
-                if sl_percent is not None:
-                    try:
-                        if float(pnl) <= float(sl_percent):
-                            print(f"🛑 SL сработал: {title}")
-                            print(f"   PnL: {pnl}% <= {sl_percent}%")
-                            
-                            success, msg = await self.client.close_position(
-                                token_id, size
-                            )
-                            
-                            if success:
-                                try:
-                                    self.tracked_positions.remove(tracked)
-                                except ValueError:
-                                    pass
-                                print(f"   ✅ Позиция закрыта")
-                            continue
-                    except Exception as e:
-                        print(f"⚠️ Ошибка SL: {e}")
-                
-                if tp_percent is not None:
-                    try:
-                        if float(pnl) >= float(tp_percent):
-                            print(f"🎯 TP сработал: {title}")
-                            print(f"   PnL: {pnl}% >= {tp_percent}%")
-                            
-                            success, msg = await self.client.close_position(
-                                token_id, size
-                            )
-                            
-                            if success:
-                                try:
-                                    self.tracked_positions.remove(tracked)
-                                except ValueError:
-                                    pass
-                                print(f"   ✅ Позиция закрыта")
-                            continue
-                    except Exception as e:
-                        print(f"⚠️ Ошибка TP: {e}")
-                        
-        except Exception as e:
-            print(f"⚠️ Ошибка check_sl_tp: {e}")
-            traceback.print_exc()
+            except Exception as e:
+                print(f"❌ Ошибка зеркалирования выхода: {e}")
+                traceback.print_exc()
+                success, message = False, f"Ошибка: {e}"
+            
+            if success:
+                copied["size"] = max(0.0, copied["size"] - size)
+                if fraction >= 1 or copied["size"] <= 1e-6:
+                    del self.copied_positions[token_id]
+                    self._save("copy", token_id, None)
+                else:
+                    self._save("copy", token_id, copied)
+                if self.risk is not None:
+                    self.risk.reduce(token_id, size)
+            
+            self.stats.record_exit(bet, success, size, message)
+            results.append((token_id, success, message))
+        
+        return results
+    
+    async def check_sl_tp(self):
+        if not self.is_trading_enabled() or self.risk is None:
+            return []
+        return await self.risk.check()
     
 
     async def monitoring_wallets(
@@ -258,8 +496,6 @@ class PolyCopy:
             Tuple[str, Optional[Position]]: (причина остановки, последняя позиция)
         """
         start_time = self.settings.started_at
-        check_interval = 5  # Проверка SL/TP каждые 5 секунд
-        last_check_time = 0
         
         mode = "торговлей" if self.is_trading_enabled() else "мониторингом"
         
@@ -270,12 +506,196 @@ class PolyCopy:
         print(f"   - Мин. сумма: ${self.settings.min_amount}")
         print(f"   - Цена: {self.settings.min_quote} - {self.settings.max_quote}")
         print(f"   - Первая ставка: {self.settings.first_bet}")
+        if self.settings.max_staleness is not None:
+            print(f"   - Макс. задержка: {self.settings.max_staleness}s (уменьшение размера после {self.settings.stale_after}s)")
+        if self.settings.rule:
+            print(f"   - Правило: {self.settings.rule}")
         
         if self.is_trading_enabled():
             print(f"💰 Размер позиции: ${self.margin_amount}")
         
         print(f"{'='*60}\n")
         
+        # SL/TP работает отдельной задачей и не задерживает обнаружение сделок лидера
+        sl_tp_task = None
+        if self._owns_risk and self.is_trading_enabled() and self.risk is not None and self.risk.is_enabled():
+            sl_tp_task = asyncio.create_task(
+                self.risk.run(stop_at=start_time + self.settings.exp_at)
+            )
+        
+        try:
+            return await self._monitoring_loop(start_time, callback_func)
+        finally:
+            await self.stats.export()
+            if self._owns_risk and self.risk is not None:
+                self.risk.release()
+            if sl_tp_task is not None:
+                sl_tp_task.cancel()
+                try:
+                    await sl_tp_task
+                except (asyncio.CancelledError, Exception):
+                    pass
+    
+    async def copy_bet(
+        self,
+        bet: Position,
+        callback_func: Optional[Callable] = None,
+        scrapper: Optional[PolyScrapper] = None,
+        prefiltered: bool = False,
+    ) -> bool:
+        """
+        Фильтры и исполнение одной (уже новой) ставки.
+        Общий путь для мониторинга лидера и внешних сигналов (консенсус).
+        
+        Args:
+            scrapper: кошелек автора сигнала для first_bet (консенсус); по умолчанию - лидер
+            prefiltered: ставка уже прошла пакетные фильтры (PolySession + BatchFilter)
+        Returns:
+            bool: была ли исполнена сделка
+        """
+        # Запаздывающий сигнал отсекается до фильтров, чтобы не тратить на него запросы к API
+        age = self._signal_age(bet)
+        if age is not None:
+            self.stats.record_latency("signal", age)
+            if self._stale_factor(age) == 0:
+                self._reject_stale(age)
+                return False
+        
+        filter_msg, filtered_bet = await self.custom_filter(bet, scrapper, prefiltered)
+        print(f"   🔍 Фильтр: {filter_msg}")
+        
+        if filtered_bet is None:
+            self.stats.record_rejection(filter_msg)
+            return False
+        
+        self.stats.record_found(filtered_bet)
+        print(f"   ✅ Прошла все фильтры!")
+        
+        trade_executed = False
+        trade_message = ""
+        
+        if self.is_trading_enabled():
+            # Фильтры могли занять время (first_bet ходит в API) - задержку пересчитываем
+            age = self._signal_age(filtered_bet)
+            factor = self._stale_factor(age)
+            if factor == 0:
+                self._reject_stale(age)
+                return False
+            
+            amount = round(self.margin_amount * factor, 2)
+            if factor < 1:
+                print(f"   ⌛ Сигнал запаздывает на {age:.0f}s: размер уменьшен до ${amount} ({factor:.0%})")
+            if age is not None:
+                self.stats.record_latency("order", age)
+            
+            print(f"   💰 Исполнение сделки на ${amount}...")
+            success, trade_msg = await self.execute_trade(filtered_bet, amount)
+            trade_executed = success
+            trade_message = trade_msg
+            self.stats.record_trade(filtered_bet, success, amount, trade_msg)
+            
+            if trade_executed:
+                self._remember_copy(filtered_bet, amount)
+                # Добавляем в отслеживаемые позиции
+                if self.risk is not None:
+                    self.risk.track(filtered_bet.token_id, {
+                        "title": filtered_bet.title,
+                        "outcome": filtered_bet.outcome,
+                        "price": filtered_bet.price,
+                        "size": float(amount) / filtered_bet.price if filtered_bet.price else 0.0,
+                        "opened_at": time.time(),
+                        "margin_amount": amount
+                    })
+                print(f"   ✅ Сделка исполнена")
+            else:
+                print(f"   ❌ Ошибка: {trade_message}")
+        else:
+            trade_message = "Режим мониторинга (торговля отключена)"
+            print(f"   👁️ {trade_message}")
+        
+        if callback_func:
+            try:
+                await callback_func(
+                    filtered_bet,
+                    filter_msg,
+                    trade_executed,
+                    trade_message
+                )
+                print(f"   📨 Уведомление отправлено")
+            except Exception as e:
+                print(f"   ❌ Ошибка отправки уведомления: {e}")
+        
+        return trade_executed
+    
+    async def collect_bets(
+        self,
+        recent_bets: List[Position],
+        current_time: float,
+        callback_func: Optional[Callable] = None
+    ) -> List[Position]:
+        """
+        Первая половина обработки пачки: выходы лидера (сразу, мимо фильтров),
+        склейка fill'ов и дедупликация покупок.
+        
+        Returns:
+            List[Position]: новые покупки для фильтров и исполнения
+        """
+        # Выходы лидера обрабатываются первыми и мимо фильтров покупок
+        exits_ = [bet for bet in recent_bets if bet.side != "BUY"]
+        buys = [bet for bet in recent_bets if bet.side == "BUY"]
+        
+        for bet in exits_:
+            if self._is_bet_processed(bet, current_time):
+                continue
+            
+            for token_id, success, message in await self.mirror_exit(bet):
+                if callback_func:
+                    try:
+                        await callback_func(bet, f"лидер закрыл позицию ({bet.side})", success, message)
+                    except Exception as e:
+                        print(f"   ❌ Ошибка отправки уведомления: {e}")
+        
+        for bet in buys:
+            self._observe_leader_buy(bet, current_time)
+        
+        new_bets = []
+        for bet in self.fills.add(buys, current_time):
+            if self._is_bet_processed(bet, current_time):
+                continue
+            
+            new_bets.append(bet)
+            self.stats.record_bet(bet)
+            print(f"\n🆕 Новая ставка #{len(new_bets)}:")
+            print(f"   📋 {bet.title[:50]}...")
+            print(f"   🎯 Исход: {bet.outcome}")
+            print(f"   💵 Сумма: ${bet.usdcSize:.2f}")
+            print(f"   📊 Цена: {bet.price:.4f}")
+        
+        return new_bets
+    
+    async def process_bets(
+        self,
+        recent_bets: List[Position],
+        current_time: float,
+        callback_func: Optional[Callable] = None
+    ) -> int:
+        """
+        Обрабатывает пачку ставок лидера: дедупликация, фильтры, исполнение.
+        (PolySession фильтрует покупки всех лидеров пакетно, см. PolySession._tick)
+        
+        Returns:
+            int: количество новых (ранее не обработанных) ставок
+        """
+        new_bets = await self.collect_bets(recent_bets, current_time, callback_func)
+        for bet in new_bets:
+            await self.copy_bet(bet, callback_func)
+        return len(new_bets)
+    
+    async def _monitoring_loop(
+        self,
+        start_time: float,
+        callback_func: Optional[Callable] = None
+    ) -> Tuple[str, Optional[Position]]:
         while True:
             current_time = time.time()
             elapsed = current_time - start_time
@@ -284,82 +704,16 @@ class PolyCopy:
                 print(f"\n⏰ Время мониторинга истекло ({elapsed:.0f}s)")
                 return ("время истекло", None)
             
-            if self.is_trading_enabled():
-                if current_time - last_check_time >= check_interval:
-                    try:
-                        await self.check_sl_tp()
-                    except Exception as e:
-                        print(f"⚠️ Ошибка SL/TP: {e}")
-                    last_check_time = current_time
-            
             try:
-                recent_bets = await self.scrapper.get_last_bets()
+                recent_bets = await self.scrapper.get_last_activity()
                 
-                if not recent_bets:
+                if not recent_bets and not self.fills.pending:
                     print(f"⏳ Нет новых ставок... ({elapsed:.0f}s / {self.settings.exp_at}s)")
                     await asyncio.sleep(5)
                     continue
                 
                 print(f"\n📥 Получено {len(recent_bets)} ставок для анализа")
-                new_bets_found = 0
-                
-                for bet in recent_bets:
-                    if self._is_bet_processed(bet, current_time):
-                        continue
-                    
-                    new_bets_found += 1
-                    print(f"\n🆕 Новая ставка #{new_bets_found}:")
-                    print(f"   📋 {bet.title[:50]}...")
-                    print(f"   🎯 Исход: {bet.outcome}")
-                    print(f"   💵 Сумма: ${bet.usdcSize:.2f}")
-                    print(f"   📊 Цена: {bet.price:.4f}")
-                    
-                    filter_msg, filtered_bet = await self.custom_filter(bet)
-                    print(f"   🔍 Фильтр: {filter_msg}")
-                    
-                    if filtered_bet is None:
-                        continue
-                    
-                    self.found_positions.append(filtered_bet)
-                    print(f"   ✅ Прошла все фильтры!")
-                    
-                    trade_executed = False
-                    trade_message = ""
-                    
-                    if self.is_trading_enabled():
-                        print(f"   💰 Исполнение сделки на ${self.margin_amount}...")
-                        success, trade_msg = await self.execute_trade(filtered_bet)
-                        trade_executed = success
-                        trade_message = trade_msg
-                        
-                        if trade_executed:
-                            # Добавляем в отслеживаемые позиции
-                            self.tracked_positions.append({
-                                "title": filtered_bet.title,
-                                "outcome": filtered_bet.outcome,
-                                "token_id": filtered_bet.token_id,
-                                "size": float(self.margin_amount),
-                                "opened_at": time.time(),
-                                "margin_amount": self.margin_amount
-                            })
-                            print(f"   ✅ Сделка исполнена")
-                        else:
-                            print(f"   ❌ Ошибка: {trade_message}")
-                    else:
-                        trade_message = "Режим мониторинга (торговля отключена)"
-                        print(f"   👁️ {trade_message}")
-                    
-                    if callback_func:
-                        try:
-                            await callback_func(
-                                filtered_bet,
-                                filter_msg,
-                                trade_executed,
-                                trade_message
-                            )
-                            print(f"   📨 Уведомление отправлено")
-                        except Exception as e:
-                            print(f"   ❌ Ошибка отправки уведомления: {e}")
+                new_bets_found = await self.process_bets(recent_bets, current_time, callback_func)
                 
                 if new_bets_found == 0:
                     print(f"⏭️ Все ставки уже обработаны")
@@ -377,20 +731,25 @@ class PolyCopy:
             await asyncio.sleep(1)
     
     def reset_tracking(self):
-        self.found_positions.clear()
+        self.stats.reset()
         self.tracked_positions.clear()
         self.market_transactions.clear()
         self.processed_bets.clear()
+        self.leader_sizes.clear()
+        self.copied_positions.clear()
+        self.fills.clear()
         self.last_processed_timestamp = 0
         print("🔄 Статистика сброшена")
     
     def get_statistics(self) -> Dict:
+        snapshot = self.stats.snapshot()
         return {
+            **snapshot,
             "mode": "trading" if self.is_trading_enabled() else "monitoring",
-            "total_found": len(self.found_positions),
             "tracked_positions_count": len(self.tracked_positions),
-            "markets_tracked": len(self.market_transactions),
+            "markets_tracked": snapshot["markets_seen"],
             "processed_bets_count": len(self.processed_bets),
-            "tracked_positions": self.tracked_positions,
-            "found_positions": self.found_positions,
+            "tracked_positions": list(self.tracked_positions.values()),
+            "found_positions": snapshot["recent_found"],
+            "paper": self.client.summary() if isinstance(self.client, PolyPaper) else None,
         }
\ No newline at end of file
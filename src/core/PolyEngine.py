@@ -0,0 +1,349 @@
+import time
+import asyncio
+from abc import ABC, abstractmethod
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from src.core.PolyClient import client_pool
+from src.core.PolyPaper import PolyPaper, clob_books
+from src.core.PolyCopy import PolyCopy
+from src.core.PolyScrapper import PolyScrapper
+from src.core.PolySession import PolySession
+from src.core.PolyConsensus import ConsensusWatcher, consensus
+from src.core.PolyCheckpoint import Checkpointer
+
+from src.models.settings import Settings
+from src.models.position import Position
+
+# Кнопки: строки из (текст, callback_data); фронтенд сам строит клавиатуру
+Buttons = List[List[Tuple[str, str]]]
+
+FINISHED_BUTTONS: Buttons = [
+    [("🔄 Запустить новый", "start_copy_trade")],
+    [("⬅️ Главное меню", "main_menu")],
+]
+
+# Поля FSM, из которых собирается монитор (сохраняются супервизором для рестарта)
+DEFINITION_KEYS = (
+    "duration", "first_bet", "min_amount", "min_quote", "max_quote", "rule",
+    "sl_percent", "tp_percent", "trailing_percent", "max_hold", "max_staleness",
+    "consensus_k", "selected_wallets", "selected_wallet", "track_addresses",
+    "margin_amount", "paper", "paper_balance",
+)
+
+
+class Notifier(ABC):
+    """
+    Канал уведомлений пользователю.
+
+    Движок не знает о Telegram: в процессе бота это BotNotifier,
+    в процессе воркера - очередь событий до бота (PolyWorkers.QueueNotifier).
+    """
+
+    @abstractmethod
+    async def send(self, tg_id: int, text: str, parse_mode: Optional[str] = None, buttons: Optional[Buttons] = None):
+        ...
+
+
+class EngineMonitor:
+    """
+    Собранный монитор: запуск (await monitor()), снимок статистики для фронтенда
+    и drain() - остановка приема перед рестартом бота.
+    """
+
+    __slots__ = ("run", "statistics", "drain")
+
+    def __init__(
+        self,
+        run: Callable[[], Any],
+        statistics: Callable[[], Dict],
+        drain: Optional[Callable[[], Awaitable[None]]] = None,
+    ):
+        self.run = run
+        self.statistics = statistics
+        self.drain = drain
+
+    async def __call__(self):
+        return await self.run()
+
+    def status(self) -> Dict:
+        """Короткая сводка (только числа: уходит между процессами)."""
+        stats = self.statistics()
+        return {
+            "mode": stats["mode"],
+            "bets_seen": stats["bets_seen"],
+            "total_found": stats["total_found"],
+            "trades_ok": stats["trades_ok"],
+            "trades_failed": stats["trades_failed"],
+            "notional_copied": stats["notional_copied"],
+        }
+
+
+def short_wallet(wallet: str) -> str:
+    return f"{wallet[:6]}...{wallet[-4:]}"
+
+
+def monitor_id(tg_id: int) -> str:
+    return f"monitor:{tg_id}"
+
+
+def definition_wallets(definition: Dict) -> List[str]:
+    """Кошельки, за которыми следит монитор."""
+    wallets = definition.get("selected_wallets") or [definition.get("selected_wallet", "")]
+    if definition.get("consensus_k"):
+        wallets = definition.get("track_addresses") or wallets
+    return wallets
+
+
+def format_summary(title: str, stats: dict) -> str:
+    """Итоговая статистика монитора для Telegram"""
+    text = (
+        f"{title}\n\n"
+        f"👀 Новых ставок лидера: {stats['bets_seen']} (${stats['notional_seen']})\n"
+        f"📊 Найдено сделок: {stats['total_found']} (${stats['notional_found']})\n"
+        f"🎯 Отслежено рынков: {stats['markets_tracked']}\n"
+    )
+
+    leaders = stats.get("leaders") or {}
+    if len(leaders) > 1:
+        text += "\n👛 По лидерам:\n"
+        for address, leader_stats in leaders.items():
+            text += (
+                f"• `{short_wallet(address)}`: найдено {leader_stats['total_found']}"
+                f", скопировано {leader_stats['trades_ok']}\n"
+            )
+
+    if stats["trades_ok"] or stats["trades_failed"]:
+        text += (
+            f"💰 Скопировано: {stats['trades_ok']} на ${stats['notional_copied']}"
+            f", ошибок: {stats['trades_failed']}\n"
+        )
+
+    if stats.get("exits_ok") or stats.get("exits_failed"):
+        text += f"🏃 Выходов за лидером: {stats['exits_ok']}, ошибок: {stats['exits_failed']}\n"
+
+    latency = stats.get("latency") or {}
+    for kind, label in (("signal", "до обнаружения"), ("order", "до ордера")):
+        dist = latency.get(kind)
+        if dist:
+            text += (
+                f"⏱ Задержка {label}: p50 {dist['p50']}s, p90 {dist['p90']}s"
+                f", p99 {dist['p99']}s (n={dist['count']})\n"
+            )
+
+    paper = stats.get("paper")
+    if paper:
+        text += (
+            f"\n🧪 Бумажный счет: ${paper['equity']} ({paper['return_percent']:+}%)\n"
+            f"• Реализованный PnL: ${paper['realized_pnl']}, нереализованный: ${paper['unrealized_pnl']}\n"
+            f"• Открытых позиций: {paper['open_positions']}, исполнений: {paper['fills']}\n"
+        )
+
+    if stats["rejections"]:
+        text += "\n🔍 Причины отказа:\n"
+        for reason, count in list(stats["rejections"].items())[:5]:
+            text += f"• {reason}: {count}\n"
+
+    return text
+
+
+async def build_monitor(tg_id: int, data: dict, repo, notifier: Notifier, supervisor) -> EngineMonitor:
+    """
+    Фабрика монитора для супервизора: собирает движок по определению
+    (с ключами пользователя из БД) и возвращает EngineMonitor.
+
+    Args:
+        repo: репозиторий БД (ключи пользователя и чекпоинт)
+        notifier: куда слать уведомления
+        supervisor: MonitorSupervisor процесса (shutting_down - монитор приостанавливается, а не останавливается)
+    """
+    paper_mode = bool(data.get("paper"))
+    private_key = user_address = api_key = api_secret = api_passphrase = None
+
+    if not paper_mode:
+        private_key = await repo.get_private_key(tg_id)
+        user_address = await repo.select_user_address(tg_id)
+        if data.get("with_api"):
+            api_key, api_secret, api_passphrase = await repo.get_api_credentials(tg_id)
+
+    settings = Settings(
+        exp_at=data.get("duration", 3600),
+        started_at=data.get("started_at") or int(time.time()),
+        first_bet=data.get("first_bet", False),
+        min_amount=data.get("min_amount", 1),
+        min_quote=data.get("min_quote", 0.01),
+        max_quote=data.get("max_quote", 0.99),
+        rule=data.get("rule"),
+        sl_percent=data.get("sl_percent"),
+        tp_percent=data.get("tp_percent"),
+        trailing_percent=data.get("trailing_percent"),
+        max_hold=data.get("max_hold"),
+        max_staleness=data.get("max_staleness", 60),
+        consensus_k=data.get("consensus_k"),
+    )
+
+    selected_wallets = definition_wallets(data)
+    margin_amount = data.get("margin_amount", 0)
+
+    api_enabled = paper_mode or all([api_key, api_secret, api_passphrase])
+
+    if paper_mode:
+        # Бумажная торговля по живым стаканам CLOB, без ордеров и без риска для средств
+        poly_client = PolyPaper(clob_books, balance=data.get("paper_balance", 1000))
+    else:
+        # Клиент из пула (прогретый хендлерами или созданный вне цикла событий)
+        poly_client = await client_pool.get(
+            private_key=private_key,
+            funder=user_address,
+            api_key=api_key if api_enabled else None,
+            api_secret=api_secret if api_enabled else None,
+            api_passphrase=api_passphrase if api_enabled else None,
+        )
+
+    async def notify_found_position(wallets, position: Position, message: str, trade_executed: bool, trade_message: str):
+        """Уведомление о найденной позиции (или о зеркалировании выхода лидера)"""
+        wallets = [wallets] if isinstance(wallets, str) else wallets
+        leaders_text = ", ".join(f"`{short_wallet(w)}`" for w in wallets)
+
+        if position.side != "BUY":
+            emoji = "✅" if trade_executed else "❌"
+            text = (
+                f"🏃 **Лидер вышел из позиции ({position.side})**\n\n"
+                f"👛 Лидер: {leaders_text}\n"
+                f"📝 {position.title}\n"
+                f"{emoji} {trade_message}"
+            )
+            try:
+                await notifier.send(tg_id, text, parse_mode="Markdown")
+            except Exception as e:
+                print(f"❌ Ошибка отправки уведомления пользователю {tg_id}: {e}")
+            return
+
+        emoji = "✅" if trade_executed else "⏳"
+        status = "Сделка исполнена!" if trade_executed else (
+            "Только мониторинг" if not api_enabled else "Ошибка при исполнении"
+        )
+
+        text = (
+            f"{emoji} **Найдена подходящая сделка!**\n\n"
+            f"👛 {'Консенсус' if len(wallets) > 1 else 'Лидер'}: {leaders_text}\n"
+            f"📝 {position.title}\n"
+            f"💰 Сумма: ${round(position.usdcSize, 2)}\n"
+            f"📊 Котировка: {round(position.price, 3)}\n"
+            f"🎲 Исход: {position.outcome}\n"
+        )
+
+        if api_enabled:
+            text += f"💵 Маржа: ${margin_amount}\n"
+
+        text += f"\n📌 {message}\n🔄 {status}\n"
+
+        if trade_message:
+            text += f"\n🗒 {trade_message}"
+
+        if api_enabled:
+            text += "\n\nМониторинг продолжается..."
+        else:
+            text += "\n\n⚠️ Режим: только мониторинг (без автоисполнения)"
+
+        try:
+            await notifier.send(tg_id, text, parse_mode="Markdown")
+        except Exception as e:
+            print(f"❌ Ошибка отправки уведомления пользователю {tg_id}: {e}")
+
+    if settings.consensus_k:
+        # Консенсус по всем кошелькам на треке, общий хаб опроса на всех пользователей
+        poly_copy = PolyCopy(
+            settings,
+            PolyScrapper.shared(selected_wallets[0]),
+            client=poly_client,
+            margin_amount=margin_amount
+        )
+        watcher = ConsensusWatcher(
+            poly_copy,
+            selected_wallets,
+            k=settings.consensus_k,
+            window=settings.consensus_window,
+            callback_func=notify_found_position
+        )
+        run_engine = partial(watcher.run, consensus)
+        get_statistics = poly_copy.get_statistics
+        drain = watcher.drain
+        engine = poly_copy
+    else:
+        session = PolySession(settings, client=poly_client)
+        for wallet in selected_wallets:
+            session.add_leader(wallet, margin_amount=margin_amount)
+        run_engine = partial(session.run, callback_func=notify_found_position)
+        get_statistics = session.get_statistics
+        drain = session.drain
+        engine = session
+
+    # Дедупликация, позиции под SL/TP и выходы переживают рестарт бота
+    checkpoint = Checkpointer(repo, monitor_id(tg_id))
+    engine.restore_state(await checkpoint.restore())
+    engine.attach_checkpoint(checkpoint)
+    checkpoint_task = None
+
+    async def stop_checkpoint():
+        if checkpoint_task is not None and not checkpoint_task.done():
+            checkpoint_task.cancel()
+            try:
+                await checkpoint_task
+            except asyncio.CancelledError:
+                pass
+
+    async def run_monitoring():
+        """Основной цикл мониторинга"""
+        nonlocal checkpoint_task
+        checkpoint_task = asyncio.create_task(checkpoint.run())
+        try:
+            print(f"🚀 Мониторинг запущен для пользователя {tg_id}")
+            # Только после рестарта бота (restore), не после перезапуска упавшего монитора
+            if data.get("resumed"):
+                await notifier.send(tg_id, "🔄 Мониторинг возобновлен после перезапуска бота")
+
+            await run_engine()
+
+            # Отмена, проглоченная движком, все равно отмена
+            if asyncio.current_task().cancelling():
+                raise asyncio.CancelledError()
+
+            # Завершенному монитору (по любой причине) чекпоинт больше не нужен
+            await stop_checkpoint()
+            await checkpoint.clear()
+
+            summary = format_summary("✅ **Мониторинг завершен!**", get_statistics())
+            await notifier.send(tg_id, summary, parse_mode="Markdown", buttons=FINISHED_BUTTONS)
+            print(f"✅ Мониторинг завершен для пользователя {tg_id}")
+
+        except asyncio.CancelledError:
+            if supervisor.shutting_down:
+                # Бот перезапускается: монитор поднимется из БД, сообщение не нужно
+                print(f"⏸ Мониторинг пользователя {tg_id} приостановлен до рестарта")
+                raise
+
+            cancel_text = format_summary("🛑 **Мониторинг остановлен**", get_statistics())
+            await notifier.send(tg_id, cancel_text, parse_mode="Markdown", buttons=FINISHED_BUTTONS)
+            print(f"🛑 Мониторинг остановлен пользователем {tg_id}")
+            raise
+
+        except Exception as e:
+            err = f"❌ **Ошибка при мониторинге:** `{str(e)}`\nМониторинг будет перезапущен."
+            print(f"❌ Ошибка мониторинга: {e}")
+            try:
+                await notifier.send(tg_id, err, parse_mode="Markdown")
+            except Exception:
+                pass
+            # Перезапуск с паузой делает супервизор
+            raise
+
+        finally:
+            await stop_checkpoint()
+
+    return EngineMonitor(run_monitoring, get_statistics, drain)
+
+
+def monitor_factory(repo, notifier: Notifier, supervisor):
+    """Фабрика (tg_id, definition) -> EngineMonitor для MonitorSupervisor.setup."""
+    return partial(build_monitor, repo=repo, notifier=notifier, supervisor=supervisor)
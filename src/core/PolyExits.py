@@ -0,0 +1,326 @@
+import time
+import heapq
+import asyncio
+import itertools
+import traceback
+import aiohttp
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from utils.customprint import CustomPrint
+from src.models.datacreator import DataCreator
+from src.core.PolyShutdown import Inflight
+from utils.deadline import TimeoutScope, client_timeout, deadline, detached
+
+CLOB_URL = "https://clob.polymarket.com"
+
+# (причина, цена) -> корутина закрытия позиции
+ExitCallback = Callable[[str, float], Awaitable]
+
+
+class MidpointFeed:
+    """Поток цен: пакетный опрос midpoint по всем удерживаемым токенам."""
+
+    def __init__(self, batch_size: int = 100, timeout: float = 3.0):
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.datacreator = DataCreator()
+
+    async def fetch(self, token_ids: List[str]) -> Dict[str, float]:
+        prices: Dict[str, float] = {}
+        if not token_ids:
+            return prices
+
+        async with aiohttp.ClientSession() as session:
+            for i in range(0, len(token_ids), self.batch_size):
+                body, headers = self.datacreator.create_midpoints_request_data(
+                    token_ids[i:i + self.batch_size]
+                )
+                async with TimeoutScope("clob-midpoints"), session.post(
+                    f"{CLOB_URL}/midpoints",
+                    json=body,
+                    headers=headers,
+                    timeout=client_timeout("clob-midpoints", self.timeout)
+                ) as response:
+                    if response.status != 200:
+                        CustomPrint().error(f"⚠️ midpoints {response.status}")
+                        continue
+
+                    data = await response.json()
+                    for token_id, mid in (data or {}).items():
+                        try:
+                            prices[str(token_id)] = float(mid)
+                        except (TypeError, ValueError):
+                            continue
+        return prices
+
+
+class _ExitPosition:
+    __slots__ = ("key", "token_id", "entry", "on_exit", "trail", "peak", "seq")
+
+    def __init__(
+        self,
+        key: str,
+        token_id: str,
+        entry: float,
+        on_exit: ExitCallback,
+        trail: Optional[float],
+        peak: float,
+        seq: int,
+    ):
+        self.key = key
+        self.token_id = token_id
+        self.entry = entry
+        self.on_exit = on_exit
+        self.trail = trail
+        self.peak = peak
+        self.seq = seq
+
+
+class _TokenBook:
+    """Пороги выхода одного токена, упорядоченные кучами."""
+    __slots__ = ("stops", "takes", "trails", "trail_floor", "count")
+
+    def __init__(self):
+        self.stops: List[Tuple[float, int, str]] = []   # (-цена стопа, seq, key): сверху самый высокий стоп
+        self.takes: List[Tuple[float, int, str]] = []   # (цена тейка, seq, key): сверху самый низкий тейк
+        self.trails: List[Tuple[float, int, str]] = []  # (-цена трейлинга, seq, key)
+        self.trail_floor = float("inf")                 # минимальный пик среди трейлингов
+        self.count = 0
+
+
+class PolyExits:
+    """
+    Движок выходов по тикам цены.
+
+    Общий для всех мониторов: цена каждого токена запрашивается один раз,
+    а SL/TP/трейлинг-пороги всех держателей токена лежат в кучах, поэтому
+    тик проверяет только верхушки куч и снимает лишь пересеченные пороги.
+    Тайм-стопы хранятся в отдельной куче по дедлайнам.
+
+    Удаление ленивое: записи в кучах сверяются с seq активной позиции.
+    """
+
+    def __init__(self, feed: Optional[MidpointFeed] = None, interval: float = 1.0):
+        self.feed = feed or MidpointFeed()
+        self.interval = interval
+        # Бюджет одной итерации цикла (запросы и начатые из нее задачи)
+        self.budget = 10.0
+
+        self.positions: Dict[str, _ExitPosition] = {}
+        self.books: Dict[str, _TokenBook] = {}
+        self.deadlines: List[Tuple[float, int, str]] = []
+        self.last_prices: Dict[str, float] = {}
+        self.price_times: Dict[str, float] = {}
+
+        self._seq = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+        # Начатые выходы (ордер + уведомление) дожидаются при остановке бота
+        self.inflight = Inflight("выходы SL/TP")
+
+    def add_position(
+        self,
+        key: str,
+        token_id: str,
+        entry_price: float,
+        on_exit: ExitCallback,
+        sl_percent: Optional[float] = None,
+        tp_percent: Optional[float] = None,
+        trailing_percent: Optional[float] = None,
+        max_hold: Optional[float] = None,
+        opened_at: Optional[float] = None,
+    ):
+        """
+        Регистрирует (или перерегистрирует) позицию.
+
+        Args:
+            key: уникальный ключ позиции (владелец + token_id)
+            entry_price: цена входа, от нее считаются пороги
+            on_exit: корутина закрытия, вызывается с (причина, цена)
+            sl_percent / tp_percent: проценты от цены входа (знак SL не важен)
+            trailing_percent: отступ трейлинг-стопа от пика в процентах
+            max_hold: максимальное время удержания в секундах
+        """
+        token_id = str(token_id)
+        self.remove_position(key)
+
+        seq = next(self._seq)
+        peak = max(entry_price, self.last_prices.get(token_id, entry_price))
+        trail = abs(float(trailing_percent)) / 100 if trailing_percent else None
+        position = _ExitPosition(key, token_id, entry_price, on_exit, trail, peak, seq)
+        self.positions[key] = position
+
+        book = self.books.get(token_id)
+        if book is None:
+            book = self.books[token_id] = _TokenBook()
+        book.count += 1
+
+        if sl_percent is not None:
+            stop = entry_price * (1 - abs(float(sl_percent)) / 100)
+            heapq.heappush(book.stops, (-stop, seq, key))
+
+        if tp_percent is not None:
+            take = entry_price * (1 + abs(float(tp_percent)) / 100)
+            heapq.heappush(book.takes, (take, seq, key))
+
+        if trail is not None:
+            heapq.heappush(book.trails, (-(peak * (1 - trail)), seq, key))
+            book.trail_floor = min(book.trail_floor, peak)
+
+        if max_hold:
+            deadline = (opened_at if opened_at is not None else time.time()) + float(max_hold)
+            heapq.heappush(self.deadlines, (deadline, seq, key))
+
+        self.ensure_running()
+
+    def remove_position(self, key: str) -> bool:
+        position = self.positions.pop(key, None)
+        if position is None:
+            return False
+
+        book = self.books.get(position.token_id)
+        if book is not None:
+            book.count -= 1
+            if book.count <= 0:
+                del self.books[position.token_id]
+        return True
+
+    def fresh_price(self, token_id: str, max_age: float) -> Optional[float]:
+        """Последняя цена токена из потока, если она не старше max_age секунд."""
+        token_id = str(token_id)
+        at = self.price_times.get(token_id)
+        if at is None or time.time() - at > max_age:
+            return None
+        return self.last_prices.get(token_id)
+
+    def _valid(self, key: str, seq: int) -> bool:
+        position = self.positions.get(key)
+        return position is not None and position.seq == seq
+
+    def _fire(self, key: str, reason: str, price: float):
+        position = self.positions.get(key)
+        if position is None:
+            return
+        self.remove_position(key)
+        self.inflight.spawn(self._dispatch(position, reason, price))
+
+    async def _dispatch(self, position: _ExitPosition, reason: str, price: float):
+        try:
+            await position.on_exit(reason, price)
+        except Exception as e:
+            print(f"⚠️ Ошибка выхода {reason} ({position.token_id}): {e}")
+            traceback.print_exc()
+
+    def _raise_trails(self, book: _TokenBook, price: float):
+        """Новый пик: подтягивает трейлинг-стопы и пересобирает кучу (только при обновлении пика)."""
+        trails = []
+        floor = float("inf")
+        for _, seq, key in book.trails:
+            if not self._valid(key, seq):
+                continue
+            position = self.positions[key]
+            if position.peak < price:
+                position.peak = price
+            floor = min(floor, position.peak)
+            trails.append((-(position.peak * (1 - position.trail)), seq, key))
+        heapq.heapify(trails)
+        book.trails = trails
+        book.trail_floor = floor
+
+    def on_price(self, token_id: str, price: float) -> int:
+        """
+        Обрабатывает тик цены токена.
+
+        Returns:
+            int: количество сработавших выходов
+        """
+        token_id = str(token_id)
+        self.last_prices[token_id] = price
+        self.price_times[token_id] = time.time()
+
+        book = self.books.get(token_id)
+        if book is None:
+            return 0
+
+        fired = 0
+
+        while book.stops:
+            neg_stop, seq, key = book.stops[0]
+            if not self._valid(key, seq):
+                heapq.heappop(book.stops)
+                continue
+            if price > -neg_stop:
+                break
+            heapq.heappop(book.stops)
+            self._fire(key, "SL", price)
+            fired += 1
+
+        while book.takes:
+            take, seq, key = book.takes[0]
+            if not self._valid(key, seq):
+                heapq.heappop(book.takes)
+                continue
+            if price < take:
+                break
+            heapq.heappop(book.takes)
+            self._fire(key, "TP", price)
+            fired += 1
+
+        if book.trails and price > book.trail_floor:
+            self._raise_trails(book, price)
+
+        while book.trails:
+            neg_stop, seq, key = book.trails[0]
+            if not self._valid(key, seq):
+                heapq.heappop(book.trails)
+                continue
+            if price > -neg_stop:
+                break
+            heapq.heappop(book.trails)
+            self._fire(key, "TRAIL", price)
+            fired += 1
+
+        return fired
+
+    def on_time(self, now: Optional[float] = None) -> int:
+        """Срабатывание тайм-стопов."""
+        now = now if now is not None else time.time()
+        fired = 0
+        while self.deadlines:
+            deadline, seq, key = self.deadlines[0]
+            if not self._valid(key, seq):
+                heapq.heappop(self.deadlines)
+                continue
+            if deadline > now:
+                break
+            heapq.heappop(self.deadlines)
+            position = self.positions[key]
+            # Цены из потока еще не было: выход по цене входа, а не по нулю (PnL -100%)
+            self._fire(key, "TIME", self.last_prices.get(position.token_id) or position.entry)
+            fired += 1
+        return fired
+
+    def ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = detached(self.run())
+
+    async def run(self):
+        """Цикл опроса цен; завершается сам, когда позиций не осталось."""
+        while self.positions:
+            started = time.time()
+            try:
+                # Бюджет итерации: опрос цен и начатые из нее выходы (ордер + уведомление)
+                with deadline(self.budget, root=True):
+                    prices = await self.feed.fetch(list(self.books))
+                    for token_id, price in prices.items():
+                        self.on_price(token_id, price)
+                    self.on_time()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Ошибка потока цен: {e}")
+                traceback.print_exc()
+
+            await asyncio.sleep(max(0.0, self.interval - (time.time() - started)))
+
+
+exits = PolyExits()
@@ -0,0 +1,116 @@
+import time
+from typing import Dict, List, Optional
+
+from src.models.position import Position
+
+
+def fill_key(bet: Position) -> str:
+    """Идентификатор отдельного fill (одна строка /activity)."""
+    return f"{bet.transactionHash or bet.timestamp}_{bet.token_id}_{bet.side}_{bet.price}_{bet.size}"
+
+
+class _FillGroup:
+    __slots__ = ("first_seen", "fills", "usdc", "size")
+
+    def __init__(self, first_seen: float):
+        self.first_seen = first_seen
+        self.fills: List[Position] = []
+        self.usdc = 0.0
+        self.size = 0.0
+
+
+class FillAggregator:
+    """
+    Склейка частичных исполнений лидера в одну логическую сделку.
+
+    Крупный маркет-ордер лидера приходит в /activity несколькими fill'ами
+    по немного разным ценам. Fill'ы одного рынка и стороны (token_id + side)
+    копятся window секунд от первого fill'а, затем выдаются одной позицией
+    с суммарным размером и VWAP-ценой.
+    """
+
+    __slots__ = (
+        "window", "seen_ttl", "groups", "seen", "_last_prune",
+    )
+
+    def __init__(self, window: float = 3, seen_ttl: float = 600):
+        """
+        Args:
+            window: окно склейки в секундах (0 - без склейки)
+            seen_ttl: сколько помнить уже учтенные fill'ы (API отдает их повторно)
+        """
+        self.window = window
+        self.seen_ttl = seen_ttl
+        self.groups: Dict[str, _FillGroup] = {}
+        self.seen: Dict[str, float] = {}
+        self._last_prune = 0.0
+
+    @staticmethod
+    def group_key(bet: Position) -> str:
+        return f"{bet.conditionId}_{bet.token_id}_{bet.side}"
+
+    @property
+    def pending(self) -> int:
+        return len(self.groups)
+
+    def _prune(self, now: float):
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        old = [k for k, t in self.seen.items() if now - t > self.seen_ttl]
+        for k in old:
+            del self.seen[k]
+
+    @staticmethod
+    def _merge(group: _FillGroup) -> Position:
+        first = group.fills[0]
+        if len(group.fills) == 1:
+            return first
+
+        price = group.usdc / group.size if group.size else first.price
+        return first.model_copy(update={
+            "price": price,
+            "usdcSize": group.usdc,
+            "size": group.size,
+            "timestamp": max(fill.timestamp or 0 for fill in group.fills) or first.timestamp,
+        })
+
+    def add(self, fills: List[Position], now: Optional[float] = None) -> List[Position]:
+        """
+        Добавляет fill'ы (повторы игнорируются) и возвращает закрытые группы.
+
+        Returns:
+            List[Position]: склеенные сделки, у которых истекло окно
+        """
+        now = now if now is not None else time.time()
+
+        for bet in fills:
+            key = fill_key(bet)
+            if key in self.seen:
+                continue
+            self.seen[key] = now
+
+            group_key = self.group_key(bet)
+            group = self.groups.get(group_key)
+            if group is None:
+                group = self.groups[group_key] = _FillGroup(now)
+            usdc = float(bet.usdcSize or 0)
+            group.fills.append(bet)
+            group.usdc += usdc
+            group.size += float(bet.size) if bet.size else (usdc / bet.price if bet.price else 0.0)
+
+        self._prune(now)
+        return self.flush(now)
+
+    def flush(self, now: Optional[float] = None, force: bool = False) -> List[Position]:
+        """Выдает группы, у которых истекло окно (или все при force)."""
+        now = now if now is not None else time.time()
+        ready = [
+            key for key, group in self.groups.items()
+            if force or now - group.first_seen >= self.window
+        ]
+        return [self._merge(self.groups.pop(key)) for key in ready]
+
+    def clear(self):
+        self.groups.clear()
+        self.seen.clear()
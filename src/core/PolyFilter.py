@@ -0,0 +1,161 @@
+import time
+import numpy as np
+from typing import Dict, List, Optional
+
+from src.models.settings import Settings
+from src.models.position import Position
+from src.core.PolyRules import compile_rule
+
+# Коды причин в матрице результатов
+PASSED = 0
+REJECT_AMOUNT = 1
+REJECT_PRICE = 2
+REJECT_SPAM = 3
+REJECT_RULE = 4
+SKIPPED = -1  # ставка не относится к подписчику (или отсечена до фильтров)
+
+REASONS = {
+    PASSED: "прошла все фильтры",
+    REJECT_AMOUNT: "слишком маленькая сумма",
+    REJECT_PRICE: "не подходит по цене",
+    REJECT_SPAM: "обнаружена накрутка транзакций",
+    REJECT_RULE: "не подходит под правило",
+}
+
+
+class BatchFilter:
+    """
+    Векторная фильтрация ставок одного тика сразу для всех подписчиков.
+
+    Повторяет семантику PolyCopy.custom_filter (мин. сумма, диапазон котировок,
+    правило, защита от накрутки), но считает матрицу (подписчики x ставки) операциями NumPy.
+    Правило - Python-предикат, вызывается только для ставок, прошедших сумму и цену.
+    Фильтр first_bet требует запроса в API и остается на скалярном пути.
+
+    PolySession прогоняет через него ставки тика всех своих лидеров.
+    """
+
+    def __init__(
+        self,
+        settings: List[Settings],
+        max_orders: int = 3,
+        time_window_min: int = 30,
+    ):
+        self.max_orders = max_orders
+        self.time_window = time_window_min * 60
+        self.update_settings(settings)
+
+    def update_settings(self, settings: List[Settings]):
+        self.settings = list(settings)
+        self.min_amount = np.array([s.min_amount for s in self.settings], dtype=np.float64)
+        self.min_quote = np.array([s.min_quote for s in self.settings], dtype=np.float64)
+        self.max_quote = np.array([s.max_quote for s in self.settings], dtype=np.float64)
+        self.rules = [compile_rule(s.rule) if s.rule else None for s in self.settings]
+
+    @staticmethod
+    def market_key(bet: Position) -> str:
+        return f"{bet.title}_{bet.outcome}"
+
+    def _existing_counts(
+        self,
+        markets: np.ndarray,
+        histories: List[Dict[str, List[float]]],
+        now: float,
+    ) -> np.ndarray:
+        # Только пересечение рынков тика с историей подписчика, без прохода подписчики x рынки
+        index = {key: m for m, key in enumerate(markets.tolist())}
+        counts = np.zeros((len(self.settings), len(markets)), dtype=np.int32)
+        for s, history in enumerate(histories):
+            if not history:
+                continue
+            for key in index.keys() & history.keys():
+                fresh = [ts for ts in history[key] if now - ts < self.time_window]
+                history[key] = fresh
+                counts[s, index[key]] = len(fresh)
+        return counts
+
+    def evaluate(
+        self,
+        bets: List[Position],
+        histories: Optional[List[Dict[str, List[float]]]] = None,
+        now: Optional[float] = None,
+        applicable: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Args:
+            bets: ставки тика
+            histories: по одному market_transactions на подписчика
+                       (как в PolyCopy); принятые ставки дописываются в них
+            now: текущее время
+            applicable: булева матрица (подписчики, ставки) - какие ставки оценивать
+                        для подписчика (ставки своего лидера); остальные получают SKIPPED
+                        и не расходуют лимит накрутки
+
+        Returns:
+            np.ndarray: матрица кодов причин int8 формы (подписчики, ставки)
+        """
+        n_subs, n_bets = len(self.settings), len(bets)
+        reasons = np.zeros((n_subs, n_bets), dtype=np.int8)
+        if n_subs == 0 or n_bets == 0:
+            return reasons
+
+        amounts = np.fromiter((b.usdcSize for b in bets), dtype=np.float64, count=n_bets)
+        prices = np.fromiter((b.price for b in bets), dtype=np.float64, count=n_bets)
+
+        amount_ok = amounts[None, :] >= self.min_amount[:, None]
+        price_ok = (prices[None, :] > self.min_quote[:, None]) & (prices[None, :] < self.max_quote[:, None])
+
+        reasons[~amount_ok] = REJECT_AMOUNT
+        reasons[amount_ok & ~price_ok] = REJECT_PRICE
+        passing = amount_ok & price_ok
+        if applicable is not None:
+            reasons[~applicable] = SKIPPED
+            passing &= applicable
+
+        for s, rule in enumerate(self.rules):
+            if rule is None:
+                continue
+            for n in np.flatnonzero(passing[s]).tolist():
+                if not rule(bets[n]):
+                    passing[s, n] = False
+                    reasons[s, n] = REJECT_RULE
+
+        if histories is None:
+            return reasons
+
+        now = now if now is not None else time.time()
+        keys = np.array([self.market_key(b) for b in bets], dtype=object)
+        markets, codes = np.unique(keys, return_inverse=True)
+        existing = self._existing_counts(markets, histories, now)
+
+        # Порядковый номер прошедшей ставки внутри своего рынка (1, 2, ...)
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+        cumulative = np.cumsum(passing[:, order], axis=1, dtype=np.int32)
+        starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+        base = np.zeros((n_subs, len(markets)), dtype=np.int32)
+        base[:, sorted_codes[starts[1:]]] = cumulative[:, starts[1:] - 1]
+
+        rank = np.empty_like(cumulative)
+        rank[:, order] = cumulative - base[:, sorted_codes]
+
+        allowed = passing & (existing[:, codes] + rank <= self.max_orders)
+        reasons[passing & ~allowed] = REJECT_SPAM
+
+        accepted = np.zeros((n_subs, len(markets)), dtype=np.int32)
+        rows, cols = np.nonzero(allowed)
+        np.add.at(accepted, (rows, codes[cols]), 1)
+        subs, mkts = np.nonzero(accepted)
+        for s, m, count in zip(subs.tolist(), mkts.tolist(), accepted[subs, mkts].tolist()):
+            histories[s].setdefault(markets[m], []).extend([now] * count)
+
+        return reasons
+
+    def matches(
+        self,
+        bets: List[Position],
+        histories: Optional[List[Dict[str, List[float]]]] = None,
+        now: Optional[float] = None,
+    ) -> np.ndarray:
+        """Булева матрица совпадений (подписчики, ставки)."""
+        return self.evaluate(bets, histories, now) == PASSED
@@ -0,0 +1,192 @@
+import time
+import asyncio
+import threading
+import aiohttp
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from py_clob_client.clob_types import OrderType
+from py_clob_client.http_helpers import helpers as clob_http
+
+from utils.customprint import CustomPrint
+from utils.deadline import TimeoutScope, client_timeout
+from src.core.PolyExits import CLOB_URL
+from src.core.PolyPaper import Book
+
+# Поле -> (эндпоинт CLOB, ttl в секундах).
+# Tick size меняется у краев цены (0.01 -> 0.001), neg-risk задан при создании рынка
+FIELDS: Dict[str, Tuple[str, float]] = {
+    "tick_size": ("/tick-size", 300),
+    "neg_risk": ("/neg-risk", 24 * 3600),
+    "fee_rate": ("/fee-rate", 3600),
+}
+
+
+def _parse(field: str, data: Dict) -> Any:
+    """Значение поля в том виде, в каком его отдает сам ClobClient."""
+    if field == "tick_size":
+        return str(data["minimum_tick_size"])
+    if field == "neg_risk":
+        return data["neg_risk"]
+    return data.get("base_fee") or 0
+
+
+class MarketMeta:
+    """
+    Кеш метаданных токенов CLOB (tick size, neg-risk, fee rate) с TTL.
+
+    Один на процесс и общий для всех клиентов: метаданные зависят от токена,
+    а не от пользователя. ClobClient спрашивает их перед каждой подписью
+    ордера (см. PolyClient), с теплым кешем подпись идет без сети.
+
+    - get/fetch - синхронно, из потоков clob_pool (промах - запрос через http-хелпер py_clob_client)
+    - prefetch - асинхронно и параллельно, для прогрева при старте монитора
+    """
+
+    def __init__(self, max_tokens: int = 10000, timeout: float = 3.0, concurrency: int = 8):
+        """
+        Args:
+            max_tokens: сколько токенов держать (LRU)
+            timeout: таймаут одного запроса prefetch
+            concurrency: одновременных запросов prefetch
+        """
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.concurrency = concurrency
+
+        self.tokens: "OrderedDict[str, Dict[str, Tuple[float, Any]]]" = OrderedDict()
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._lock = threading.Lock()
+
+        self.counters: Dict[str, int] = {"hits": 0, "misses": 0, "prefetched": 0, "errors": 0}
+
+    def get(self, token_id: str, field: str) -> Optional[Any]:
+        """Свежее значение или None."""
+        now = time.time()
+        with self._lock:
+            entry = self.tokens.get(token_id)
+            cached = entry.get(field) if entry is not None else None
+            if cached is None or now - cached[0] >= FIELDS[field][1]:
+                return None
+            self.tokens.move_to_end(token_id)
+            self.counters["hits"] += 1
+            return cached[1]
+
+    def put(self, token_id: str, field: str, value: Any):
+        with self._lock:
+            entry = self.tokens.get(token_id)
+            if entry is None:
+                entry = self.tokens[token_id] = {}
+            entry[field] = (time.time(), value)
+            self.tokens.move_to_end(token_id)
+            while len(self.tokens) > self.max_tokens:
+                self.tokens.popitem(last=False)
+
+    def _missing(self, token_id: str) -> List[str]:
+        now = time.time()
+        with self._lock:
+            entry = self.tokens.get(token_id) or {}
+            return [
+                field for field, (_, ttl) in FIELDS.items()
+                if field not in entry or now - entry[field][0] >= ttl
+            ]
+
+    def fetch(self, token_id: str, field: str) -> Any:
+        """Значение из кеша, при промахе - синхронный запрос (поток ClobClient)."""
+        value = self.get(token_id, field)
+        if value is not None:
+            return value
+
+        with self._lock:
+            self.counters["misses"] += 1
+        data = clob_http.get(f"{CLOB_URL}{FIELDS[field][0]}?token_id={token_id}")
+        value = _parse(field, data)
+        self.put(token_id, field, value)
+        return value
+
+    async def _fetch_field(self, token_id: str, field: str, limit: asyncio.Semaphore):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession()
+
+        async with limit, TimeoutScope("clob-meta"), self.session.get(
+            f"{CLOB_URL}{FIELDS[field][0]}",
+            params={"token_id": token_id},
+            timeout=client_timeout("clob-meta", self.timeout),
+        ) as response:
+            if response.status != 200:
+                raise RuntimeError(f"{field} {response.status}")
+            self.put(token_id, field, _parse(field, await response.json()))
+
+    async def _prefetch_token(self, token_id: str, fields: List[str], limit: asyncio.Semaphore):
+        results = await asyncio.gather(
+            *(self._fetch_field(token_id, field, limit) for field in fields),
+            return_exceptions=True,
+        )
+        errors = [result for result in results if isinstance(result, Exception)]
+        with self._lock:
+            self.counters["prefetched"] += len(results) - len(errors)
+            self.counters["errors"] += len(errors)
+        if errors:
+            CustomPrint().error(f"⚠️ Метаданные {token_id[:10]}...: {errors[0]}")
+
+    async def prefetch(self, token_ids: Iterable[str]) -> int:
+        """
+        Загружает недостающие и устаревшие метаданные токенов.
+        Ошибки не поднимаются: промах просто уйдет в синхронный fetch при подписи.
+
+        Returns:
+            int: сколько токенов запрашивалось
+        """
+        limit = asyncio.Semaphore(self.concurrency)
+        waits = []
+        for token_id in dict.fromkeys(str(t) for t in token_ids if t):
+            future = self.inflight.get(token_id)
+            if future is None:
+                fields = self._missing(token_id)
+                if not fields:
+                    continue
+                future = self.inflight[token_id] = asyncio.ensure_future(
+                    self._prefetch_token(token_id, fields, limit)
+                )
+                future.add_done_callback(lambda _, token_id=token_id: self.inflight.pop(token_id, None))
+            waits.append(future)
+
+        if waits:
+            await asyncio.gather(*waits, return_exceptions=True)
+        return len(waits)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {**self.counters, "tokens": len(self.tokens)}
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+def market_price(book: Book, side: str, amount: float, order_type=OrderType.FOK) -> float:
+    """
+    Цена маркет-ордера по стакану: худший уровень, до которого доходит amount
+    (USDC для BUY, шейры для SELL). Та же логика, что у ClobClient.calculate_market_price.
+
+    Raises:
+        Exception: стакан пуст или (FOK) объема не хватает
+    """
+    levels = book["asks"] if side == "BUY" else book["bids"]
+    if not levels:
+        raise Exception("no match")
+
+    filled = 0.0
+    for price, size in levels:
+        filled += size * price if side == "BUY" else size
+        if filled >= amount:
+            return price
+
+    if order_type == OrderType.FOK:
+        raise Exception("no match")
+    return levels[-1][0]
+
+
+market_meta = MarketMeta()
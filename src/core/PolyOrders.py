@@ -0,0 +1,511 @@
+import time
+import uuid
+import random
+import asyncio
+import threading
+import functools
+import contextvars
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from py_clob_client.clob_types import MarketOrderArgs, OpenOrderParams, OrderType, TradeParams
+from py_clob_client.exceptions import PolyApiException
+
+from data.config import Config
+from utils.deadline import DeadlineExceeded, call, expired
+from src.core.PolyStats import latency_percentiles
+from src.core.PolyPaper import clob_books
+from src.core.PolyMarkets import market_meta, market_price
+from src.core.PolyExits import exits
+
+# Классы ошибок отправки ордера
+RETRY = "retry"          # ордер точно не принят (429, ошибка до отправки) - можно повторить
+AMBIGUOUS = "ambiguous"  # неизвестно, принят ли ордер (таймаут, обрыв, 5xx) - сначала сверка
+AUTH = "auth"            # 401 - обновить credentials и повторить
+FATAL = "fatal"          # 4xx, отказ биржи - повтор не поможет
+
+
+def classify_error(error: BaseException, submitted: bool = True) -> str:
+    """
+    Класс ошибки для решения о повторе.
+
+    Args:
+        submitted: ошибка на этапе отправки ордера (а не подписи/подготовки)
+    """
+    if isinstance(error, PolyApiException):
+        status = getattr(error, "status_code", None)
+        if status == 401:
+            return AUTH
+        if status == 429:
+            return RETRY
+        if status is None or status >= 500:
+            # Обрыв соединения или 5xx: ордер мог дойти до биржи
+            return AMBIGUOUS if submitted else RETRY
+        return FATAL
+
+    if isinstance(error, DeadlineExceeded) and not submitted:
+        # Бюджет тика кончился до отправки: ордера на бирже нет, повторять некогда
+        return FATAL
+
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError, OSError)):
+        return AMBIGUOUS if submitted else RETRY
+
+    return FATAL
+
+
+def _release(loop: asyncio.AbstractEventLoop, slot: asyncio.Semaphore, _future):
+    """Done-callback вызова ClobPool (из потока пула): отпускает слот владельца в цикле событий."""
+    try:
+        loop.call_soon_threadsafe(slot.release)
+    except RuntimeError:
+        # Цикл уже закрыт - ждать слот некому
+        pass
+
+
+class ClobPool:
+    """
+    Отдельный ограниченный пул потоков для синхронного py_clob_client
+    (подпись EIP-712, запрос стакана, post_order, credentials).
+
+    - Свой пул, а не общий executor asyncio.to_thread: ордера не ждут
+      за чужими блокирующими вызовами
+    - На клиента (пользователя) не больше per_client одновременных вызовов:
+      ордера одного пользователя не занимают все потоки
+    - Контекст вызывающего (дедлайн) уходит в поток
+    - Метрики: очередь, занятые потоки, задержки ожидания потока и исполнения
+    """
+
+    def __init__(self, workers: int = 8, per_client: int = 2, samples: int = 512):
+        """
+        Args:
+            workers: потоков в пуле
+            per_client: одновременных вызовов на одного владельца (PolyClient)
+            samples: сколько последних задержек хранить для перцентилей
+        """
+        self.workers = workers
+        self.per_client = per_client
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: "weakref.WeakKeyDictionary[Any, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.errors = 0
+        self.queued = 0
+        self.busy = 0
+        self.max_queued = 0
+        self.wait_times: Deque[float] = deque(maxlen=samples)
+        self.run_times: Deque[float] = deque(maxlen=samples)
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="clob")
+        return self._executor
+
+    def _slot(self, owner: Any) -> Optional[asyncio.Semaphore]:
+        if owner is None:
+            return None
+        slot = self._slots.get(owner)
+        if slot is None:
+            slot = self._slots[owner] = asyncio.Semaphore(self.per_client)
+        return slot
+
+    def _job(self, context: contextvars.Context, queued_at: float, func: Callable, args: tuple):
+        started = time.perf_counter()
+        with self._lock:
+            self.queued -= 1
+            self.busy += 1
+            self.wait_times.append(started - queued_at)
+        try:
+            return context.run(func, *args)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self.busy -= 1
+                self.run_times.append(time.perf_counter() - started)
+
+    async def run(self, func: Callable, *args: Any, owner: Any = None) -> Any:
+        """
+        func(*args) в потоке пула.
+
+        Args:
+            owner: владелец вызова для лимита per_client (обычно PolyClient)
+        """
+        slot = self._slot(owner)
+        if slot is not None:
+            await slot.acquire()
+        # Слот отпускает завершение вызова в потоке, а не ожидающая корутина:
+        # при отмене (дедлайн, остановка) начатый вызов еще держит поток и слот
+        handed = False
+        try:
+            with self._lock:
+                self.calls += 1
+                self.queued += 1
+                self.max_queued = max(self.max_queued, self.queued)
+            context = contextvars.copy_context()
+            future = self._pool().submit(self._job, context, time.perf_counter(), func, args)
+            if slot is not None:
+                future.add_done_callback(functools.partial(_release, asyncio.get_running_loop(), slot))
+                handed = True
+            try:
+                return await asyncio.wrap_future(future)
+            except asyncio.CancelledError:
+                # Не начатый вызов снимается с очереди (начатый дорабатывает в потоке)
+                if future.cancel():
+                    with self._lock:
+                        self.queued -= 1
+                raise
+        finally:
+            if slot is not None and not handed:
+                slot.release()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            wait_times = list(self.wait_times)
+            run_times = list(self.run_times)
+            return {
+                "workers": self.workers,
+                "busy": self.busy,
+                "queued": self.queued,
+                "max_queued": self.max_queued,
+                "calls": self.calls,
+                "errors": self.errors,
+                "wait": latency_percentiles(wait_times),
+                "run": latency_percentiles(run_times),
+            }
+
+    async def close(self):
+        """Снимает с очереди не начатые вызовы и дожидается начатых (подписанный ордер не бросается)."""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+
+# Один пул CLOB на процесс (бот или воркер движка)
+clob_pool = ClobPool(Config.CLOB_THREADS, Config.CLOB_THREADS_PER_USER)
+
+
+class _Submission:
+    __slots__ = (
+        "key", "token_id", "side", "amount", "order_type", "signed", "ambiguous", "started_at", "future", "done_at",
+    )
+
+    def __init__(self, key: str, token_id: str, side: str, amount: float, order_type):
+        self.key = key
+        self.token_id = token_id
+        self.side = side
+        self.amount = amount
+        self.order_type = order_type
+        self.signed = None
+        # Ордер мог дойти до биржи (таймаут/обрыв на отправке): результат запоминается по ключу
+        self.ambiguous = False
+        self.started_at = time.time()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.done_at: Optional[float] = None
+
+
+class OrderSubmitter:
+    """
+    Идемпотентная отправка ордеров PolyClient.
+
+    - Ключ идемпотентности задает вызывающий (ставка лидера), повторный submit
+      с тем же ключом возвращает результат первого (или ждет его), а не шлет второй ордер.
+      Запоминаются успех и неоднозначный исход; явный отказ ключ освобождает
+    - Ордер подписывается один раз: повторы отправляют тот же подписанный ордер
+      (тот же salt и хеш), биржа не исполнит его дважды
+    - Перед повтором после неоднозначной ошибки (таймаут, обрыв, 5xx) идет сверка
+      со сделками и открытыми ордерами по токену
+    - Повторы только для retryable ошибок и в пределах budget секунд с короткими паузами
+    """
+
+    def __init__(
+        self,
+        client,
+        budget: float = 0.8,
+        attempt_timeout: float = 2.0,
+        base_delay: float = 0.05,
+        max_attempts: int = 3,
+        ttl: float = 600,
+        max_history: int = 1000,
+        price_age: float = 5.0,
+        price_slippage: float = 0.05,
+        book_fallback: bool = True,
+    ):
+        """
+        Args:
+            client: PolyClient (client.client - ClobClient, refresh())
+            budget: сколько секунд от первой попытки еще разрешено повторять
+            attempt_timeout: таймаут одного вызова CLOB
+            base_delay: базовая пауза между попытками (с джиттером)
+            max_attempts: максимум попыток отправки
+            ttl: сколько секунд помнить результат по ключу
+            max_history: максимум запомненных ключей
+            price_age: насколько старые стакан и цену потока выходов можно брать для цены ордера
+            price_slippage: допуск цены ордера от цены потока (доля)
+            book_fallback: нет локальной цены - запросить стакан перед подписью
+                (иначе цену посчитает сам ClobClient)
+        """
+        self.client = client
+        self.budget = budget
+        self.attempt_timeout = attempt_timeout
+        self.base_delay = base_delay
+        self.max_attempts = max_attempts
+        self.ttl = ttl
+        self.max_history = max_history
+        self.price_age = price_age
+        self.price_slippage = price_slippage
+        self.book_fallback = book_fallback
+
+        self.submissions: "OrderedDict[str, _Submission]" = OrderedDict()
+        self.counters: Dict[str, int] = {
+            "submitted": 0, "retries": 0, "duplicates": 0, "reconciled": 0, "fatal": 0,
+            "priced_local": 0, "book_fetches": 0,
+        }
+
+    async def _call(self, func, *args):
+        """
+        Синхронный вызов ClobClient в пуле clob_pool (не блокирует цикл событий).
+        Таймаут - attempt_timeout, урезанный до дедлайна тика (включая ожидание
+        потока); дедлайн уходит и в поток (HTTP-запрос клиента получает тот же остаток, см. PolyClient).
+        """
+        return await call("clob", clob_pool.run(func, *args, owner=self.client), self.attempt_timeout)
+
+    def _local_price(self, submission: _Submission) -> Optional[float]:
+        """
+        Цена без сетевого запроса: стакан, уже лежащий в общем кеше процесса,
+        или свежая цена потока выходов (монитор держит токен под SL/TP) с допуском
+        price_slippage против нас. None - локальной цены нет.
+        """
+        book = clob_books.peek(submission.token_id, self.price_age)
+        if book is not None:
+            try:
+                return market_price(book, submission.side, submission.amount, submission.order_type)
+            except Exception:
+                pass
+
+        price = exits.fresh_price(submission.token_id, self.price_age)
+        if not price:
+            return None
+        tick = float(market_meta.get(submission.token_id, "tick_size") or 0.01)
+        if submission.side == "BUY":
+            price *= 1 + self.price_slippage
+        else:
+            price *= 1 - self.price_slippage
+        return min(max(price, tick), 1 - tick)
+
+    async def _price(self, submission: _Submission) -> float:
+        """
+        Цена маркет-ордера. Сначала локальная (_local_price), без лишнего запроса
+        перед подписью; запрос стакана через clob_books - явный запасной путь
+        (копии одной ставки лидера у разных пользователей делят один запрос).
+        0 - цены нет, ClobClient запросит стакан сам.
+        """
+        price = self._local_price(submission)
+        if price is not None:
+            self.counters["priced_local"] += 1
+            return price
+        if not self.book_fallback:
+            return 0
+
+        self.counters["book_fetches"] += 1
+        book = await clob_books.get_book(submission.token_id)
+        if book is None:
+            return 0
+        return market_price(book, submission.side, submission.amount, submission.order_type)
+
+    def _prune(self, now: float):
+        while self.submissions:
+            submission = next(iter(self.submissions.values()))
+            # Незавершенную отправку не вытесняем
+            if submission.done_at is None:
+                break
+            if now - submission.done_at <= self.ttl and len(self.submissions) <= self.max_history:
+                break
+            self.submissions.popitem(last=False)
+
+    async def submit(
+        self,
+        token_id: str,
+        amount: float,
+        side: str,
+        order_type=OrderType.FOK,
+        key: Optional[str] = None,
+    ) -> Tuple[bool, str]:
+        """
+        Отправляет ордер не более одного раза на ключ.
+
+        Returns:
+            Tuple[bool, str]: (успех, сообщение)
+        """
+        now = time.time()
+        self._prune(now)
+
+        key = key or uuid.uuid4().hex
+        existing = self.submissions.get(key)
+        if existing is not None:
+            self.counters["duplicates"] += 1
+            print(f"♻️ Ордер с ключом {key[:16]} уже отправлялся, повтор не нужен")
+            return await asyncio.shield(existing.future)
+
+        submission = _Submission(key, str(token_id), side, amount, order_type)
+        self.submissions[key] = submission
+        result = (False, "Отправка прервана")
+        try:
+            result = await self._submit(submission)
+        except asyncio.CancelledError:
+            # Подписанный ордер мог уйти на биржу вместе с прерванным запросом
+            if submission.signed is not None:
+                submission.ambiguous = True
+            raise
+        except Exception as e:
+            submission.ambiguous = submission.signed is not None
+            result = (False, f"Ошибка: {e}")
+        finally:
+            # Ждущие тот же ключ не должны висеть, а _prune - упираться в незавершенную запись
+            submission.done_at = time.time()
+            submission.future.set_result(result)
+            # Ордера точно нет на бирже: повтор с тем же ключом должен отправить его, а не вернуть отказ
+            if not result[0] and not submission.ambiguous and self.submissions.get(key) is submission:
+                del self.submissions[key]
+        return result
+
+    async def _submit(self, submission: _Submission) -> Tuple[bool, str]:
+        clob = self.client.client
+        deadline = time.monotonic() + self.budget
+        delay = self.base_delay
+        last_error = "неизвестная ошибка"
+
+        for attempt in range(1, self.max_attempts + 1):
+            if attempt > 1:
+                if time.monotonic() + delay > deadline or expired():
+                    break
+                self.counters["retries"] += 1
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+                delay *= 2
+
+            submitted = submission.signed is not None
+            try:
+                if submission.signed is None:
+                    order_args = MarketOrderArgs(
+                        token_id=submission.token_id,
+                        amount=submission.amount,
+                        side=submission.side,
+                        price=await self._price(submission),
+                        order_type=submission.order_type,
+                    )
+                    submission.signed = await self._call(clob.create_market_order, order_args)
+                    submitted = True
+
+                self.counters["submitted"] += 1
+                response = await self._call(clob.post_order, submission.signed, submission.order_type)
+
+                if isinstance(response, dict) and response.get("success") is False:
+                    self.counters["fatal"] += 1
+                    return False, f"Ордер отклонен: {response.get('errorMsg') or response}"
+                return True, f"Ордер принят: {response}"
+
+            except Exception as e:
+                kind = classify_error(e, submitted)
+                last_error = str(e) or type(e).__name__
+                print(f"⚠️ Попытка {attempt}/{self.max_attempts} ({kind}): {last_error}")
+
+                if kind == FATAL:
+                    # После неоднозначной попытки отказ может значить "такой ордер уже есть"
+                    status = await self._reconcile(submission) if submission.ambiguous else None
+                    if status is not None:
+                        self.counters["reconciled"] += 1
+                        return True, f"Ордер {status} (по сверке)"
+                    self.counters["fatal"] += 1
+                    return False, f"Ошибка API: {last_error}"
+
+                if kind == AUTH:
+                    # Общее обновление клиента: 401 у параллельных ордеров не плодит запросы
+                    if not await call("clob", self.client.refresh(), 10):
+                        return False, "Не удалось обновить credentials"
+                    continue
+
+                if kind == AMBIGUOUS:
+                    submission.ambiguous = True
+                    status = await self._reconcile(submission)
+                    if status is not None:
+                        self.counters["reconciled"] += 1
+                        print(f"🔎 Сверка: ордер уже {status}, повтор не нужен")
+                        return True, f"Ордер {status} (по сверке)"
+
+        return False, f"Ошибка после повторов: {last_error}"
+
+    @staticmethod
+    def _terms(submission: _Submission) -> Optional[Tuple[float, float, float]]:
+        """(шейры, USDC, лимитная цена) подписанного ордера; None - ордер не подписан."""
+        signed = submission.signed
+        if signed is None:
+            return None
+        order = signed.order
+        maker, taker = order.makerAmount / 1e6, order.takerAmount / 1e6
+        # BUY: отдаем USDC, получаем шейры; SELL - наоборот
+        shares, usdc = (taker, maker) if submission.side == "BUY" else (maker, taker)
+        return shares, usdc, (usdc / shares if shares else 0.0)
+
+    @staticmethod
+    def _close(value: float, target: float) -> bool:
+        """Совпадение с точностью округления сумм ордера."""
+        return abs(value - target) <= max(0.01, target * 0.01)
+
+    def _is_fill(self, submission: _Submission, trade: Dict, terms: Tuple[float, float, float]) -> bool:
+        """
+        Сделка - исполнение нашего ордера: та же сторона, цена не хуже лимита и тот же объем
+        (BUY - по потраченным USDC: по лучшей цене шейров выходит больше, SELL - по шейрам).
+        """
+        shares, usdc, limit = terms
+        size, price = float(trade.get("size") or 0), float(trade.get("price") or 0)
+        if trade.get("side") != submission.side:
+            return False
+        if submission.side == "BUY":
+            return price <= limit + 1e-3 and self._close(size * price, usdc)
+        return price >= limit - 1e-3 and self._close(size, shares)
+
+    def _is_open(self, submission: _Submission, order: Dict, terms: Tuple[float, float, float]) -> bool:
+        """Открытый ордер - наш: та же сторона, исходный размер и цена (с точностью шага цены)."""
+        shares, _, limit = terms
+        return (
+            order.get("side") == submission.side
+            and self._close(float(order.get("original_size") or 0), shares)
+            and abs(float(order.get("price") or 0) - limit) <= 1e-3
+        )
+
+    async def _reconcile(self, submission: _Submission) -> Optional[str]:
+        """
+        Ищет следы ордера после неоднозначной ошибки: сделка или открытый ордер
+        того же токена после начала отправки, совпадающие с подписанным ордером по стороне,
+        объему и цене (копии разных лидеров по одному токену не принимаются за наш ордер).
+
+        Returns:
+            Optional[str]: "исполнен" / "выставлен", None - ордера на бирже нет (или сверка не удалась)
+        """
+        terms = self._terms(submission)
+        if terms is None:
+            return None
+
+        clob = self.client.client
+        after = int(submission.started_at) - 1
+
+        try:
+            trades = await self._call(clob.get_trades, TradeParams(asset_id=submission.token_id, after=after))
+            for trade in trades or []:
+                if float(trade.get("match_time") or 0) >= after and self._is_fill(submission, trade, terms):
+                    return "исполнен"
+
+            orders = await self._call(clob.get_orders, OpenOrderParams(asset_id=submission.token_id))
+            for order in orders or []:
+                if float(order.get("created_at") or 0) >= after and self._is_open(submission, order, terms):
+                    return "выставлен"
+        except Exception as e:
+            # Повтор все равно безопасен: отправляется тот же подписанный ордер
+            print(f"⚠️ Сверка ордера не удалась: {e}")
+
+        return None
@@ -0,0 +1,354 @@
+import time
+import asyncio
+import aiohttp
+import bisect
+import itertools
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from utils.customprint import CustomPrint
+from utils.deadline import TimeoutScope, client_timeout
+from src.models.datacreator import DataCreator
+from src.core.PolyExits import CLOB_URL
+
+# Уровень стакана: (цена, размер в шейрах)
+Level = Tuple[float, float]
+Book = Dict[str, List[Level]]  # {"bids": [...] по убыванию, "asks": [...] по возрастанию}
+
+
+class RecordedBooks:
+    """
+    Источник стаканов из записанных снимков (бэктест / нагрузочный прогон).
+
+    snapshots: token_id -> [(ts, book), ...] по возрастанию ts.
+    Без clock отдается последний снимок, с clock - последний не позже clock().
+    """
+
+    def __init__(self, snapshots: Dict[str, List[Tuple[float, Book]]], clock=None):
+        self.snapshots = {str(k): v for k, v in snapshots.items()}
+        self.times = {k: [ts for ts, _ in v] for k, v in self.snapshots.items()}
+        self.clock = clock
+
+    def set_book(self, token_id: str, book: Book, ts: Optional[float] = None):
+        """Добавляет снимок (для стриминга из внешнего источника)."""
+        token_id = str(token_id)
+        ts = ts if ts is not None else time.time()
+        self.snapshots.setdefault(token_id, []).append((ts, book))
+        self.times.setdefault(token_id, []).append(ts)
+
+    async def get_book(self, token_id: str) -> Optional[Book]:
+        token_id = str(token_id)
+        history = self.snapshots.get(token_id)
+        if not history:
+            return None
+        if self.clock is None:
+            return history[-1][1]
+        index = bisect.bisect_right(self.times[token_id], self.clock()) - 1
+        return history[index][1] if index >= 0 else None
+
+
+class ClobBooks:
+    """
+    Живые стаканы CLOB (GET /book) с коротким кешем.
+
+    Один источник на процесс: тысячи бумажных инстансов делят один запрос
+    на токен за ttl секунд.
+    """
+
+    def __init__(self, ttl: float = 1.0, timeout: float = 3.0):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.datacreator = DataCreator()
+        self.cache: Dict[str, Tuple[float, Book]] = {}
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def _fetch(self, token_id: str) -> Optional[Book]:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession()
+
+        params, headers = self.datacreator.create_book_request_data(token_id)
+        async with TimeoutScope("clob-book"), self.session.get(
+            f"{CLOB_URL}/book", params=params, headers=headers, timeout=client_timeout("clob-book", self.timeout)
+        ) as response:
+            if response.status != 200:
+                CustomPrint().error(f"⚠️ book {response.status}")
+                return None
+            data = await response.json()
+
+        bids = sorted(((float(l["price"]), float(l["size"])) for l in data.get("bids", [])), reverse=True)
+        asks = sorted((float(l["price"]), float(l["size"])) for l in data.get("asks", []))
+        return {"bids": bids, "asks": asks}
+
+    def peek(self, token_id: str, max_age: Optional[float] = None) -> Optional[Book]:
+        """Стакан из кеша без запроса (не старше max_age, по умолчанию ttl)."""
+        cached = self.cache.get(str(token_id))
+        if cached and time.time() - cached[0] < (self.ttl if max_age is None else max_age):
+            return cached[1]
+        return None
+
+    async def get_book(self, token_id: str) -> Optional[Book]:
+        token_id = str(token_id)
+        cached = self.cache.get(token_id)
+        if cached and time.time() - cached[0] < self.ttl:
+            return cached[1]
+
+        future = self.inflight.get(token_id)
+        if future is not None:
+            return await future
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[token_id] = future
+        try:
+            book = await self._fetch(token_id)
+            if book is not None:
+                self.cache[token_id] = (time.time(), book)
+            future.set_result(book)
+            return book
+        except Exception as e:
+            future.set_result(None)
+            CustomPrint().error(f"⚠️ Ошибка загрузки стакана: {e}")
+            return None
+        finally:
+            # Отмена загрузчика (дедлайн, остановка) не должна вешать ждущих тот же токен
+            if not future.done():
+                future.set_result(None)
+            del self.inflight[token_id]
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+
+def walk_book(levels: List[Level], amount: float, by_notional: bool) -> Tuple[float, float]:
+    """
+    Проходит уровни стакана.
+
+    Args:
+        amount: USDC (by_notional) или шейры
+    Returns:
+        Tuple[float, float]: (исполнено шейров, потрачено/получено USDC)
+    """
+    shares = 0.0
+    notional = 0.0
+    left = amount
+    for price, size in levels:
+        if left <= 1e-12:
+            break
+        if by_notional:
+            take = min(size, left / price)
+            left -= take * price
+        else:
+            take = min(size, left)
+            left -= take
+        shares += take
+        notional += take * price
+    return shares, notional
+
+
+class PolyPaper:
+    """
+    Бумажный клиент: тот же интерфейс, что у PolyClient (buy / sell / close_position),
+    но сделки исполняются по стакану из источника без отправки ордеров.
+
+    - Задержка latency перед исполнением, проскальзывание slippage_bps сверх стакана
+    - BUY по умолчанию FOK: не хватает ликвидности - ордер отклоняется
+    - Позиции, средняя цена, реализованный/нереализованный PnL
+    - get_account_positions() в формате PolyScrapper, чтобы PolyRisk работал по бумажному счету
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(
+        self,
+        books,
+        balance: float = 1000,
+        latency: float = 0.0,
+        slippage_bps: float = 0.0,
+        allow_partial: bool = False,
+    ):
+        """
+        Args:
+            books: источник стаканов (RecordedBooks, ClobBooks или любой объект с async get_book)
+            balance: стартовый баланс USDC
+            latency: задержка исполнения в секундах
+            slippage_bps: дополнительное проскальзывание в б.п. против нас
+            allow_partial: исполнять частично при нехватке ликвидности
+        """
+        self.books = books
+        self.funder = f"paper-{next(self._ids)}"
+        self.initial_balance = balance
+        self.balance = balance
+        self.latency = latency
+        self.slippage = slippage_bps / 10_000
+        self.allow_partial = allow_partial
+
+        self.positions: Dict[str, Dict] = {}
+        self.realized_pnl = 0.0
+        self.fills_count = 0
+        self.fills: Deque[Dict] = deque(maxlen=200)
+        self.marks: Dict[str, float] = {}
+        # Результаты по ключам идемпотентности, как у OrderSubmitter
+        self.orders: "OrderedDict[str, Tuple[bool, str]]" = OrderedDict()
+        self.max_orders = 1000
+
+    def is_ready(self) -> bool:
+        return True
+
+    async def _book(self, token_id: str) -> Optional[Book]:
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        book = await self.books.get_book(token_id)
+        if book:
+            self._mark(token_id, book)
+        return book
+
+    def _mark(self, token_id: str, book: Book):
+        bids, asks = book.get("bids") or [], book.get("asks") or []
+        if bids and asks:
+            self.marks[token_id] = (bids[0][0] + asks[0][0]) / 2
+        elif bids or asks:
+            self.marks[token_id] = (bids or asks)[0][0]
+
+    def _record(self, side: str, token_id: str, shares: float, notional: float):
+        self.fills_count += 1
+        self.fills.append({
+            "side": side,
+            "token_id": token_id,
+            "shares": shares,
+            "price": notional / shares if shares else 0.0,
+            "notional": notional,
+            "at": time.time(),
+        })
+
+    def _replay(self, key: Optional[str]) -> Optional[Tuple[bool, str]]:
+        return self.orders.get(key) if key else None
+
+    def _remember(self, key: Optional[str], result: Tuple[bool, str]) -> Tuple[bool, str]:
+        if key:
+            self.orders[key] = result
+            if len(self.orders) > self.max_orders:
+                self.orders.popitem(last=False)
+        return result
+
+    async def buy(
+        self, token_id: str, amount: float, order_type=None, idempotency_key: Optional[str] = None
+    ) -> Tuple[bool, str]:
+        replay = self._replay(idempotency_key)
+        if replay is not None:
+            return replay
+        return self._remember(idempotency_key, await self._buy(token_id, amount))
+
+    async def sell(
+        self, token_id: str, amount: float, order_type=None, idempotency_key: Optional[str] = None
+    ) -> Tuple[bool, str]:
+        replay = self._replay(idempotency_key)
+        if replay is not None:
+            return replay
+        return self._remember(idempotency_key, await self._sell(token_id, amount))
+
+    async def _buy(self, token_id: str, amount: float) -> Tuple[bool, str]:
+        if amount <= 0:
+            return False, "Сумма должна быть больше 0"
+        if not token_id:
+            return False, "Отсутствует token_id"
+        if amount > self.balance:
+            return False, f"Недостаточно средств: ${self.balance:.2f}"
+
+        token_id = str(token_id)
+        book = await self._book(token_id)
+        if not book or not book.get("asks"):
+            return False, "Нет стакана на продажу"
+
+        shares, notional = walk_book(book["asks"], amount / (1 + self.slippage), by_notional=True)
+        if shares <= 0 or (not self.allow_partial and notional * (1 + self.slippage) < amount * 0.999):
+            return False, "Недостаточно ликвидности (FOK)"
+
+        cost = notional * (1 + self.slippage)
+        self.balance -= cost
+        position = self.positions.setdefault(token_id, {"size": 0.0, "cost": 0.0, "opened_at": time.time()})
+        position["size"] += shares
+        position["cost"] += cost
+        self._record("BUY", token_id, shares, cost)
+
+        print(f"🧪 Бумажная покупка: {shares:.4f} шейров по {cost / shares:.4f} (${cost:.2f})")
+        return True, "Покупка выполнена (paper)"
+
+    async def _sell(self, token_id: str, amount: float) -> Tuple[bool, str]:
+        if amount <= 0:
+            return False, "Количество должно быть больше 0"
+
+        token_id = str(token_id)
+        position = self.positions.get(token_id)
+        if not position or position["size"] <= 0:
+            return False, "Нет позиции"
+
+        amount = min(amount, position["size"])
+        book = await self._book(token_id)
+        if not book or not book.get("bids"):
+            return False, "Нет стакана на покупку"
+
+        shares, notional = walk_book(book["bids"], amount, by_notional=False)
+        if shares <= 0:
+            return False, "Недостаточно ликвидности"
+
+        proceeds = notional * (1 - self.slippage)
+        avg_cost = position["cost"] / position["size"]
+        self.realized_pnl += proceeds - avg_cost * shares
+        self.balance += proceeds
+
+        position["size"] -= shares
+        position["cost"] -= avg_cost * shares
+        if position["size"] <= 1e-9:
+            del self.positions[token_id]
+        self._record("SELL", token_id, shares, proceeds)
+
+        print(f"🧪 Бумажная продажа: {shares:.4f} шейров по {proceeds / shares:.4f} (${proceeds:.2f})")
+        return True, "Продажа выполнена (paper)"
+
+    async def close_position(self, token_id: str, size: float) -> Tuple[bool, str]:
+        return await self.sell(token_id, size)
+
+    async def get_account_positions(self, sortBy: str | None = None, strict: bool = False) -> List[Dict]:
+        """Снимок позиций в формате PolyScrapper.get_account_positions (цены обновляются по стакану)."""
+        result = []
+        for token_id, position in list(self.positions.items()):
+            book = await self.books.get_book(token_id)
+            if book:
+                self._mark(token_id, book)
+            avg = position["cost"] / position["size"]
+            price = self.marks.get(token_id, avg)
+            value = price * position["size"]
+            result.append({
+                "size": position["size"],
+                "avgPrice": avg,
+                "cashPnl": value - position["cost"],
+                "initialValue": position["cost"],
+                "realizedPnl": 0.0,
+                "percentPnl": (price / avg - 1) * 100 if avg else 0.0,
+                "percentRealizedPnl": None,
+                "curPrice": price,
+                "title": token_id,
+                "currentValue": value,
+                "asset": token_id,
+            })
+        return result
+
+    def summary(self) -> Dict:
+        unrealized = sum(
+            self.marks.get(token_id, p["cost"] / p["size"]) * p["size"] - p["cost"]
+            for token_id, p in self.positions.items()
+        )
+        equity = self.balance + sum(p["cost"] for p in self.positions.values()) + unrealized
+        return {
+            "balance": round(self.balance, 2),
+            "equity": round(equity, 2),
+            "realized_pnl": round(self.realized_pnl, 2),
+            "unrealized_pnl": round(unrealized, 2),
+            "open_positions": len(self.positions),
+            "fills": self.fills_count,
+            "return_percent": round((equity / self.initial_balance - 1) * 100, 2) if self.initial_balance else 0.0,
+        }
+
+
+clob_books = ClobBooks()
@@ -0,0 +1,325 @@
+import time
+import asyncio
+import traceback
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.deadline import deadline
+from src.core.PolyClient import PolyClient
+from src.core.PolyScrapper import PolyScrapper
+from src.core.PolyExits import PolyExits, exits as default_exits
+from src.core.PolyPaper import PolyPaper
+from src.models.settings import Settings
+
+
+class PolyRisk:
+    """
+    Контроль SL/TP для скопированных позиций.
+
+    - Позиции хранятся по token_id (asset), а не по названию рынка
+    - С движком PolyExits выходы срабатывают по тикам цены
+      (SL, TP, трейлинг-стоп, тайм-стоп), а снимок позиций аккаунта
+      нужен только для сверки размеров и цены входа
+    - Без движка работает по percentPnl из снимка позиций
+    - Снимок индексируется один раз за цикл, сработавшие позиции
+      закрываются параллельно
+    - Работает отдельной задачей со своим интервалом и не тормозит мониторинг
+    """
+
+    __slots__ = (
+        "client", "scrapper", "sl_percent", "tp_percent", "interval", "grace_period", "exits",
+        "trailing_percent", "max_hold", "tracked_positions", "owner", "on_change",
+    )
+
+    # Дедлайн одной сверки: запрос позиций и закрывающие ордера
+    check_budget = 15.0
+    # Сколько полных снимков подряд позиции не должно быть, чтобы снять ее с контроля
+    missing_snapshots = 3
+    # Пауза перед повтором неудавшегося закрытия (дальше x2) и ее потолок
+    close_backoff = 5.0
+    close_max_backoff = 300.0
+
+    def __init__(
+        self,
+        client: PolyClient,
+        scrapper: PolyScrapper,
+        sl_percent: Optional[float] = None,
+        tp_percent: Optional[float] = None,
+        interval: float = 5,
+        grace_period: float = 60,
+        exits: Optional[PolyExits] = None,
+        trailing_percent: Optional[float] = None,
+        max_hold: Optional[float] = None,
+    ):
+        """
+        Args:
+            client: клиент для закрытия позиций
+            scrapper: скраппер СОБСТВЕННОГО аккаунта (client.funder), не лидера
+            sl_percent: Stop-loss в процентах (30 и -30 означают убыток 30%)
+            tp_percent: Take-profit в процентах
+            interval: период сверки/проверки в секундах
+            grace_period: сколько секунд не удалять свежую позицию,
+                          которой еще нет в API позиций
+            exits: движок выходов по тикам цены
+            trailing_percent: трейлинг-стоп в процентах от пика (только с exits)
+            max_hold: тайм-стоп в секундах (только с exits)
+        """
+        self.client = client
+        self.scrapper = scrapper
+        self.sl_percent = sl_percent
+        self.tp_percent = tp_percent
+        self.interval = interval
+        self.grace_period = grace_period
+        self.exits = exits
+        self.trailing_percent = trailing_percent
+        self.max_hold = max_hold
+
+        self.owner = str(getattr(client, "funder", "") or id(self))
+        self.tracked_positions: Dict[str, Dict] = {}
+        
+        # (token_id, позиция или None) - для чекпоинта состояния монитора
+        self.on_change: Optional[Callable[[str, Optional[Dict]], None]] = None
+
+    @classmethod
+    def for_client(cls, client, settings: Settings) -> Optional["PolyRisk"]:
+        """
+        Контроль SL/TP по собственному счету клиента.
+
+        Бумажный клиент сам отдает снимок позиций, а выходы считаются по его
+        стаканам (без общего движка на живых midpoint).
+        """
+        if client is None or not getattr(client, "funder", None):
+            return None
+
+        paper = isinstance(client, PolyPaper)
+        return cls(
+            client,
+            client if paper else PolyScrapper.shared(client.funder),
+            sl_percent=settings.sl_percent,
+            tp_percent=settings.tp_percent,
+            interval=settings.sl_tp_interval,
+            exits=None if paper else default_exits,
+            trailing_percent=settings.trailing_percent,
+            max_hold=settings.max_hold,
+        )
+
+    def is_enabled(self) -> bool:
+        rules = [self.sl_percent, self.tp_percent]
+        if self.exits is not None:
+            rules += [self.trailing_percent, self.max_hold]
+        return any(rule is not None for rule in rules)
+
+    def _exit_key(self, token_id: str) -> str:
+        return f"{self.owner}:{token_id}"
+
+    def _register_exit(self, token_id: str, tracked: Dict):
+        if self.exits is None or not self.is_enabled() or not tracked.get("price"):
+            return
+        # Неудавшееся закрытие: пороги вернет сверка после паузы (_check)
+        if tracked.get("retry_at", 0) > time.time():
+            return
+
+        async def on_exit(reason: str, price: float):
+            entry = tracked.get("price") or price
+            pnl = (price / entry - 1) * 100 if entry else 0.0
+            size = tracked.get("size") or 0
+            await self._close(token_id, size, reason, pnl)
+
+        self.exits.add_position(
+            self._exit_key(token_id),
+            token_id,
+            float(tracked["price"]),
+            on_exit,
+            sl_percent=self.sl_percent,
+            tp_percent=self.tp_percent,
+            trailing_percent=self.trailing_percent,
+            max_hold=self.max_hold,
+            opened_at=tracked.get("opened_at"),
+        )
+
+    def _changed(self, token_id: str):
+        if self.on_change is not None:
+            self.on_change(token_id, self.tracked_positions.get(token_id))
+
+    def track(self, token_id: str, position: Dict):
+        """
+        Добавляет (или обновляет) отслеживаемую позицию.
+
+        position: title, outcome, price (цена входа), size (оценка в шейрах),
+                  opened_at, margin_amount
+        """
+        token_id = str(token_id)
+        existing = self.tracked_positions.get(token_id)
+        if existing:
+            existing["margin_amount"] = existing.get("margin_amount", 0) + position.get("margin_amount", 0)
+            existing["size"] = existing.get("size", 0) + position.get("size", 0)
+            self._changed(token_id)
+            return
+
+        tracked = dict(position, token_id=token_id)
+        self.tracked_positions[token_id] = tracked
+        self._register_exit(token_id, tracked)
+        self._changed(token_id)
+
+    def untrack(self, token_id: str) -> Optional[Dict]:
+        token_id = str(token_id)
+        if self.exits is not None:
+            self.exits.remove_position(self._exit_key(token_id))
+        tracked = self.tracked_positions.pop(token_id, None)
+        if tracked is not None:
+            self._changed(token_id)
+        return tracked
+
+    def reduce(self, token_id: str, size: float) -> float:
+        """
+        Уменьшает позицию после частичной продажи (зеркалирование выхода лидера).
+
+        Returns:
+            float: оставшийся размер (0 — позиция снята с контроля)
+        """
+        token_id = str(token_id)
+        tracked = self.tracked_positions.get(token_id)
+        if tracked is None:
+            return 0.0
+
+        remaining = max(0.0, float(tracked.get("size") or 0) - size)
+        if remaining <= 1e-6:
+            self.untrack(token_id)
+            return 0.0
+        tracked["size"] = remaining
+        self._changed(token_id)
+        return remaining
+
+    def release(self):
+        """Снимает все пороги с движка выходов (при остановке монитора)."""
+        if self.exits is None:
+            return
+        for token_id in self.tracked_positions:
+            self.exits.remove_position(self._exit_key(token_id))
+
+    def _trigger(self, pnl: float) -> Optional[str]:
+        if self.sl_percent is not None and pnl <= -abs(float(self.sl_percent)):
+            return "SL"
+        if self.tp_percent is not None and pnl >= abs(float(self.tp_percent)):
+            return "TP"
+        return None
+
+    async def _close(self, token_id: str, size: float, reason: str, pnl: float) -> Tuple[str, bool, str]:
+        tracked = self.tracked_positions.get(token_id, {})
+        title = tracked.get("title", token_id)
+        icon = "🎯" if reason == "TP" else "🛑"
+        print(f"{icon} {reason} сработал: {title}")
+        print(f"   PnL: {pnl:.2f}%")
+
+        if size <= 0:
+            return token_id, False, "Неизвестен размер позиции"
+
+        try:
+            success, msg = await self.client.close_position(token_id, size)
+        except Exception as e:
+            print(f"⚠️ Ошибка {reason}: {e}")
+            success, msg = False, str(e)
+
+        if success:
+            self.untrack(token_id)
+            print(f"   ✅ Позиция закрыта")
+        elif token_id in self.tracked_positions:
+            # Движок уже снял пороги; вернуть их сразу - значит повторять ордер
+            # каждый тик (тайм-стоп сработает снова), поэтому повтор после паузы
+            failures = tracked.get("close_failures", 0) + 1
+            delay = min(self.close_max_backoff, self.close_backoff * 2 ** (failures - 1))
+            tracked["close_failures"] = failures
+            tracked["retry_at"] = time.time() + delay
+            print(f"   🔁 Повтор {reason} через {delay:.0f}s (попытка {failures})")
+            self._changed(token_id)
+        return token_id, success, msg
+
+    async def check(self) -> List[Tuple[str, bool, str]]:
+        """
+        Один цикл сверки (и проверки SL/TP, если нет движка выходов).
+
+        Returns:
+            List[Tuple[str, bool, str]]: (token_id, успех, сообщение) по закрытым позициям
+        """
+        if not self.is_enabled() or not self.tracked_positions:
+            return []
+
+        with deadline(self.check_budget, root=True):
+            return await self._check()
+
+    async def _check(self) -> List[Tuple[str, bool, str]]:
+        try:
+            positions = await self.scrapper.get_account_positions(strict=True)
+        except Exception as e:
+            print(f"⚠️ Ошибка получения позиций для SL/TP: {e}")
+            return []
+
+        # Пустой снимок при отслеживаемых позициях - скорее сбой API, чем закрытие всех
+        # сразу: без информации размеры не трогаем и с контроля ничего не снимаем
+        if not positions:
+            return []
+
+        index = {str(p["asset"]): p for p in positions if p.get("asset")}
+        now = time.time()
+        triggered = []
+
+        for token_id, tracked in list(self.tracked_positions.items()):
+            pm_pos = index.get(token_id)
+            size = float(pm_pos.get("size") or 0) if pm_pos else 0
+
+            if size <= 0:
+                # Снимаем только после нескольких полных снимков подряд без позиции
+                tracked["missing"] = tracked.get("missing", 0) + 1
+                if (
+                    tracked["missing"] >= self.missing_snapshots
+                    and now - tracked.get("opened_at", 0) > self.grace_period
+                ):
+                    self.untrack(token_id)
+                continue
+            tracked.pop("missing", None)
+
+            if tracked.get("size") != size:
+                tracked["size"] = size
+                self._changed(token_id)
+
+            retry_at = tracked.get("retry_at")
+            if retry_at is not None:
+                if now < retry_at:
+                    continue
+                del tracked["retry_at"]
+                self._register_exit(token_id, tracked)
+
+            if self.exits is not None:
+                avg_price = float(pm_pos.get("avgPrice") or 0)
+                if avg_price > 0 and not tracked.get("synced"):
+                    tracked["price"] = avg_price
+                    tracked["synced"] = True
+                    self._register_exit(token_id, tracked)
+                    self._changed(token_id)
+                continue
+
+            pnl = pm_pos.get("percentPnl")
+            if pnl is None:
+                pnl = pm_pos.get("percentRealizedPnl")
+            if pnl is None:
+                continue
+
+            reason = self._trigger(float(pnl))
+            if reason:
+                triggered.append(self._close(token_id, size, reason, float(pnl)))
+
+        if not triggered:
+            return []
+
+        return list(await asyncio.gather(*triggered))
+
+    async def run(self, stop_at: Optional[float] = None):
+        """Отдельный цикл сверки/SL/TP со своим интервалом."""
+        while stop_at is None or time.time() < stop_at:
+            try:
+                await self.check()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Ошибка check_sl_tp: {e}")
+                traceback.print_exc()
+            await asyncio.sleep(self.interval)
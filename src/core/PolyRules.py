@@ -0,0 +1,204 @@
+"""
+Язык правил фильтрации ставок.
+
+Примеры:
+    usdcSize >= 50 and price between 0.1 and 0.8 and outcome == "Yes"
+    not (title contains "bitcoin") or usdcSize > 1000
+    outcome in ["Yes", "No"] and price < 0.5
+
+Правило разбирается один раз и компилируется в Python-функцию;
+одинаковые правила (после нормализации) переиспользуются всеми мониторами.
+"""
+import re
+from typing import Callable, Dict, List, Tuple
+
+from src.models.position import Position
+
+NUMERIC_FIELDS = {
+    "usdcSize": "usdcSize",
+    "amount": "usdcSize",
+    "price": "price",
+}
+
+STRING_FIELDS = {
+    "outcome": "outcome",
+    "title": "title",
+    "slug": "slug",
+    "conditionId": "conditionId",
+    "token_id": "token_id",
+}
+
+KEYWORDS = {"and", "or", "not", "between", "in", "contains", "true", "false"}
+
+TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<number>-?\d+(?:\.\d+)?)
+      | (?P<string>"[^"]*"|'[^']*')
+      | (?P<op>==|!=|<=|>=|<|>)
+      | (?P<punct>[()\[\],])
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    )""", re.VERBOSE)
+
+Rule = Callable[[Position], bool]
+
+
+class RuleError(ValueError):
+    """Ошибка разбора правила."""
+
+
+def _tokenize(text: str) -> List[Tuple[str, str]]:
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        match = TOKEN_RE.match(text, pos)
+        if not match or match.end() == pos:
+            raise RuleError(f"непонятный символ в позиции {pos + 1}: {text[pos:pos + 10]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "name" and value.lower() in KEYWORDS:
+            kind, value = "kw", value.lower()
+        tokens.append((kind, value))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    """Рекурсивный спуск: правило -> исходник Python-выражения."""
+
+    def __init__(self, text: str):
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def _peek(self) -> Tuple[str, str]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else ("eof", "")
+
+    def _next(self) -> Tuple[str, str]:
+        token = self._peek()
+        self.pos += 1
+        return token
+
+    def _expect(self, kind: str, value: str = None) -> str:
+        token_kind, token_value = self._next()
+        if token_kind != kind or (value is not None and token_value != value):
+            expected = value or kind
+            raise RuleError(f"ожидалось {expected!r}, получено {token_value or 'конец правила'!r}")
+        return token_value
+
+    def parse(self) -> str:
+        if not self.tokens:
+            raise RuleError("пустое правило")
+        source = self._or()
+        if self._peek()[0] != "eof":
+            raise RuleError(f"лишний текст: {self._peek()[1]!r}")
+        return source
+
+    def _or(self) -> str:
+        parts = [self._and()]
+        while self._peek() == ("kw", "or"):
+            self._next()
+            parts.append(self._and())
+        return parts[0] if len(parts) == 1 else "(" + " or ".join(parts) + ")"
+
+    def _and(self) -> str:
+        parts = [self._not()]
+        while self._peek() == ("kw", "and"):
+            self._next()
+            parts.append(self._not())
+        return parts[0] if len(parts) == 1 else "(" + " and ".join(parts) + ")"
+
+    def _not(self) -> str:
+        if self._peek() == ("kw", "not"):
+            self._next()
+            return f"(not {self._not()})"
+        return self._atom()
+
+    def _number(self) -> float:
+        return float(self._expect("number"))
+
+    def _string(self) -> str:
+        return self._expect("string")[1:-1]
+
+    def _atom(self) -> str:
+        kind, value = self._peek()
+        if (kind, value) == ("punct", "("):
+            self._next()
+            source = self._or()
+            self._expect("punct", ")")
+            return source
+        if kind == "kw" and value in ("true", "false"):
+            self._next()
+            return "True" if value == "true" else "False"
+
+        field = self._expect("name")
+        if field in NUMERIC_FIELDS:
+            return self._numeric(f"b.{NUMERIC_FIELDS[field]}")
+        if field in STRING_FIELDS:
+            return self._text(f"str(b.{STRING_FIELDS[field]}).lower()")
+
+        known = ", ".join(list(NUMERIC_FIELDS) + list(STRING_FIELDS))
+        raise RuleError(f"неизвестное поле {field!r}, доступны: {known}")
+
+    def _numeric(self, attr: str) -> str:
+        kind, value = self._next()
+        if kind == "op":
+            return f"({attr} {value} {self._number()!r})"
+        if (kind, value) == ("kw", "between"):
+            low = self._number()
+            self._expect("kw", "and")
+            high = self._number()
+            if low > high:
+                low, high = high, low
+            return f"({low!r} <= {attr} <= {high!r})"
+        if (kind, value) == ("kw", "in"):
+            return f"({attr} in {tuple(self._list(self._number))!r})"
+        raise RuleError(f"после числового поля ожидалось сравнение, получено {value!r}")
+
+    def _text(self, attr: str) -> str:
+        kind, value = self._next()
+        if kind == "op" and value in ("==", "!="):
+            return f"({attr} {value} {self._string().lower()!r})"
+        if (kind, value) == ("kw", "contains"):
+            return f"({self._string().lower()!r} in {attr})"
+        if (kind, value) == ("kw", "in"):
+            items = tuple(item.lower() for item in self._list(self._string))
+            return f"({attr} in {items!r})"
+        raise RuleError(f"для текстового поля доступны ==, !=, in, contains, получено {value!r}")
+
+    def _list(self, item: Callable) -> list:
+        self._expect("punct", "[")
+        items = [item()]
+        while self._peek() == ("punct", ","):
+            self._next()
+            items.append(item())
+        self._expect("punct", "]")
+        return items
+
+
+MAX_COMPILED = 1024
+_compiled: Dict[str, Rule] = {}
+
+
+def parse_rule(text: str) -> str:
+    """Разбирает правило и возвращает нормализованный исходник предиката."""
+    return _Parser(text).parse()
+
+
+def compile_rule(text: str) -> Rule:
+    """
+    Компилирует правило в предикат Position -> bool.
+
+    Одинаковые правила возвращают один и тот же объект функции.
+
+    Raises:
+        RuleError: если правило не разбирается
+    """
+    source = parse_rule(text)
+    rule = _compiled.get(source)
+    if rule is None:
+        if len(_compiled) >= MAX_COMPILED:
+            _compiled.clear()
+        # Исходник собран только из белого списка полей и repr() литералов
+        rule = eval(f"lambda b: {source}", {"__builtins__": {}, "str": str})
+        _compiled[source] = rule
+    return rule
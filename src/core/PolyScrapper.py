@@ -1,53 +1,115 @@
 import time 
 import asyncio
 import aiohttp
-from typing import List
+import weakref
+from contextlib import asynccontextmanager
+from typing import List, Optional, Tuple
 
 from utils.customprint import CustomPrint
-from utils.decorator import retry_async
+from utils.decorator import retry_async, raise_for_retry
+from utils.deadline import TimeoutScope, client_timeout
 
 from src.models.position import Position
 from src.models.datacreator import DataCreator
 
 
 class PolyScrapper:
-    def __init__(self, address: str):
+    # DataCreator без состояния: один на все скрапперы
+    datacreator = DataCreator()
+    base_url = "https://data-api.polymarket.com/"
+    # Лимит одного запроса к data-api (урезается до дедлайна тика/апдейта)
+    timeout = 5.0
+    # Лимит точечного запроса позиции на быстром пути выхода
+    position_timeout = 1.5
+    # Страниц /positions по 50: обычный снимок и полный (strict, сверка SL/TP)
+    positions_pages = 6
+    strict_positions_pages = 20
+
+    # Скрапперы по адресу (shared) и HTTP-сессия data-api на процесс
+    _registry: "weakref.WeakValueDictionary[str, PolyScrapper]" = weakref.WeakValueDictionary()
+    _shared_session: Optional[Tuple[asyncio.AbstractEventLoop, aiohttp.ClientSession]] = None
+
+    def __init__(self, address: str, session: Optional[aiohttp.ClientSession] = None):
         self.address = address
-        self.datacreator = DataCreator()
-        self.base_url = "https://data-api.polymarket.com/"
+        # Своя сессия (например, у ConsensusHub); без нее - общая сессия процесса
+        self.session = session
+
+    @classmethod
+    def shared(cls, address: str) -> "PolyScrapper":
+        """Один скраппер на кошелек, сколько бы мониторов за ним ни следили."""
+        scrapper = cls._registry.get(address)
+        if scrapper is None:
+            scrapper = cls._registry[address] = cls(address)
+        return scrapper
+
+    @classmethod
+    def _process_session(cls) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if cls._shared_session is not None:
+            owner, session = cls._shared_session
+            if owner is loop and not session.closed:
+                return session
+        session = aiohttp.ClientSession()
+        cls._shared_session = (loop, session)
+        return session
 
-    @retry_async(attempts=3)
+    @classmethod
+    async def close_shared(cls):
+        """Закрывает общую сессию data-api (при остановке процесса)."""
+        if cls._shared_session is not None:
+            _, session = cls._shared_session
+            cls._shared_session = None
+            await session.close()
+
+    @asynccontextmanager
+    async def _session(self):
+        if self.session is not None and not self.session.closed:
+            yield self.session
+            return
+        yield self._process_session()
+
+    @retry_async(attempts=3, host="data-api")
     async def get_account_positions(
         self, 
         sortBy: str | None = 'CASHPNL', 
+        strict: bool = False,
     ) -> List:
         """
         Фунция для поиска всех позиций и предсортировки в API
 
         Args:
             sortBy (str): default = CASHPNL, так же может быть INITIAL - новые,  CURRENT - самое большое колво валуе (маржа + пнл)
+            strict (bool): только полный снимок - ошибка страницы или упор в лимит страниц
+                           поднимают исключение, а не возвращают обрезанный список
         Returns:
             positions (list): сырые позиции с начальными фильтрами
         """
         all_positions = []
-        async with aiohttp.ClientSession() as session:
-            for offset in range(0, 300, 50):
+        pages = self.strict_positions_pages if strict else self.positions_pages
+        complete = False
+        async with self._session() as session:
+            for offset in range(0, pages * 50, 50):
                 params, headers = self.datacreator.create_pos_request_data(
                     offset=str(offset),
                     sortBy=sortBy,
                     address=self.address
                 )
-                async with session.get(
+                async with TimeoutScope("data-api"), session.get(
                     f'{self.base_url}positions',
                     params=params,
-                    headers=headers
+                    headers=headers,
+                    timeout=client_timeout("data-api", self.timeout)
                 ) as response:
+                    raise_for_retry(response)
                     if response.status != 200:
+                        if strict:
+                            raise RuntimeError(f"позиции: статус {response.status}")
                         CustomPrint().error(f"⚠️ {response.status}")
                         break
                     
                     data = await response.json()
                     if len(data) == 0:
+                        complete = True
                         break
 
                     for pos in data:
@@ -57,27 +119,66 @@ class PolyScrapper:
                             "cashPnl": pos.get("cashPnl"),
                             "initialValue": pos.get("initialValue"),
                             "realizedPnl": pos.get("realizedPnl"),
+                            "percentPnl": pos.get("percentPnl"),
                             "percentRealizedPnl": pos.get("percentRealizedPnl"),
                             "curPrice": pos.get("curPrice"),
                             "title": pos.get("title"),
                             "currentValue": pos.get("currentValue"),
                             "asset": pos.get('asset')
                         })
+                    if len(data) < 50:
+                        complete = True
+                        break
+
+        if strict and not complete:
+            raise RuntimeError(f"позиций больше {pages * 50}, снимок неполный")
         return all_positions
     
 
-    async def get_last_bets(self, max_age: int | None = 2) -> List[Position]:  
+    async def get_position_size(self, condition_id: str, token_id: str) -> Optional[float]:
         """
-        Получает последние ставки (ТОЛЬКО ПОКУПКИ, НЕ СТАРШЕ 2 минут)
-        Возвращает список Position объектов
+        Размер позиции по одному токену: один запрос /positions по рынку,
+        без повторов и пагинации (быстрый путь зеркалирования выхода).
+
+        Returns:
+            Optional[float]: размер в шейрах, None - запрос не удался или токена в ответе нет
         """
-        async with aiohttp.ClientSession() as session:
+        params, headers = self.datacreator.create_pos_request_data(
+            address=self.address,
+            offset='0',
+            market=condition_id,
+            sizeThreshold='0',
+        )
+        async with self._session() as session:
+            async with TimeoutScope("data-api"), session.get(
+                f'{self.base_url}positions',
+                params=params,
+                headers=headers,
+                timeout=client_timeout("data-api", self.position_timeout)
+            ) as response:
+                if response.status != 200:
+                    CustomPrint().error(f"⚠️ {response.status}")
+                    return None
+                data = await response.json()
+
+        for pos in data or []:
+            if str(pos.get('asset')) == str(token_id):
+                return float(pos.get('size') or 0)
+        return None
+
+    async def get_last_activity(self, max_age: int | None = 2) -> List[Position]:
+        """
+        Получает последние покупки, продажи и погашения (REDEEM), НЕ СТАРШЕ max_age минут.
+        Возвращает список Position объектов (side: BUY / SELL / REDEEM)
+        """
+        async with self._session() as session:
             params, headers = self.datacreator.create_activity_request_data(limit='30', address=self.address)
             
-            async with session.get(
+            async with TimeoutScope("data-api"), session.get(
                 f'{self.base_url}activity',
                 params=params,
-                headers=headers
+                headers=headers,
+                timeout=client_timeout("data-api", self.timeout)
             ) as response:
                 if response.status != 200:
                     CustomPrint().error(f"⚠️ Ошибка {response.status}")
@@ -89,54 +190,71 @@ class PolyScrapper:
                     return []
 
                 current_time = time.time()
-                filtered_bets = []
+                activity = []
                 
                 for pos in data:
                     bet_time = int(pos.get('timestamp', 0))
                     age_minutes = (current_time - bet_time) / 60
                     
-                    if age_minutes > max_age or pos.get('side') != 'BUY':
+                    side = 'REDEEM' if pos.get('type') == 'REDEEM' else pos.get('side')
+                    if age_minutes > max_age or side not in ('BUY', 'SELL', 'REDEEM'):
                         continue
                     
-                    filtered_bets.append(
+                    activity.append(
                     Position(
-                        slug=pos.get('slug'),
-                        conditionId=pos.get('conditionId'),
-                        outcome=pos.get('outcome'),
-                        usdcSize=pos.get('usdcSize'),
-                        title=pos.get('title'),
-                        price=pos.get('price'),
-                        token_id=pos.get('asset')
+                        slug=pos.get('slug') or '',
+                        conditionId=pos.get('conditionId') or '',
+                        outcome=pos.get('outcome') or '',
+                        usdcSize=pos.get('usdcSize') or 0,
+                        title=pos.get('title') or '',
+                        price=pos.get('price') or 0,
+                        token_id=pos.get('asset') or '',
+                        side=side,
+                        size=pos.get('size'),
+                        timestamp=bet_time,
+                        transactionHash=pos.get('transactionHash')
                     ))
                 
-                return filtered_bets
+                return activity
+
+    async def get_last_bets(self, max_age: int | None = 2) -> List[Position]:  
+        """
+        Получает последние ставки (ТОЛЬКО ПОКУПКИ, НЕ СТАРШЕ 2 минут)
+        Возвращает список Position объектов
+        """
+        activity = await self.get_last_activity(max_age)
+        return [bet for bet in activity if bet.side == 'BUY']
                         
 
-    @retry_async(attempts=3)
+    @retry_async(attempts=3, host="data-api")
     async def check_leaderboard(self, timePeriod: str | None = 'all') -> dict:
-        async with aiohttp.ClientSession() as session:
+        async with TimeoutScope("data-api"), aiohttp.ClientSession() as session:
             params, headers = self.datacreator.create_lead_request_data(timePeriod=timePeriod, address=self.address)   
             response = await session.get(
                 f'{self.base_url}v1/leaderboard',
                 params=params,
-                headers=headers
+                headers=headers,
+                timeout=client_timeout("data-api", self.timeout)
             )
+            raise_for_retry(response)
             if response.status != 200:
                         CustomPrint().error(f"⚠️ {response.status}")
                         return None
             return (await response.json())[0]
         
 
-    @retry_async(attempts=3)
+    @retry_async(attempts=3, host="data-api")
     async def get_value_user(self):
-        async with aiohttp.ClientSession() as session:
+        async with TimeoutScope("data-api"), aiohttp.ClientSession() as session:
             _, headers = self.datacreator.create_activity_request_data(address=self.address)
             params = {'user': self.address}
             response = await session.get(
                 f'{self.base_url}value',
                 params=params,
-                headers=headers
+                headers=headers,
+                timeout=client_timeout("data-api", self.timeout)
             )
+            raise_for_retry(response)
             if response.status != 200:
                     CustomPrint().error(f"⚠️ {response.status}")
                     return None
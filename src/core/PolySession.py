@@ -0,0 +1,347 @@
+import time
+import asyncio
+import traceback
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.sketches import HyperLogLog
+from utils.deadline import deadline
+from src.models.settings import Settings
+from src.models.position import Position
+from src.core.PolyCopy import PolyCopy
+from src.core.PolyFilter import BatchFilter, PASSED, REASONS, SKIPPED
+from src.core.PolyClient import PolyClient
+from src.core.PolyScrapper import PolyScrapper
+from src.core.PolyRisk import PolyRisk
+from src.core.PolyPaper import PolyPaper
+from src.core.PolyOrders import clob_pool
+from src.core.PolyMarkets import market_meta
+from src.core.PolyStats import LATENCY_KINDS, latency_percentiles
+from src.core.PolyCheckpoint import Checkpointer, Entries, shared_entries, restore_shared, attach_shared
+from src.core.PolyWheel import Periodic, TimingWheel, wheel as default_wheel
+
+
+class PolySession:
+    """
+    Одна copy-сессия пользователя на любое число лидеров.
+
+    - У каждого лидера свой PolyCopy со своими Settings и маржой
+    - Общие на всю сессию: PolyClient, индекс дедупликации и контроль SL/TP (PolyRisk);
+      скрапперы общие на процесс (PolyScrapper.shared), лидеры без своих
+      settings делят настройки сессии
+    - Состояние всех лидеров пишется в один чекпоинт (attach_checkpoint)
+    - Опрос лидеров, сверка SL/TP и срок сессии - таймеры общего TimingWheel,
+      а не собственные sleep-циклы: между тиками сессия ничего не будит
+    """
+
+    __slots__ = (
+        "settings", "client", "poll_interval", "wheel", "leaders", "processed_bets", "risk",
+        "checkpoint", "jobs", "tick_budget", "batch",
+    )
+
+    # Сколько самых крупных открытых позиций лидера прогревать при старте
+    PREFETCH_POSITIONS = 50
+
+    def __init__(
+        self,
+        settings: Settings,
+        client: Optional[PolyClient] = None,
+        poll_interval: float = 1,
+        wheel: Optional[TimingWheel] = None,
+        tick_budget: float = 10,
+    ):
+        """
+        Args:
+            settings: настройки сессии (длительность, SL/TP) и настройки лидеров по умолчанию
+            client: общий клиент для всех лидеров
+            poll_interval: пауза между опросами лидеров в секундах
+            wheel: колесо таймеров (по умолчанию общее на процесс)
+            tick_budget: дедлайн тика в секундах - на все запросы, ордера и уведомления
+                         под ним (зависший сокет не останавливает сессию)
+        """
+        self.settings = settings
+        self.client = client
+        self.poll_interval = poll_interval
+        self.wheel = wheel or default_wheel
+        self.tick_budget = tick_budget
+
+        self.leaders: Dict[str, PolyCopy] = {}
+        self.processed_bets: Dict[str, float] = {}
+
+        self.risk: Optional[PolyRisk] = PolyRisk.for_client(client, settings)
+        self.checkpoint: Optional[Checkpointer] = None
+        self.jobs: List[Periodic] = []
+        # (адреса лидеров, BatchFilter по их settings) - пересобирается при смене состава,
+        # при замене Settings лидера обновляются правила
+        self.batch: Optional[Tuple[Tuple[str, ...], BatchFilter]] = None
+
+    def add_leader(
+        self,
+        address: str,
+        settings: Optional[Settings] = None,
+        margin_amount: float = 0,
+    ) -> PolyCopy:
+        """Добавляет лидера; без своих settings используются настройки сессии."""
+        copy = PolyCopy(
+            settings or self.settings,
+            PolyScrapper.shared(address),
+            client=self.client,
+            margin_amount=margin_amount,
+            risk=self.risk,
+            processed_bets=self.processed_bets,
+        )
+        self.leaders[address] = copy
+        if self.checkpoint is not None:
+            copy.attach_checkpoint(self.checkpoint, include_shared=False)
+        return copy
+
+    def remove_leader(self, address: str) -> Optional[PolyCopy]:
+        return self.leaders.pop(address, None)
+
+    def checkpoint_entries(self) -> Entries:
+        entries = shared_entries(self.processed_bets, self.risk)
+        for copy in self.leaders.values():
+            entries += copy.checkpoint_entries(include_shared=False)
+        return entries
+
+    def restore_state(self, state: Dict[str, Dict]):
+        """Восстанавливает общую часть и состояние лидеров (после add_leader, до attach_checkpoint)."""
+        restore_shared(state, self.processed_bets, self.risk)
+        for copy in self.leaders.values():
+            copy.restore_state(state, include_shared=False)
+
+    def attach_checkpoint(self, checkpoint: Checkpointer):
+        self.checkpoint = checkpoint
+        checkpoint.state_func = self.checkpoint_entries
+        attach_shared(checkpoint, self.risk)
+        for copy in self.leaders.values():
+            copy.attach_checkpoint(checkpoint, include_shared=False)
+
+    def is_trading_enabled(self) -> bool:
+        return any(copy.is_trading_enabled() for copy in self.leaders.values())
+
+    @staticmethod
+    def _notify(address: str, callback_func: Optional[Callable]) -> Optional[Callable]:
+        if callback_func is None:
+            return None
+
+        async def notify(*args):
+            await callback_func(address, *args)
+
+        return notify
+
+    async def _poll(self, address: str, copy: PolyCopy, current_time: float, callback_func: Optional[Callable]) -> List[Position]:
+        """Опрос лидера: выходы зеркалируются сразу, новые покупки возвращаются на пакетный фильтр."""
+        bets = await copy.scrapper.get_last_activity()
+        if not bets and not copy.fills.pending:
+            return []
+        return await copy.collect_bets(bets, current_time, self._notify(address, callback_func))
+
+    def _batch_filter(self) -> Tuple[Tuple[str, ...], BatchFilter]:
+        addresses = tuple(self.leaders)
+        settings = [copy.settings for copy in self.leaders.values()]
+        if self.batch is None or self.batch[0] != addresses:
+            self.batch = (addresses, BatchFilter(settings))
+        elif any(old is not new for old, new in zip(self.batch[1].settings, settings)):
+            self.batch[1].update_settings(settings)
+        return self.batch
+
+    def _filter(self, collected: List[Tuple[str, List[Position]]], current_time: float) -> List[np.ndarray]:
+        """
+        Сумма, цена, правило и накрутка для новых покупок всех лидеров одним BatchFilter.
+
+        Returns:
+            List[np.ndarray]: коды причин покупок каждого лидера из collected (по порядку)
+        """
+        addresses, batch = self._batch_filter()
+        rows = {address: row for row, address in enumerate(addresses)}
+        bets = [bet for _, new in collected for bet in new]
+
+        # Ставка оценивается только для своего лидера; запоздавшая отсекается в copy_bet
+        # до фильтров и, как на скалярном пути, не расходует лимит накрутки
+        applicable = np.zeros((len(addresses), len(bets)), dtype=bool)
+        column = 0
+        for address, new in collected:
+            copy = self.leaders[address]
+            for bet in new:
+                applicable[rows[address], column] = not copy.is_stale(bet)
+                column += 1
+
+        histories = [self.leaders[address].market_transactions for address in addresses]
+        codes = batch.evaluate(bets, histories, current_time, applicable)
+
+        per_leader = []
+        column = 0
+        for address, new in collected:
+            per_leader.append(codes[rows[address], column:column + len(new)])
+            column += len(new)
+        return per_leader
+
+    async def _copy(self, address: str, bets: List[Position], codes: np.ndarray, callback_func: Optional[Callable]):
+        copy = self.leaders[address]
+        notify = self._notify(address, callback_func)
+        copy.save_market_transactions([bet for bet, code in zip(bets, codes) if code == PASSED])
+        for bet, code in zip(bets, codes.tolist()):
+            if code == PASSED or code == SKIPPED:
+                await copy.copy_bet(bet, notify, prefiltered=True)
+            else:
+                print(f"   🔍 Фильтр: {REASONS[code]}")
+                copy.stats.record_rejection(REASONS[code])
+
+    async def _tick(self, callback_func: Optional[Callable]) -> Optional[float]:
+        """
+        Один опрос всех лидеров параллельно; новые покупки всех лидеров фильтруются
+        одним BatchFilter и исполняются (лидеры параллельно). После ошибки сессии - пауза 10s.
+        """
+        current_time = time.time()
+        try:
+            leaders = list(self.leaders.items())
+            with deadline(self.tick_budget, root=True):
+                results = await asyncio.gather(
+                    *(self._poll(address, copy, current_time, callback_func) for address, copy in leaders),
+                    return_exceptions=True,
+                )
+                collected = []
+                for (address, _), result in zip(leaders, results):
+                    if isinstance(result, Exception):
+                        print(f"❌ Ошибка опроса {address[:8]}...: {result}")
+                    elif result and address in self.leaders:
+                        collected.append((address, result))
+
+                if collected:
+                    codes = self._filter(collected, current_time)
+                    results = await asyncio.gather(
+                        *(self._copy(address, new, leader_codes, callback_func)
+                          for (address, new), leader_codes in zip(collected, codes)),
+                        return_exceptions=True,
+                    )
+                    for (address, _), result in zip(collected, results):
+                        if isinstance(result, Exception):
+                            print(f"❌ Ошибка копирования {address[:8]}...: {result}")
+        except Exception as e:
+            print(f"\n❌ Ошибка сессии: {e}")
+            traceback.print_exc()
+            return 10
+        return None
+
+    async def _prefetch(self):
+        """
+        Прогрев метаданных токенов из открытых позиций лидеров: докупки и выходы
+        лидера идут по этим токенам, и ордер подписывается без сетевых запросов.
+        """
+        try:
+            with deadline(self.tick_budget * 3, root=True):
+                results = await asyncio.gather(
+                    *(copy.scrapper.get_account_positions("CURRENT") for copy in self.leaders.values()),
+                    return_exceptions=True,
+                )
+                token_ids = [
+                    position["asset"]
+                    for positions in results if not isinstance(positions, Exception)
+                    for position in positions[:self.PREFETCH_POSITIONS]
+                ]
+                count = await self.client.prefetch(token_ids)
+            if count:
+                print(f"🔥 Метаданные {count} токенов лидеров загружены")
+        except Exception as e:
+            print(f"⚠️ Прогрев метаданных не удался: {e}")
+
+    async def run(self, callback_func: Optional[Callable] = None) -> Tuple[str, Optional[Position]]:
+        """
+        Главный цикл сессии: ставит таймеры на колесо и ждет срока или отмены.
+
+        Args:
+            callback_func: async (address, position, message, trade_executed, trade_message)
+        Returns:
+            Tuple[str, Optional[Position]]: (причина остановки, последняя позиция)
+        """
+        start_time = self.settings.started_at
+        stop_at = start_time + self.settings.exp_at
+
+        print(f"\n{'='*60}")
+        print(f"🔍 Copy-сессия: {len(self.leaders)} лидер(ов)")
+        print(f"⏰ Длительность: {self.settings.exp_at}s")
+        for address, copy in self.leaders.items():
+            print(f"   👛 {address[:8]}... мин. ${copy.settings.min_amount}, маржа ${copy.margin_amount}")
+        print(f"{'='*60}\n")
+
+        warmup = None
+        if isinstance(self.client, PolyClient) and self.is_trading_enabled():
+            # Credentials обновляются в фоне, метаданные токенов греются до первой сделки
+            self.client.ensure_refresher()
+            warmup = asyncio.ensure_future(self._prefetch())
+        jobs = self.jobs = [self.wheel.every(self.poll_interval, self._tick, callback_func, jitter=True)]
+        if self.is_trading_enabled() and self.risk is not None and self.risk.is_enabled():
+            jobs.append(self.wheel.every(self.risk.interval, self.risk.check, jitter=True))
+
+        try:
+            await self.wheel.sleep(stop_at - time.time())
+            print(f"\n⏰ Время сессии истекло ({time.time() - start_time:.0f}s)")
+            return ("время истекло", None)
+
+        except asyncio.CancelledError:
+            print(f"\n🛑 Сессия отменена пользователем")
+            raise
+
+        finally:
+            if warmup is not None:
+                warmup.cancel()
+            for job in jobs:
+                await job.stop()
+            for copy in self.leaders.values():
+                await copy.stats.export()
+            if self.risk is not None:
+                self.risk.release()
+
+    async def drain(self):
+        """
+        Остановка приема перед рестартом: новые опросы и сверки SL/TP не планируются,
+        начатые (ордер и уведомление) дорабатывают. Сам run() завершает отмена.
+        """
+        for job in self.jobs:
+            await job.stop(cancel_running=False)
+
+    def get_statistics(self) -> Dict:
+        """Сводная статистика по всем лидерам + разбивка по каждому."""
+        per_leader = {address: copy.get_statistics() for address, copy in self.leaders.items()}
+
+        summed = [
+            "bets_seen", "total_found", "rejected", "trades_ok", "trades_failed", "exits_ok", "exits_failed",
+            "notional_seen", "notional_found", "notional_copied",
+        ]
+        total: Dict = {key: 0 for key in summed}
+        rejections: Counter = Counter()
+        markets = HyperLogLog()
+        recent_found: List[Position] = []
+        latencies: Dict[str, List[float]] = {kind: [] for kind in LATENCY_KINDS}
+
+        for copy, stats in zip(self.leaders.values(), per_leader.values()):
+            for key in summed:
+                total[key] += stats[key]
+            rejections.update(stats["rejections"])
+            markets.merge(copy.stats.unique_markets)
+            recent_found.extend(stats["recent_found"])
+            for kind, samples in copy.stats.latencies.items():
+                latencies[kind].extend(samples)
+
+        for key in ("notional_seen", "notional_found", "notional_copied"):
+            total[key] = round(total[key], 2)
+
+        tracked = self.risk.tracked_positions if self.risk else {}
+        return {
+            **total,
+            "mode": "trading" if self.is_trading_enabled() else "monitoring",
+            "leaders": per_leader,
+            "rejections": dict(rejections.most_common()),
+            "markets_tracked": markets.count(),
+            "latency": {kind: latency_percentiles(samples) for kind, samples in latencies.items()},
+            "processed_bets_count": len(self.processed_bets),
+            "tracked_positions_count": len(tracked),
+            "tracked_positions": list(tracked.values()),
+            "found_positions": recent_found,
+            "paper": self.client.summary() if isinstance(self.client, PolyPaper) else None,
+            "clob_pool": clob_pool.snapshot(),
+            "market_meta": market_meta.snapshot(),
+        }
@@ -0,0 +1,157 @@
+import time
+import asyncio
+import traceback
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+# Сколько бюджета остановки оставлять на закрытие соединений (HTTP, бот, БД)
+CLOSE_RESERVE = 5.0
+
+
+class Inflight:
+    """
+    Фоновые задачи, которые нельзя бросить при остановке
+    (ордера выходов, сигналы консенсуса, рассылка уведомлений).
+
+    spawn() вместо голого asyncio.create_task: задача учитывается до завершения,
+    drain() дожидается всех с дедлайном и отменяет оставшиеся.
+    """
+
+    __slots__ = ("name", "tasks", "finished")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.tasks: Set[asyncio.Future] = set()
+        self.finished = 0
+
+    def __len__(self) -> int:
+        return len(self.tasks)
+
+    def spawn(self, coro: Awaitable) -> asyncio.Future:
+        task = asyncio.ensure_future(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self._done)
+        return task
+
+    def _done(self, task: asyncio.Future):
+        self.tasks.discard(task)
+        if not task.cancelled():
+            self.finished += 1
+
+    async def wait(self, timeout: Optional[float] = None) -> int:
+        """
+        Ждет задачи, запущенные до вызова (без отмены).
+
+        Returns:
+            int: сколько не успело завершиться
+        """
+        tasks = list(self.tasks)
+        if not tasks:
+            return 0
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        return len(pending)
+
+    async def drain(self, timeout: float) -> Tuple[int, int]:
+        """
+        Дожидается всех задач, включая порожденные во время ожидания;
+        по дедлайну отменяет оставшиеся.
+
+        Returns:
+            Tuple[int, int]: (завершено, отменено)
+        """
+        deadline = time.monotonic() + timeout
+        finished = self.finished
+        while self.tasks:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            await asyncio.wait(list(self.tasks), timeout=left)
+
+        pending = list(self.tasks)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        return self.finished - finished, len(pending)
+
+
+class Shutdown:
+    """
+    Упорядоченная остановка процесса с общим дедлайном.
+
+    Шаги идут строго по порядку (прием -> очереди -> состояние -> соединения);
+    ошибка или таймаут шага не прерывают следующие. report() печатает,
+    что было дренировано и что прервано.
+    """
+
+    def __init__(self, timeout: float, floor: float = 1.0):
+        """
+        Args:
+            timeout: бюджет на всю остановку в секундах
+            floor: минимум времени шагу с таймаутом, даже если бюджет исчерпан
+                   (закрыть соединения нужно в любом случае)
+        """
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout
+        self.floor = floor
+        self.lines: List[str] = []
+
+    def remaining(self, reserve: float = 0.0) -> float:
+        """Остаток бюджета за вычетом reserve (времени на последующие шаги)."""
+        return max(0.0, self.deadline - time.monotonic() - reserve)
+
+    async def step(
+        self,
+        name: str,
+        func: Callable[..., Awaitable[Any]],
+        *args: Any,
+        timeout: Optional[float] = None,
+        describe: Optional[Callable[[Any], str]] = None,
+    ) -> Any:
+        """
+        Выполняет шаг остановки.
+
+        Args:
+            timeout: таймаут шага (None - шаг сам соблюдает переданный ему дедлайн)
+            describe: результат шага -> строка отчета
+        """
+        started = time.monotonic()
+        result = None
+        try:
+            if timeout is None:
+                result = await func(*args)
+            else:
+                result = await asyncio.wait_for(func(*args), max(self.floor, min(timeout, self.remaining())))
+            status = "✅"
+            detail = describe(result) if describe is not None and result is not None else "ok"
+        except asyncio.TimeoutError:
+            status, detail = "⚠️", "таймаут"
+        except Exception as e:
+            status, detail = "❌", str(e)
+            traceback.print_exc()
+        self.lines.append(f"   {status} {name}: {detail} ({time.monotonic() - started:.1f}s)")
+        return result
+
+    async def drain(self, inflight: Inflight, reserve: float = 0.0) -> Tuple[int, int]:
+        """Шаг дренажа очереди задач в пределах остатка бюджета."""
+        result = await self.step(
+            inflight.name,
+            inflight.drain,
+            self.remaining(reserve),
+            describe=lambda counts: f"завершено {counts[0]}, прервано {counts[1]}",
+        )
+        return result or (0, 0)
+
+    async def monitors(self, shutdown_func: Callable[[float], Awaitable[Dict]]) -> Dict:
+        """Шаг дренажа мониторов (MonitorSupervisor/EnginePool.shutdown) с резервом на закрытие соединений."""
+        result = await self.step(
+            "мониторы",
+            shutdown_func,
+            self.remaining(CLOSE_RESERVE),
+            describe=lambda counts: ", ".join(f"{key}={value}" for key, value in counts.items()),
+        )
+        return result or {}
+
+    def report(self, title: str):
+        print(f"🧹 {title} за {time.monotonic() - self.started:.1f}s")
+        for line in self.lines:
+            print(line)
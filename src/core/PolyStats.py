@@ -0,0 +1,220 @@
+import time
+import inspect
+import traceback
+from collections import Counter, OrderedDict, deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional
+
+from utils.sketches import HyperLogLog
+from utils.decorator import retry_metrics
+from utils.deadline import timeout_metrics
+from src.models.position import Position
+
+# Снимок статистики -> None (sync или async)
+Exporter = Callable[[Dict], object]
+
+# Задержки: signal - от сделки лидера до решения по ставке, order - до отправки нашего ордера
+LATENCY_KINDS = ("signal", "order")
+
+
+def latency_percentiles(samples: Iterable[float]) -> Optional[Dict[str, float]]:
+    """p50/p90/p99/max по выборке задержек в секундах (None, если выборка пуста)."""
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+
+    def rank(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2)
+
+    return {
+        "count": len(ordered),
+        "p50": rank(0.5),
+        "p90": rank(0.9),
+        "p99": rank(0.99),
+        "max": round(ordered[-1], 2),
+    }
+
+
+class PolyStats:
+    """
+    Статистика монитора с ограниченной памятью.
+
+    - Последние найденные ставки и сделки хранятся в кольцевых буферах
+    - Счетчики и объемы считаются на лету
+    - Причины отказа фильтров агрегируются в Counter
+    - Счетчики по рынкам ограничены max_markets (вытесняются давно не встречавшиеся),
+      число уникальных рынков оценивается HyperLogLog
+    - Задержки от сделки лидера до нашего ордера хранятся в кольцевых буферах
+      latency_size, в снимок попадают перцентили
+    - exporters получают снимок при вызове export()
+    - Буферы создаются при первой записи: у тихого монитора их нет
+    """
+
+    __slots__ = (
+        "max_markets", "exporters", "recent_size", "latency_size",
+        "recent_found", "recent_trades", "latencies",
+        "started_at", "bets_seen", "found", "rejected", "trades_ok", "trades_failed",
+        "exits_ok", "exits_failed", "notional_seen", "notional_found", "notional_copied",
+        "rejections", "markets", "markets_evicted", "unique_markets",
+    )
+
+    def __init__(
+        self,
+        recent_size: int = 50,
+        max_markets: int = 500,
+        exporters: Optional[List[Exporter]] = None,
+        latency_size: int = 1000,
+    ):
+        self.max_markets = max_markets
+        self.exporters: List[Exporter] = list(exporters or [])
+
+        self.recent_size = recent_size
+        self.latency_size = latency_size
+
+        self.reset()
+
+    def reset(self):
+        self.started_at = time.time()
+        self.bets_seen = 0
+        self.found = 0
+        self.rejected = 0
+        self.trades_ok = 0
+        self.trades_failed = 0
+        self.exits_ok = 0
+        self.exits_failed = 0
+        self.notional_seen = 0.0
+        self.notional_found = 0.0
+        self.notional_copied = 0.0
+
+        self.rejections: Counter = Counter()
+        self.markets: "OrderedDict[str, Dict[str, float]]" = OrderedDict()
+        self.markets_evicted = 0
+        self.unique_markets = HyperLogLog()
+
+        self.recent_found: Optional[Deque[Position]] = None
+        self.recent_trades: Optional[Deque[Dict]] = None
+        self.latencies: Dict[str, Deque[float]] = {}
+
+    def _recent_trades(self) -> Deque[Dict]:
+        if self.recent_trades is None:
+            self.recent_trades = deque(maxlen=self.recent_size)
+        return self.recent_trades
+
+    def _market(self, bet: Position) -> Dict[str, float]:
+        key = bet.title
+        market = self.markets.get(key)
+        if market is None:
+            self.unique_markets.add(key)
+            if len(self.markets) >= self.max_markets:
+                self.markets.popitem(last=False)
+                self.markets_evicted += 1
+            market = self.markets[key] = {"seen": 0, "found": 0, "copied": 0, "notional": 0.0}
+        else:
+            self.markets.move_to_end(key)
+        return market
+
+    def record_bet(self, bet: Position):
+        """Новая (не обработанная ранее) ставка лидера."""
+        self.bets_seen += 1
+        self.notional_seen += float(bet.usdcSize or 0)
+        market = self._market(bet)
+        market["seen"] += 1
+        market["notional"] += float(bet.usdcSize or 0)
+
+    def record_rejection(self, reason: str):
+        self.rejected += 1
+        # "ошибка: <текст>" сворачиваем в одну причину, чтобы Counter не рос
+        self.rejections[reason.split(":", 1)[0]] += 1
+
+    def record_latency(self, kind: str, seconds: float):
+        """Задержка от сделки лидера (kind: signal / order)."""
+        samples = self.latencies.get(kind)
+        if samples is None:
+            samples = self.latencies[kind] = deque(maxlen=self.latency_size)
+        samples.append(max(0.0, seconds))
+
+    def record_found(self, bet: Position):
+        self.found += 1
+        self.notional_found += float(bet.usdcSize or 0)
+        if self.recent_found is None:
+            self.recent_found = deque(maxlen=self.recent_size)
+        self.recent_found.append(bet)
+        self._market(bet)["found"] += 1
+
+    def record_trade(self, bet: Position, success: bool, amount: float, message: str = ""):
+        if success:
+            self.trades_ok += 1
+            self.notional_copied += float(amount or 0)
+            self._market(bet)["copied"] += 1
+        else:
+            self.trades_failed += 1
+
+        self._recent_trades().append({
+            "title": bet.title,
+            "outcome": bet.outcome,
+            "token_id": str(bet.token_id),
+            "amount": amount,
+            "success": success,
+            "message": message,
+            "at": time.time(),
+        })
+
+    def record_exit(self, bet: Position, success: bool, size: float, message: str = ""):
+        """Зеркалирование выхода лидера (SELL / REDEEM)."""
+        if success:
+            self.exits_ok += 1
+        else:
+            self.exits_failed += 1
+
+        self._recent_trades().append({
+            "title": bet.title,
+            "outcome": bet.outcome,
+            "token_id": str(bet.token_id),
+            "side": bet.side,
+            "size": size,
+            "success": success,
+            "message": message,
+            "at": time.time(),
+        })
+
+    def top_markets(self, limit: int = 5, by: str = "found") -> List[Dict]:
+        ranked = sorted(self.markets.items(), key=lambda item: item[1][by], reverse=True)
+        return [dict(stats, title=title) for title, stats in ranked[:limit]]
+
+    def snapshot(self) -> Dict:
+        return {
+            "uptime": time.time() - self.started_at,
+            "bets_seen": self.bets_seen,
+            "total_found": self.found,
+            "rejected": self.rejected,
+            "trades_ok": self.trades_ok,
+            "trades_failed": self.trades_failed,
+            "exits_ok": self.exits_ok,
+            "exits_failed": self.exits_failed,
+            "notional_seen": round(self.notional_seen, 2),
+            "notional_found": round(self.notional_found, 2),
+            "notional_copied": round(self.notional_copied, 2),
+            "rejections": dict(self.rejections.most_common()),
+            "markets_seen": max(len(self.markets), self.unique_markets.count()),
+            "http_retries": retry_metrics.snapshot(),
+            "timeouts": timeout_metrics.snapshot(),
+            "latency": {kind: latency_percentiles(self.latencies.get(kind, ())) for kind in LATENCY_KINDS},
+            "top_markets": self.top_markets(),
+            "recent_found": list(self.recent_found or ()),
+            "recent_trades": list(self.recent_trades or ()),
+        }
+
+    def add_exporter(self, exporter: Exporter):
+        self.exporters.append(exporter)
+
+    async def export(self) -> Dict:
+        """Отправляет снимок во все exporters (ошибки одного не мешают остальным)."""
+        snapshot = self.snapshot()
+        for exporter in self.exporters:
+            try:
+                result = exporter(snapshot)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                print(f"⚠️ Ошибка экспорта статистики: {e}")
+                traceback.print_exc()
+        return snapshot
@@ -0,0 +1,281 @@
+import time
+import asyncio
+import traceback
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from utils.deadline import detached
+
+# (tg_id, definition) -> корутина-функция запуска монитора (например, PolyEngine.EngineMonitor)
+MonitorFactory = Callable[[int, Dict], Awaitable[Callable[[], Awaitable[Any]]]]
+
+
+class MonitorLimitError(Exception):
+    """Превышен глобальный или пользовательский лимит мониторов."""
+
+
+def check_limits(
+    owners: Dict[str, int],
+    tg_id: int,
+    max_monitors: int,
+    max_per_user: int,
+    shutting_down: bool = False,
+):
+    """
+    Проверка лимитов по реестру monitor_id -> tg_id.
+
+    Raises:
+        MonitorLimitError: превышен лимит
+    """
+    if shutting_down:
+        raise MonitorLimitError("бот перезапускается, попробуйте через минуту")
+    if len(owners) >= max_monitors:
+        raise MonitorLimitError(f"достигнут общий лимит мониторов ({max_monitors})")
+    if sum(1 for owner in owners.values() if owner == tg_id) >= max_per_user:
+        raise MonitorLimitError(f"достигнут лимит мониторов на пользователя ({max_per_user})")
+
+
+class MonitorSupervisor:
+    """
+    Супервизор мониторов.
+
+    - Определение монитора (кошельки, Settings, маржа, срок) сохраняется в БД
+      при запуске и удаляется при штатном завершении или остановке пользователем
+    - restore() при старте поднимает все неистекшие мониторы параллельно
+    - Упавший монитор перезапускается с экспоненциальной паузой
+      (состояние подхватывается из чекпоинта)
+    - Глобальный и пользовательский лимиты одновременно работающих мониторов
+    - shutdown() сначала дренирует мониторы (начатые ордера и уведомления
+      дорабатывают до дедлайна), затем отменяет задачи, не удаляя определения
+    """
+
+    def __init__(
+        self,
+        max_monitors: int = 500,
+        max_per_user: int = 1,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        max_restarts: int = 10,
+    ):
+        """
+        Args:
+            max_monitors: лимит мониторов на процесс
+            max_per_user: лимит мониторов на пользователя
+            backoff: пауза перед первым перезапуском в секундах (дальше x2)
+            max_backoff: потолок паузы
+            max_restarts: после стольких падений подряд монитор снимается
+        """
+        self.max_monitors = max_monitors
+        self.max_per_user = max_per_user
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_restarts = max_restarts
+
+        self.repo = None
+        self.factory: Optional[MonitorFactory] = None
+
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.owners: Dict[str, int] = {}
+        self.monitors: Dict[str, Callable] = {}
+        self.shutting_down = False
+
+        # Вызывается с monitor_id, когда монитор окончательно снят (не при shutdown)
+        self.on_exit: Optional[Callable[[str], None]] = None
+
+    def setup(self, repo, factory: MonitorFactory):
+        self.repo = repo
+        self.factory = factory
+
+    def get(self, monitor_id: str) -> Optional[asyncio.Task]:
+        return self.tasks.get(monitor_id)
+
+    def is_running(self, monitor_id: str) -> bool:
+        task = self.tasks.get(monitor_id)
+        return task is not None and not task.done()
+
+    def user_monitors(self, tg_id: int) -> List[str]:
+        return [monitor_id for monitor_id, owner in self.owners.items() if owner == tg_id]
+
+    def check_limits(self, tg_id: int):
+        check_limits(self.owners, tg_id, self.max_monitors, self.max_per_user, self.shutting_down)
+
+    async def status(self, monitor_id: str) -> Optional[Dict]:
+        """
+        Состояние монитора для фронтенда.
+
+        Returns:
+            Optional[Dict]: {"running": bool, "stats": Optional[Dict]}, None - монитора нет
+        """
+        if monitor_id not in self.tasks:
+            return None
+        monitor = self.monitors.get(monitor_id)
+        status = getattr(monitor, "status", None)
+        return {"running": self.is_running(monitor_id), "stats": status() if status else None}
+
+    async def start(
+        self,
+        monitor_id: str,
+        tg_id: int,
+        definition: Dict,
+        expires_at: float,
+        persist: bool = True,
+        resumed: bool = False,
+    ) -> asyncio.Task:
+        """
+        Запускает монитор под надзором.
+
+        Args:
+            persist: сохранить определение в БД (при восстановлении оно уже там)
+            resumed: монитор поднят из БД после рестарта бота (первый запуск
+                     получает definition["resumed"], перезапуски после падения - нет)
+
+        Raises:
+            MonitorLimitError: превышен лимит
+        """
+        if self.is_running(monitor_id):
+            raise MonitorLimitError("монитор уже запущен")
+        self.check_limits(tg_id)
+
+        if persist:
+            await self.repo.save_monitor(monitor_id, tg_id, definition, expires_at)
+
+        # Монитор живет дольше апдейта, который его запустил: без его дедлайна
+        task = detached(
+            self._supervise(monitor_id, tg_id, definition, expires_at, resumed),
+            name=monitor_id,
+        )
+        self.tasks[monitor_id] = task
+        self.owners[monitor_id] = tg_id
+        return task
+
+    async def _supervise(self, monitor_id: str, tg_id: int, definition: Dict, expires_at: float, resumed: bool = False):
+        restarts = 0
+        try:
+            while True:
+                started = time.time()
+                try:
+                    run_definition = dict(definition, resumed=True) if resumed else definition
+                    resumed = False
+                    run = self.monitors[monitor_id] = await self.factory(tg_id, run_definition)
+                    await run()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"❌ Монитор {monitor_id} упал: {e}")
+                    traceback.print_exc()
+
+                    # Долго проработавший монитор начинает отсчет падений заново
+                    restarts = 1 if time.time() - started > self.max_backoff else restarts + 1
+                    delay = min(self.max_backoff, self.backoff * 2 ** (restarts - 1))
+                    if restarts > self.max_restarts or time.time() + delay >= expires_at:
+                        print(f"🛑 Монитор {monitor_id} снят после {restarts} падений")
+                        break
+
+                    print(f"🔁 Перезапуск {monitor_id} через {delay:.0f}s")
+                    await asyncio.sleep(delay)
+                    continue
+
+                # Отмена, проглоченная внутри монитора, все равно отмена
+                if asyncio.current_task().cancelling():
+                    raise asyncio.CancelledError()
+                break
+
+            # Штатное завершение (или монитор снят): восстанавливать нечего
+            await self.forget(monitor_id)
+        finally:
+            if self.tasks.get(monitor_id) is asyncio.current_task():
+                del self.tasks[monitor_id]
+                self.owners.pop(monitor_id, None)
+                self.monitors.pop(monitor_id, None)
+                if self.on_exit is not None and not self.shutting_down:
+                    self.on_exit(monitor_id)
+
+    async def forget(self, monitor_id: str):
+        """
+        Удаляет определение и чекпоинт монитора: следующий монитор пользователя
+        не должен поднять старые ключи дедупликации, копии и SL/TP.
+        """
+        await self.repo.delete_monitor(monitor_id)
+        await self.repo.delete_checkpoint(monitor_id)
+
+    async def stop(self, monitor_id: str) -> bool:
+        """Остановка пользователем: отмена задачи, удаление определения и чекпоинта."""
+        task = self.tasks.get(monitor_id)
+        await self.repo.delete_monitor(monitor_id)
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        # После остановки задачи: при отмене чекпоинтер дописывает остаток дельт
+        await self.repo.delete_checkpoint(monitor_id)
+        return task is not None
+
+    async def restore(self, accept: Optional[Callable[[Dict], bool]] = None, resumed: bool = True) -> List[str]:
+        """
+        Поднимает неистекшие мониторы из БД параллельно.
+
+        Args:
+            accept: фильтр строк (воркер берет только свой шард)
+            resumed: подъем после рестарта бота - пользователю уходит уведомление
+                     (False - перезапуск упавшего воркера при живом боте)
+        Returns:
+            List[str]: monitor_id поднятых мониторов
+        """
+        now = time.time()
+        monitors = await self.repo.get_active_monitors(now)
+        if accept is not None:
+            monitors = [row for row in monitors if accept(row)]
+
+        async def start(row: Dict):
+            try:
+                await self.start(
+                    row["monitor_id"], row["tg_id"], row["definition"], row["expires_at"],
+                    persist=False, resumed=resumed,
+                )
+                return True
+            except MonitorLimitError as e:
+                print(f"⚠️ Монитор {row['monitor_id']} не восстановлен: {e}")
+                return False
+
+        results = await asyncio.gather(*(start(row) for row in monitors))
+        restored = [row["monitor_id"] for row, ok in zip(monitors, results) if ok]
+        if monitors:
+            print(f"♻️ Восстановлено мониторов: {len(restored)} из {len(monitors)}")
+        return restored
+
+    async def shutdown(self, timeout: float = 20.0) -> Dict:
+        """
+        Структурированная остановка (определения остаются в БД).
+
+        1. Новые запуски отклоняются (shutting_down)
+        2. drain() мониторов: опрос больше не планируется, начатые тики
+           дорабатывают не дольше timeout, оставшиеся прерываются
+        3. Задачи отменяются и дожидаются; чекпоинты дописываются в их finally
+
+        Returns:
+            Dict: {"monitors": всего, "drained": дренировано, "interrupted": прервано по дедлайну}
+        """
+        self.shutting_down = True
+        tasks = list(self.tasks.values())
+
+        drains = [
+            asyncio.ensure_future(monitor.drain())
+            for monitor in self.monitors.values()
+            if getattr(monitor, "drain", None) is not None
+        ]
+        drained = interrupted = 0
+        if drains:
+            done, pending = await asyncio.wait(drains, timeout=timeout)
+            drained = sum(1 for task in done if task.exception() is None)
+            interrupted = len(drains) - drained
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        print(f"✅ Остановлено мониторов: {len(tasks)} (дренировано {drained}, прервано {interrupted})")
+        return {"monitors": len(tasks), "drained": drained, "interrupted": interrupted}
@@ -0,0 +1,313 @@
+import time
+import asyncio
+import aiohttp
+import traceback
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional, Set
+
+from utils.customprint import CustomPrint
+from utils.sketches import HyperLogLog
+from src.models.datacreator import DataCreator
+from src.core.PolyShutdown import Inflight
+from utils.deadline import TimeoutScope, client_timeout, deadline, detached
+
+DATA_API_URL = "https://data-api.polymarket.com"
+
+# async (subscriber_id, alert) -> None
+AlertCallback = Callable[[int, Dict], object]
+
+
+class MarketStats:
+    """Бегущая статистика рынка в постоянной памяти."""
+
+    __slots__ = (
+        "title", "slug", "volume", "buy_volume", "trades",
+        "large_trades", "last_price", "last_trade_at", "wallets",
+    )
+
+    def __init__(self, title: str = "", slug: str = "", precision: int = 8):
+        self.title = title
+        self.slug = slug
+        self.volume = 0.0
+        self.buy_volume = 0.0
+        self.trades = 0
+        self.large_trades = 0
+        self.last_price = 0.0
+        self.last_trade_at = 0
+        self.wallets = HyperLogLog(precision)
+
+    def to_dict(self) -> Dict:
+        return {
+            "title": self.title,
+            "slug": self.slug,
+            "volume": round(self.volume, 2),
+            "buy_volume": round(self.buy_volume, 2),
+            "trades": self.trades,
+            "large_trades": self.large_trades,
+            "unique_wallets": self.wallets.count(),
+            "last_price": self.last_price,
+            "last_trade_at": self.last_trade_at,
+        }
+
+
+class WhaleSubscription:
+    __slots__ = ("subscriber_id", "markets", "threshold", "callback")
+
+    def __init__(self, subscriber_id: int, markets: Optional[Set[str]], threshold: float, callback: AlertCallback):
+        """
+        Args:
+            markets: conditionId или slug рынков; None - все рынки
+            threshold: минимальный объем сделки в USDC
+        """
+        self.subscriber_id = subscriber_id
+        self.markets = {m.lower() for m in markets} if markets else None
+        self.threshold = threshold
+        self.callback = callback
+
+
+class WhaleFeed:
+    """
+    Общая лента сделок всего рынка (data-api /trades) с алертами о крупных сделках.
+
+    - Один процесс опрашивает ленту целиком, сколько бы ни было подписчиков
+    - Статистика по рынкам (объем, уникальные кошельки через HyperLogLog,
+      число крупных сделок) с LRU-ограничением числа рынков
+    - Повторы ленты отсекаются по водяной отметке времени и ограниченному
+      множеству последних ключей сделок
+    """
+
+    def __init__(
+        self,
+        interval: float = 1,
+        page_size: int = 500,
+        max_pages: int = 4,
+        large_trade: float = 1000,
+        max_markets: int = 5000,
+        seen_size: int = 20000,
+    ):
+        """
+        Args:
+            interval: пауза между опросами ленты в секундах
+            page_size: размер страницы /trades
+            max_pages: сколько страниц догружать за опрос при всплеске
+            large_trade: порог "крупной сделки" для статистики рынка
+            max_markets: сколько рынков держать в статистике
+            seen_size: сколько последних ключей сделок помнить для дедупликации
+        """
+        self.interval = interval
+        # Лимит одного запроса ленты и бюджет итерации цикла (запросы и рассылка алертов)
+        self.timeout = 5.0
+        self.budget = 10.0
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.large_trade = large_trade
+        self.max_markets = max_markets
+
+        self.datacreator = DataCreator()
+        self.markets: "OrderedDict[str, MarketStats]" = OrderedDict()
+        self.subscriptions: Dict[int, WhaleSubscription] = {}
+        self.by_market: Dict[str, Set[int]] = {}
+        self.global_subs: Set[int] = set()
+
+        self.seen: Set[str] = set()
+        self.seen_order: Deque[str] = deque()
+        self.seen_size = seen_size
+        self.watermark = 0
+
+        self.trades_ingested = 0
+        self.alerts_sent = 0
+        self._task: Optional[asyncio.Task] = None
+        # Алерты в процессе отправки дожидаются при остановке бота
+        self.inflight = Inflight("алерты китов")
+
+    # ---------- подписки ----------
+
+    def subscribe(
+        self,
+        subscriber_id: int,
+        callback: AlertCallback,
+        threshold: float = 10000,
+        markets: Optional[Set[str]] = None,
+    ):
+        self.unsubscribe(subscriber_id)
+        sub = WhaleSubscription(subscriber_id, markets, threshold, callback)
+        self.subscriptions[subscriber_id] = sub
+        if sub.markets is None:
+            self.global_subs.add(subscriber_id)
+        else:
+            for market in sub.markets:
+                self.by_market.setdefault(market, set()).add(subscriber_id)
+
+    def unsubscribe(self, subscriber_id: int):
+        sub = self.subscriptions.pop(subscriber_id, None)
+        if sub is None:
+            return
+        self.global_subs.discard(subscriber_id)
+        for market in sub.markets or ():
+            subscribers = self.by_market.get(market)
+            if subscribers is not None:
+                subscribers.discard(subscriber_id)
+                if not subscribers:
+                    del self.by_market[market]
+
+    # ---------- обработка ленты ----------
+
+    def _remember(self, key: str) -> bool:
+        """True, если сделка новая."""
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        self.seen_order.append(key)
+        if len(self.seen_order) > self.seen_size:
+            self.seen.discard(self.seen_order.popleft())
+        return True
+
+    def _market(self, trade: Dict) -> MarketStats:
+        key = trade.get("conditionId") or ""
+        stats = self.markets.get(key)
+        if stats is None:
+            if len(self.markets) >= self.max_markets:
+                self.markets.popitem(last=False)
+            stats = self.markets[key] = MarketStats(trade.get("title") or "", trade.get("slug") or "")
+        else:
+            self.markets.move_to_end(key)
+        return stats
+
+    def ingest(self, trades: List[Dict]) -> List[Dict]:
+        """
+        Обрабатывает пачку сырых сделок ленты (новые сначала, как отдает API).
+
+        Returns:
+            List[Dict]: алерты {subscriber_id, trade, notional, market}
+        """
+        alerts = []
+        watermark = self.watermark
+        newest = watermark
+
+        for trade in reversed(trades):
+            ts = int(trade.get("timestamp") or 0)
+            if ts < watermark - 60:
+                continue
+
+            key = f"{trade.get('transactionHash')}_{trade.get('asset')}_{trade.get('proxyWallet')}_{trade.get('size')}"
+            if not self._remember(key):
+                continue
+
+            if ts > newest:
+                newest = ts
+            self.trades_ingested += 1
+
+            price = float(trade.get("price") or 0)
+            notional = float(trade.get("size") or 0) * price
+
+            stats = self._market(trade)
+            stats.volume += notional
+            if trade.get("side") == "BUY":
+                stats.buy_volume += notional
+            stats.trades += 1
+            stats.last_price = price
+            stats.last_trade_at = ts
+            stats.wallets.add(trade.get("proxyWallet"))
+            if notional >= self.large_trade:
+                stats.large_trades += 1
+
+            subscribers = self._subscribers_for(trade)
+            if not subscribers:
+                continue
+            for subscriber_id in subscribers:
+                sub = self.subscriptions[subscriber_id]
+                if notional >= sub.threshold:
+                    alerts.append({
+                        "subscriber_id": subscriber_id,
+                        "trade": trade,
+                        "notional": notional,
+                        "market": stats,
+                    })
+
+        self.watermark = newest
+        return alerts
+
+    def _subscribers_for(self, trade: Dict) -> Set[int]:
+        if not self.by_market:
+            return self.global_subs
+        subscribers = set(self.global_subs)
+        for key in (trade.get("conditionId"), trade.get("slug"), trade.get("eventSlug")):
+            if key:
+                subscribers.update(self.by_market.get(key.lower(), ()))
+        return subscribers
+
+    def top_markets(self, limit: int = 10, by: str = "volume") -> List[Dict]:
+        ranked = sorted(self.markets.values(), key=lambda m: getattr(m, by), reverse=True)
+        return [m.to_dict() for m in ranked[:limit]]
+
+    # ---------- сеть ----------
+
+    async def fetch(self, session: aiohttp.ClientSession) -> List[Dict]:
+        """Загружает новые сделки ленты; при всплеске догружает страницы до водяной отметки."""
+        trades: List[Dict] = []
+        for page in range(self.max_pages):
+            params, headers = self.datacreator.create_trades_request_data(
+                limit=str(self.page_size),
+                offset=str(page * self.page_size),
+            )
+            async with TimeoutScope("data-api"), session.get(
+                f"{DATA_API_URL}/trades", params=params, headers=headers, timeout=client_timeout("data-api", self.timeout)
+            ) as response:
+                if response.status != 200:
+                    CustomPrint().error(f"⚠️ /trades: {response.status}")
+                    break
+                data = await response.json()
+
+            if not data:
+                break
+            trades.extend(data)
+            oldest = int(data[-1].get("timestamp") or 0)
+            if len(data) < self.page_size or oldest <= self.watermark:
+                break
+        return trades
+
+    async def _dispatch(self, alert: Dict):
+        sub = self.subscriptions.get(alert["subscriber_id"])
+        if sub is None:
+            return
+        try:
+            result = sub.callback(alert["subscriber_id"], alert)
+            if asyncio.iscoroutine(result):
+                await result
+            self.alerts_sent += 1
+        except Exception as e:
+            print(f"⚠️ Ошибка отправки алерта: {e}")
+
+    async def run(self):
+        """Цикл опроса ленты; завершается, когда не осталось подписчиков."""
+        async with aiohttp.ClientSession() as session:
+            while self.subscriptions:
+                try:
+                    # Бюджет на опрос и рассылку алертов этой итерации
+                    with deadline(self.budget, root=True):
+                        trades = await self.fetch(session)
+                        for alert in self.ingest(trades):
+                            self.inflight.spawn(self._dispatch(alert))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"⚠️ Ошибка ленты сделок: {e}")
+                    traceback.print_exc()
+                await asyncio.sleep(self.interval)
+
+    def ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = detached(self.run())
+
+    async def stop(self):
+        """Останавливает опрос ленты (подписки остаются; уже собранные алерты дорабатывают в inflight)."""
+        if self._task is None or self._task.done():
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+whales = WhaleFeed()
@@ -0,0 +1,311 @@
+import time
+import random
+import asyncio
+import inspect
+import traceback
+from typing import Any, Callable, List, Optional, Set
+
+from utils.deadline import detached
+
+
+def _start(awaitable) -> asyncio.Future:
+    """
+    Запуск корутины таймера прямо в пачке драйвера (eager): до первой
+    приостановки она выполняется синхронно, и тик без ожиданий (пустой опрос)
+    завершается без отдельного шага и колбэков в цикле событий.
+    """
+    if inspect.iscoroutine(awaitable):
+        return asyncio.Task(awaitable, loop=asyncio.get_running_loop(), eager_start=True)
+    return asyncio.ensure_future(awaitable)
+
+
+class Timer:
+    """Таймер колеса: отмена за O(1) (удаление из множества слота)."""
+
+    __slots__ = ("wheel", "expires", "callback", "args", "slot", "cancelled")
+
+    def __init__(self, wheel: "TimingWheel", expires: int, callback: Callable, args: tuple):
+        self.wheel = wheel
+        self.expires = expires
+        self.callback = callback
+        self.args = args
+        self.slot: Optional[Set["Timer"]] = None
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+        if self.slot is not None:
+            self.slot.discard(self)
+            self.slot = None
+            self.wheel.count -= 1
+
+
+class Periodic:
+    """
+    Периодическая задача на колесе.
+
+    Следующий запуск планируется через interval после завершения текущего
+    (как sleep в конце цикла), поэтому запуски одной задачи не перекрываются.
+    Задача может вернуть число - паузу до следующего запуска (например, после ошибки).
+    Таймер один на все запуски и переставляется, а не создается заново.
+    """
+
+    __slots__ = ("wheel", "interval", "func", "args", "timer", "task", "stopped")
+
+    def __init__(self, wheel: "TimingWheel", interval: float, func: Callable, args: tuple):
+        self.wheel = wheel
+        self.interval = interval
+        self.func = func
+        self.args = args
+        self.timer = Timer(wheel, 0, self._fire, ())
+        self.task: Optional[asyncio.Future] = None
+        self.stopped = False
+
+    def _schedule(self, delay: float):
+        if not self.stopped:
+            self.wheel.reschedule(self.timer, delay)
+
+    def _fire(self):
+        try:
+            result = self.func(*self.args)
+        except Exception as e:
+            self._failed(e)
+            self._schedule(self.interval)
+            return
+
+        if inspect.isawaitable(result):
+            task = _start(result)
+            if task.done():
+                # Завершилась в пачке: перестановка таймера сразу, без done-колбэка
+                self._done(task)
+            else:
+                self.task = task
+                task.add_done_callback(self._done)
+        else:
+            self._schedule(self._delay(result))
+
+    def _delay(self, result) -> float:
+        if isinstance(result, (int, float)) and not isinstance(result, bool):
+            return result
+        return self.interval
+
+    def _failed(self, error: BaseException):
+        print(f"⚠️ Ошибка периодической задачи {getattr(self.func, '__qualname__', self.func)}: {error}")
+        traceback.print_exception(error)
+
+    def _done(self, task: asyncio.Future):
+        self.task = None
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            self._failed(error)
+            self._schedule(self.interval)
+        else:
+            self._schedule(self._delay(task.result()))
+
+    async def stop(self, cancel_running: bool = True):
+        """
+        Отмена с ожиданием текущего запуска.
+
+        Args:
+            cancel_running: прервать текущий запуск (False - дать ему доработать)
+        """
+        task = self.task
+        self.stopped = True
+        self.timer.cancel()
+        if task is not None and cancel_running:
+            task.cancel()
+        if task is not None:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            except Exception:
+                pass
+
+
+class TimingWheel:
+    """
+    Иерархическое колесо таймеров на все мониторы процесса.
+
+    - levels уровней по slots слотов: уровень k покрывает slots**(k+1) тиков,
+      таймер дальше горизонта кладется в последний уровень и перепроверяется
+    - Вставка и отмена за O(1), при переходе через границу уровня слот
+      спускается на уровень ниже (cascade)
+    - Одна задача-драйвер просыпается раз в tick и проходит все созревшие
+      таймеры пачкой; корутины стартуют в самой пачке (eager), и тик, которому
+      нечего ждать, не стоит ни задачи в очереди, ни таймера цикла событий.
+      Без таймеров драйвер спит на событии
+    """
+
+    def __init__(self, tick: float = 0.05, slots: int = 64, levels: int = 4):
+        """
+        Args:
+            tick: разрешение колеса в секундах
+            slots: слотов на уровень (степень двойки)
+            levels: число уровней (горизонт tick * slots**levels)
+        """
+        assert slots & (slots - 1) == 0, "slots должно быть степенью двойки"
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.bits = slots.bit_length() - 1
+        self.mask = slots - 1
+
+        self.wheels: List[List[Set[Timer]]] = [[set() for _ in range(slots)] for _ in range(levels)]
+        self.current = 0
+        self.origin = time.monotonic()
+        self.count = 0
+
+        self.fired = 0
+        self.wakeups = 0
+
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    # ------------------------------------------------------------ вставка
+
+    def _place(self, timer: Timer):
+        diff = timer.expires - self.current
+        for level in range(self.levels):
+            if diff < 1 << (self.bits * (level + 1)) or level == self.levels - 1:
+                index = (timer.expires >> (self.bits * level)) & self.mask
+                slot = self.wheels[level][index]
+                slot.add(timer)
+                timer.slot = slot
+                return
+
+    def call_later(self, delay: float, callback: Callable, *args: Any) -> Timer:
+        """
+        Планирует callback(*args) через delay секунд (с точностью до tick).
+        Корутины запускаются отдельными задачами.
+        """
+        timer = Timer(self, 0, callback, args)
+        self.reschedule(timer, delay)
+        return timer
+
+    def reschedule(self, timer: Timer, delay: float):
+        """Переставляет таймер на delay секунд от текущего момента (O(1))."""
+        self._ensure_running()
+        if timer.slot is not None:
+            timer.cancel()
+        if not self.count:
+            # Пустое колесо могло простаивать: время отсчитывается заново
+            self.origin = time.monotonic() - self.current * self.tick
+        ticks = int((time.monotonic() - self.origin + max(0.0, delay)) / self.tick + 0.999999)
+        timer.expires = max(ticks, self.current + 1)
+        timer.cancelled = False
+        self._place(timer)
+        self.count += 1
+        if not self._wakeup.is_set():
+            self._wakeup.set()
+
+    def every(self, interval: float, func: Callable, *args: Any, jitter: bool = False) -> Periodic:
+        """
+        Периодический запуск func(*args) с паузой interval между запусками.
+
+        Args:
+            jitter: первый запуск в случайный момент интервала, чтобы
+                    опросы тысяч мониторов не совпадали по тикам
+        """
+        job = Periodic(self, interval, func, args)
+        job._schedule(random.uniform(0, interval) if jitter else 0)
+        return job
+
+    def sleep(self, delay: float) -> asyncio.Future:
+        """Future, который завершится через delay (ожидание без своего таймера в цикле событий)."""
+        future = asyncio.get_running_loop().create_future()
+
+        def wake():
+            if not future.done():
+                future.set_result(None)
+
+        timer = self.call_later(delay, wake)
+        future.add_done_callback(lambda _: timer.cancel())
+        return future
+
+    # ------------------------------------------------------------ драйвер
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._task is not None and self._task.get_loop() is not loop:
+            # Новый цикл событий (например, новый asyncio.run): старые таймеры недействительны
+            self.wheels = [[set() for _ in range(self.slots)] for _ in range(self.levels)]
+            self.count = 0
+            self._task = None
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            # Таймеры запускаются без дедлайна того, кто первым завел колесо
+            self._task = detached(self._drive())
+
+    def pending(self) -> int:
+        return self.count
+
+    def _cascade(self, level: int):
+        index = (self.current >> (self.bits * level)) & self.mask
+        slot = self.wheels[level][index]
+        if not slot:
+            return
+        timers = list(slot)
+        slot.clear()
+        for timer in timers:
+            self._place(timer)
+
+    def _advance(self) -> List[Timer]:
+        """Сдвиг на один тик: спуск старших уровней и созревшие таймеры."""
+        self.current += 1
+        for level in range(self.levels - 1, 0, -1):
+            if self.current & ((1 << (self.bits * level)) - 1) == 0:
+                self._cascade(level)
+
+        slot = self.wheels[0][self.current & self.mask]
+        if not slot:
+            return []
+        due = [timer for timer in slot if timer.expires <= self.current]
+        for timer in due:
+            slot.discard(timer)
+            timer.slot = None
+        self.count -= len(due)
+        return due
+
+    def _fire(self, timer: Timer):
+        if timer.cancelled:
+            return
+        self.fired += 1
+        try:
+            result = timer.callback(*timer.args)
+            if inspect.isawaitable(result):
+                task = _start(result)
+                if not task.done():
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+        except Exception as e:
+            print(f"⚠️ Ошибка таймера: {e}")
+            traceback.print_exc()
+
+    async def _drive(self):
+        while True:
+            if not self.count:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            target = self.origin + (self.current + 1) * self.tick
+            delay = target - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.wakeups += 1
+
+            # Догоняем все прошедшие тики (после долгого callback или паузы цикла)
+            now_tick = int((time.monotonic() - self.origin) / self.tick)
+            due: List[Timer] = []
+            while self.current < now_tick:
+                due += self._advance()
+            for timer in due:
+                self._fire(timer)
+
+
+# Одно колесо на процесс (бот или воркер движка)
+wheel = TimingWheel()
@@ -0,0 +1,385 @@
+import time
+import zlib
+import asyncio
+import itertools
+import threading
+import traceback
+import multiprocessing
+from typing import Dict, List, Optional, Tuple
+
+from data.config import Config
+from src.core.PolyEngine import Buttons, Notifier, definition_wallets, monitor_factory
+from src.core.PolyScrapper import PolyScrapper
+from src.core.PolyOrders import clob_pool
+from src.core.PolyMarkets import market_meta
+from src.core.PolySupervisor import MonitorLimitError, MonitorSupervisor, check_limits
+from src.core.PolyShutdown import CLOSE_RESERVE, Inflight, Shutdown
+from src.core.PolyExits import exits
+from src.core.PolyConsensus import consensus
+
+
+def shard_of(definition: Dict, workers: int) -> int:
+    """
+    Номер воркера для монитора: стабильный хеш кошелька лидера.
+
+    Мониторы одного лидера попадают в один процесс и делят там
+    HTTP-кеши и хаб консенсуса.
+    """
+    wallets = sorted(wallet.lower() for wallet in definition_wallets(definition) if wallet)
+    key = wallets[0] if wallets else ""
+    return zlib.crc32(key.encode()) % workers
+
+
+# ------------------------------------------------------------------ воркер
+
+class QueueNotifier(Notifier):
+    """Уведомления из воркера: событие в очередь, отправляет процесс бота."""
+
+    def __init__(self, events):
+        self.events = events
+
+    async def send(self, tg_id: int, text: str, parse_mode: Optional[str] = None, buttons: Optional[Buttons] = None):
+        self.events.put(("notify", tg_id, text, parse_mode, buttons))
+
+
+def worker_main(index: int, workers: int, commands, events):
+    """Точка входа процесса-воркера (spawn)."""
+    try:
+        asyncio.run(_worker(index, workers, commands, events))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _worker(index: int, workers: int, commands, events):
+    """
+    Цикл воркера: свой event loop, своя БД, свой супервизор.
+
+    Команды: (request_id, command, args); (0, "shutdown", (budget,)) - остановка
+    с бюджетом budget секунд, None - остановка с бюджетом по умолчанию.
+    Ответы: ("reply", request_id, error, result).
+    """
+    from db.database import database
+
+    await database.setup()
+    repo = database.get()
+
+    supervisor = MonitorSupervisor(
+        max_monitors=Config.MAX_MONITORS,
+        max_per_user=Config.MAX_MONITORS_PER_USER,
+    )
+    supervisor.setup(repo, monitor_factory(repo, QueueNotifier(events), supervisor))
+    supervisor.on_exit = lambda monitor_id: events.put(("exited", index, monitor_id))
+
+    async def handle(request_id: int, command: str, args: Tuple):
+        error, result = None, None
+        try:
+            if command == "start":
+                await supervisor.start(*args)
+                result = True
+            elif command == "stop":
+                result = await supervisor.stop(*args)
+            elif command == "status":
+                result = await supervisor.status(*args)
+            elif command == "restore":
+                accept = lambda row: shard_of(row["definition"], workers) == index
+                restored = await supervisor.restore(accept, *args)
+                result = [(monitor_id, supervisor.owners[monitor_id]) for monitor_id in restored]
+            else:
+                error = ("error", f"неизвестная команда {command}")
+        except MonitorLimitError as e:
+            error = ("limit", str(e))
+        except Exception as e:
+            traceback.print_exc()
+            error = ("error", str(e))
+        events.put(("reply", request_id, error, result))
+
+    loop = asyncio.get_running_loop()
+    # Долгая остановка монитора не задерживает остальные команды
+    handlers = Inflight("команды")
+    budget = Config.SHUTDOWN_TIMEOUT
+    print(f"⚙️ Воркер движка {index + 1}/{workers} запущен")
+    try:
+        while True:
+            message = await loop.run_in_executor(None, commands.get)
+            if message is None:
+                break
+            if message[1] == "shutdown":
+                budget = message[2][0]
+                break
+            handlers.spawn(handle(*message))
+    finally:
+        # Прием закрыт (команды больше не читаются) -> очереди -> мониторы -> соединения
+        shutdown = Shutdown(budget)
+        await shutdown.drain(handlers, CLOSE_RESERVE)
+        await shutdown.monitors(supervisor.shutdown)
+        await shutdown.drain(exits.inflight, CLOSE_RESERVE)
+        await shutdown.drain(consensus.inflight, CLOSE_RESERVE)
+        await shutdown.step("пул CLOB", clob_pool.close, timeout=CLOSE_RESERVE)
+        await shutdown.step("HTTP-сессии", PolyScrapper.close_shared, timeout=CLOSE_RESERVE)
+        await shutdown.step("метаданные CLOB", market_meta.close, timeout=CLOSE_RESERVE)
+        await shutdown.step("БД", database.close, timeout=CLOSE_RESERVE)
+        shutdown.report(f"Воркер движка {index + 1}/{workers} остановлен")
+
+
+# ------------------------------------------------------------------ процесс бота
+
+class EnginePool:
+    """
+    Мониторы в N процессах-воркерах, шардированных по хешу кошелька лидера.
+
+    - Процесс бота держит только реестр monitor_id -> (tg_id, воркер)
+      и проверяет лимиты; опрос, подпись ордеров и чекпоинты идут в воркерах
+    - IPC: очередь команд на воркер и общая очередь событий
+      (ответы, уведомления, завершение мониторов)
+    - Упавший воркер перезапускается и поднимает свой шард из БД
+    - Интерфейс совпадает с MonitorSupervisor (start/stop/status/restore/shutdown)
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_monitors: int = 500,
+        max_per_user: int = 1,
+        reply_timeout: float = 30.0,
+        watch_interval: float = 5.0,
+    ):
+        """
+        Args:
+            workers: число процессов-воркеров
+            max_monitors: лимит мониторов на все воркеры
+            max_per_user: лимит мониторов на пользователя
+            reply_timeout: сколько ждать ответа воркера
+            watch_interval: период проверки живости воркеров
+        """
+        self.workers = workers
+        self.max_monitors = max_monitors
+        self.max_per_user = max_per_user
+        self.reply_timeout = reply_timeout
+        self.watch_interval = watch_interval
+
+        self.repo = None
+        self.notifier: Optional[Notifier] = None
+
+        self.context = multiprocessing.get_context("spawn")
+        self.events = self.context.Queue()
+        self.commands: List = []
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * workers
+
+        self.owners: Dict[str, int] = {}
+        self.shards: Dict[str, int] = {}
+        self.pending: Dict[int, asyncio.Future] = {}
+        # Уведомления из воркеров в процессе отправки (дренируются при остановке)
+        self.notifications = Inflight("уведомления")
+        self.request_ids = itertools.count(1)
+        self.shutting_down = False
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.reader: Optional[threading.Thread] = None
+        self.watch_task: Optional[asyncio.Task] = None
+
+    def setup(self, repo, notifier: Notifier):
+        """
+        Args:
+            repo: репозиторий БД процесса бота (удаление определений)
+            notifier: отправка уведомлений из воркеров
+        """
+        self.repo = repo
+        self.notifier = notifier
+
+    def _spawn(self, index: int):
+        commands = self.context.Queue()
+        process = self.context.Process(
+            target=worker_main,
+            args=(index, self.workers, commands, self.events),
+            name=f"engine-{index}",
+            daemon=True,
+        )
+        process.start()
+        if index < len(self.commands):
+            self.commands[index] = commands
+        else:
+            self.commands.append(commands)
+        self.processes[index] = process
+
+    def _read_events(self):
+        """Поток чтения очереди событий: события передаются в event loop бота."""
+        while True:
+            event = self.events.get()
+            if event is None:
+                break
+            self.loop.call_soon_threadsafe(self._dispatch, event)
+
+    def _dispatch(self, event: Tuple):
+        kind = event[0]
+        if kind == "reply":
+            _, request_id, error, result = event
+            future = self.pending.pop(request_id, None)
+            if future is None or future.done():
+                return
+            if error is None:
+                future.set_result(result)
+            elif error[0] == "limit":
+                future.set_exception(MonitorLimitError(error[1]))
+            else:
+                future.set_exception(RuntimeError(error[1]))
+
+        elif kind == "notify":
+            _, tg_id, text, parse_mode, buttons = event
+            self.notifications.spawn(self._notify(tg_id, text, parse_mode, buttons))
+
+        elif kind == "exited":
+            _, index, monitor_id = event
+            if self.shards.get(monitor_id) == index:
+                self._forget(monitor_id)
+
+    async def _notify(self, tg_id: int, text: str, parse_mode: Optional[str], buttons: Optional[Buttons]):
+        try:
+            await self.notifier.send(tg_id, text, parse_mode=parse_mode, buttons=buttons)
+        except Exception as e:
+            print(f"❌ Ошибка отправки уведомления пользователю {tg_id}: {e}")
+
+    async def _request(self, index: int, command: str, *args):
+        request_id = next(self.request_ids)
+        future = self.loop.create_future()
+        self.pending[request_id] = future
+        self.commands[index].put((request_id, command, args))
+        try:
+            return await asyncio.wait_for(future, self.reply_timeout)
+        finally:
+            self.pending.pop(request_id, None)
+
+    def _register(self, monitor_id: str, tg_id: int, index: int):
+        self.owners[monitor_id] = tg_id
+        self.shards[monitor_id] = index
+
+    def _forget(self, monitor_id: str):
+        self.owners.pop(monitor_id, None)
+        self.shards.pop(monitor_id, None)
+
+    async def start(
+        self,
+        monitor_id: str,
+        tg_id: int,
+        definition: Dict,
+        expires_at: float,
+    ):
+        """
+        Запускает монитор в воркере его шарда.
+
+        Raises:
+            MonitorLimitError: превышен лимит (проверяется здесь, по всем воркерам)
+        """
+        if monitor_id in self.owners:
+            raise MonitorLimitError("монитор уже запущен")
+        check_limits(self.owners, tg_id, self.max_monitors, self.max_per_user, self.shutting_down)
+
+        index = shard_of(definition, self.workers)
+        # Регистрируем до ответа, чтобы параллельный запуск не обошел лимит
+        self._register(monitor_id, tg_id, index)
+        try:
+            await self._request(index, "start", monitor_id, tg_id, definition, expires_at)
+        except Exception:
+            self._forget(monitor_id)
+            raise
+
+    async def stop(self, monitor_id: str) -> bool:
+        """Остановка пользователем: отмена в воркере и удаление определения."""
+        index = self.shards.get(monitor_id)
+        if index is None:
+            await self.repo.delete_monitor(monitor_id)
+            await self.repo.delete_checkpoint(monitor_id)
+            return False
+        try:
+            return await self._request(index, "stop", monitor_id)
+        finally:
+            self._forget(monitor_id)
+
+    async def status(self, monitor_id: str) -> Optional[Dict]:
+        index = self.shards.get(monitor_id)
+        if index is None:
+            return None
+        return await self._request(index, "status", monitor_id)
+
+    async def _restore_shard(self, index: int, resumed: bool = True) -> List[str]:
+        restored = await self._request(index, "restore", resumed)
+        for monitor_id, tg_id in restored:
+            self._register(monitor_id, tg_id, index)
+        return [monitor_id for monitor_id, _ in restored]
+
+    async def restore(self) -> List[str]:
+        """Запускает воркеры, каждый поднимает свой шард из БД."""
+        self.loop = asyncio.get_running_loop()
+        for index in range(self.workers):
+            self._spawn(index)
+        self.reader = threading.Thread(target=self._read_events, name="engine-events", daemon=True)
+        self.reader.start()
+
+        results = await asyncio.gather(
+            *(self._restore_shard(index) for index in range(self.workers)),
+            return_exceptions=True,
+        )
+        restored: List[str] = []
+        for index, result in enumerate(results):
+            if isinstance(result, Exception):
+                print(f"⚠️ Воркер {index} не восстановил мониторы: {result}")
+            else:
+                restored += result
+
+        self.watch_task = asyncio.create_task(self._watch())
+        print(f"⚙️ Воркеров движка: {self.workers}, восстановлено мониторов: {len(restored)}")
+        return restored
+
+    async def _watch(self):
+        """Перезапуск упавших воркеров (их мониторы поднимаются из БД)."""
+        while not self.shutting_down:
+            await asyncio.sleep(self.watch_interval)
+            for index, process in enumerate(self.processes):
+                if self.shutting_down or process is None or process.is_alive():
+                    continue
+
+                print(f"❌ Воркер {index} упал (код {process.exitcode}), перезапуск")
+                for monitor_id in [m for m, shard in self.shards.items() if shard == index]:
+                    self._forget(monitor_id)
+                self._spawn(index)
+                try:
+                    # Бот жив: уведомление о рестарте бота не нужно
+                    await self._restore_shard(index, resumed=False)
+                except Exception as e:
+                    print(f"⚠️ Воркер {index} не восстановил мониторы: {e}")
+
+    async def shutdown(self, timeout: float = 30.0) -> Dict:
+        """
+        Останавливает воркеры (определения остаются в БД) и дожидается их.
+
+        Каждый воркер дренирует свои мониторы и очереди с бюджетом timeout
+        за вычетом резерва на закрытие; не уложившиеся завершаются terminate.
+        Уведомления, отправленные воркерами до выхода, остаются в self.notifications.
+
+        Returns:
+            Dict: {"workers": всего, "terminated": завершено принудительно}
+        """
+        self.shutting_down = True
+        if self.watch_task is not None:
+            self.watch_task.cancel()
+
+        processes = [process for process in self.processes if process is not None]
+        budget = max(0.0, timeout - CLOSE_RESERVE)
+        for commands in self.commands:
+            commands.put((0, "shutdown", (budget,)))
+
+        terminated = 0
+        deadline = time.monotonic() + timeout
+        for process in processes:
+            await asyncio.to_thread(process.join, max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                print(f"⚠️ Воркер {process.name} не остановился за {timeout:.0f}s, terminate")
+                process.terminate()
+                terminated += 1
+
+        if self.reader is not None:
+            # Все события воркеров уже в очереди перед None: читатель передаст их в цикл
+            self.events.put(None)
+            await asyncio.to_thread(self.reader.join, 5)
+            await asyncio.sleep(0)
+        print(f"✅ Остановлено воркеров движка: {len(processes)}")
+        return {"workers": len(processes), "terminated": terminated}
@@ -1,5 +1,5 @@
 import time
-from typing import Tuple, Dict
+from typing import Tuple, Dict, List
 from fake_useragent import FakeUserAgent
 
 class DataCreator:
@@ -48,15 +48,19 @@ class DataCreator:
             offset: str,
             limit="50", 
             sortBy: str | None = 'CASHPNL',
+            market: str | None = None,
+            sizeThreshold: str = '.5',
     ) -> Tuple[Dict[str, str], Dict[str, str]] :
         params = {
             'user': address,
-            'sizeThreshold': '.5',
+            'sizeThreshold': sizeThreshold,
             'limit': limit,
             'offset': offset,
             'sortBy':sortBy,
             'sortDirection': 'DESC',
         }
+        if market:
+            params['market'] = market
         headers = {
             'accept': 'application/json',
             'origin': 'https://polymarket.com',
@@ -78,4 +82,47 @@ class DataCreator:
             'market': condition_id,
             'fidelity': '60',
         }
-        return params, headers
\ No newline at end of file
+        return params, headers
+
+    def create_midpoints_request_data(
+            self,
+            token_ids: List[str]
+    ) -> Tuple[List[Dict[str, str]], Dict[str, str]]:
+        headers = {
+            'accept': 'application/json',
+            'origin': 'https://polymarket.com',
+            'user-agent': FakeUserAgent().random,
+        }
+        body = [{'token_id': str(token_id)} for token_id in token_ids]
+        return body, headers
+
+    def create_trades_request_data(
+            self,
+            limit: str = '500',
+            offset: str = '0',
+    ) -> Tuple[Dict[str, str], Dict[str, str]]:
+        headers = {
+            'accept': 'application/json',
+            'origin': 'https://polymarket.com',
+            'user-agent': FakeUserAgent().random,
+        }
+        params = {
+            'limit': limit,
+            'offset': offset,
+            'takerOnly': 'true',
+        }
+        return params, headers
+
+    def create_book_request_data(
+            self,
+            token_id: str
+    ) -> Tuple[Dict[str, str], Dict[str, str]]:
+        headers = {
+            'accept': 'application/json',
+            'origin': 'https://polymarket.com',
+            'user-agent': FakeUserAgent().random,
+        }
+        params = {
+            'token_id': str(token_id),
+        }
+        return params, headers
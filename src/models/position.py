@@ -9,4 +9,7 @@ class Position(BaseModel):
     conditionId: str
     usdcSize: int | float
 
-    
\ No newline at end of file
+    side: str = "BUY"              # BUY / SELL / REDEEM
+    size: float | None = None      # количество шейров в сделке
+    timestamp: int | None = None
+    transactionHash: str | None = None
@@ -9,6 +9,16 @@ class Settings(BaseModel):
 
     min_quote: float          # минимальная цена котировки рынка
     max_quote: float          # максимальная цена котировки рынка
+    rule: str | None = None   # правило фильтрации, см. src/core/PolyRules.py
 
-    sl_percent: float = None   # Stop_loss: например -25%
-    tp_percent: float = None   # Take_profit: например +40%
\ No newline at end of file
+    sl_percent: float | None = None   # Stop_loss: например -25%
+    tp_percent: float | None = None   # Take_profit: например +40%
+    trailing_percent: float | None = None  # трейлинг-стоп: отступ от пика цены в %
+    max_hold: int | None = None     # тайм-стоп: максимальное время удержания позиции в секундах
+    sl_tp_interval: float = 5  # период сверки SL/TP с позициями аккаунта в секундах
+    fill_window: float = 3     # окно склейки частичных исполнений лидера в секундах (0 - выкл)
+    stale_after: float = 15    # с какой задержки от сделки лидера (сек) уменьшать размер копии
+    max_staleness: float | None = 60  # задержка (сек), после которой сигнал пропускается (None - без ограничения)
+
+    consensus_k: int | None = None  # консенсус-режим: сигнал, когда k кошельков купили один исход
+    consensus_window: int = 600    # окно консенсуса в секундах
\ No newline at end of file
@@ -10,7 +10,7 @@ async def get_github_last_commit(
     Fetch the latest commit info from GitHub
     Returns: (commit_hash, commit_date, commit_message)
     """
-    async with aiohttp.ClientSession() as session:
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
         try:
             headers = {
                 "Accept": "application/vnd.github.v3+json",
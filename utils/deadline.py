@@ -0,0 +1,151 @@
+import time
+import asyncio
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Awaitable, Coroutine, Dict, Iterator, Optional
+
+import aiohttp
+
+# Абсолютный дедлайн (time.monotonic) текущего тика монитора или апдейта Telegram.
+# contextvars протекают в дочерние задачи и в asyncio.to_thread (вызовы ClobClient)
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Бюджет вызывающего (тика, апдейта) исчерпан: повторять вызов бессмысленно."""
+
+
+class TimeoutMetrics:
+    """
+    Таймауты по областям (data-api, clob, charts, ...) и причинам:
+    deadline - кончился бюджет вызывающего, timeout - лимит самого вызова.
+    """
+
+    REASONS = ("deadline", "timeout")
+
+    def __init__(self):
+        self.scopes: Dict[str, Dict[str, int]] = {}
+
+    def inc(self, scope: str, reason: str):
+        counters = self.scopes.get(scope)
+        if counters is None:
+            counters = self.scopes[scope] = dict.fromkeys(self.REASONS, 0)
+        counters[reason] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        return {scope: dict(counters) for scope, counters in self.scopes.items()}
+
+
+timeout_metrics = TimeoutMetrics()
+
+
+@contextmanager
+def deadline(seconds: float, root: bool = False) -> Iterator[float]:
+    """
+    Дедлайн для всего, что вызывается внутри блока.
+
+    Вложенный дедлайн не может быть позже внешнего.
+
+    Args:
+        seconds: бюджет в секундах
+        root: новый корень (тик монитора, апдейт Telegram, итерация фонового цикла):
+              дедлайн, унаследованный от создателя задачи, не учитывается
+    """
+    expires = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None and not root:
+        expires = min(expires, current)
+    token = _deadline.set(expires)
+    try:
+        yield expires
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Остаток бюджета в секундах (None - дедлайна нет)."""
+    expires = _deadline.get()
+    return None if expires is None else expires - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def timeout_for(scope: str, default: float) -> float:
+    """
+    Таймаут одного вызова: собственный лимит, урезанный до остатка дедлайна.
+
+    Raises:
+        DeadlineExceeded: бюджет уже исчерпан (вызов не начинается)
+    """
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        timeout_metrics.inc(scope, "deadline")
+        raise DeadlineExceeded(f"{scope}: дедлайн истек")
+    return min(default, left)
+
+
+def client_timeout(scope: str, default: float) -> aiohttp.ClientTimeout:
+    """ClientTimeout для запроса aiohttp с учетом дедлайна."""
+    return aiohttp.ClientTimeout(total=timeout_for(scope, default))
+
+
+class TimeoutScope:
+    """
+    Учет причины таймаута вызова в timeout_metrics (with и async with).
+    Таймаут после истечения дедлайна поднимается как DeadlineExceeded.
+
+    async with TimeoutScope("data-api"), session.get(..., timeout=client_timeout(...)) as response:
+        ...
+    """
+
+    __slots__ = ("scope",)
+
+    def __init__(self, scope: str):
+        self.scope = scope
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None or not issubclass(exc_type, asyncio.TimeoutError):
+            return False
+        if issubclass(exc_type, DeadlineExceeded):
+            return False
+        if expired():
+            timeout_metrics.inc(self.scope, "deadline")
+            raise DeadlineExceeded(f"{self.scope}: дедлайн истек") from exc
+        timeout_metrics.inc(self.scope, "timeout")
+        return False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+async def call(scope: str, awaitable: Awaitable[Any], default: float) -> Any:
+    """await с таймаутом timeout_for(scope, default); по таймауту вызов отменяется."""
+    try:
+        timeout = timeout_for(scope, default)
+    except DeadlineExceeded:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise
+    with TimeoutScope(scope):
+        return await asyncio.wait_for(awaitable, timeout)
+
+
+def detached(coro: Coroutine, name: Optional[str] = None) -> asyncio.Task:
+    """
+    Долгоживущая фоновая задача без дедлайна создателя
+    (иначе цикл, запущенный из апдейта или тика, унаследует его истекший дедлайн).
+    """
+    context = contextvars.copy_context()
+    context.run(_deadline.set, None)
+    return asyncio.get_running_loop().create_task(coro, name=name, context=context)
@@ -1,47 +1,232 @@
+import time
+import random
 import asyncio
+import aiohttp
+from collections import deque
+from email.utils import parsedate_to_datetime
 from functools import wraps
-from typing import TypeVar, Callable, Any
+from typing import TypeVar, Callable, Any, Deque, Dict, Optional, Type
 
 from utils.customprint import CustomPrint
+from utils.deadline import DeadlineExceeded, remaining
 from data.config import Config
 
 T = TypeVar("T")
 
+# Решения политики повторов
+RETRY = "retry"
+FATAL = "fatal"
+
+# Исключение -> решение (проверяется по isinstance, первое совпадение).
+# Ошибки программы не повторяются: повтор не исправит KeyError.
+EXCEPTION_POLICIES: Dict[Type[BaseException], str] = {
+    DeadlineExceeded: FATAL,
+    asyncio.TimeoutError: RETRY,
+    aiohttp.ServerDisconnectedError: RETRY,
+    aiohttp.ClientConnectionError: RETRY,
+    aiohttp.ClientPayloadError: RETRY,
+    KeyError: FATAL,
+    IndexError: FATAL,
+    TypeError: FATAL,
+    ValueError: FATAL,
+    AttributeError: FATAL,
+}
+
+# HTTP-статусы, которые имеет смысл повторять
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+_printer = CustomPrint()
+
+
+def classify(error: BaseException) -> str:
+    """Решение о повторе по исключению (RETRY / FATAL)."""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return RETRY if error.status in RETRYABLE_STATUSES else FATAL
+    for exc_type, decision in EXCEPTION_POLICIES.items():
+        if isinstance(error, exc_type):
+            return decision
+    return RETRY
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Пауза из заголовка Retry-After (секунды или HTTP-дата), если сервер ее прислал."""
+    headers = getattr(error, "headers", None)
+    value = headers.get("Retry-After") if headers else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def raise_for_retry(response: aiohttp.ClientResponse):
+    """
+    Поднимает ClientResponseError для статусов, которые стоит повторить (429, 5xx),
+    чтобы retry_async учел Retry-After. Остальные статусы обрабатывает вызывающий.
+    """
+    if response.status in RETRYABLE_STATUSES:
+        raise aiohttp.ClientResponseError(
+            response.request_info,
+            response.history,
+            status=response.status,
+            message=response.reason or "",
+            headers=response.headers,
+        )
+
+
+class RetryBudget:
+    """
+    Бюджет повторов на хост: повторов не больше ratio от числа запросов
+    за последние window секунд (плюс min_retries, чтобы редкие запросы тоже могли повториться).
+
+    Когда API лежит, повторы всех мониторов не умножают нагрузку на него.
+    """
+
+    def __init__(self, ratio: float = 0.2, window: float = 10, min_retries: int = 3):
+        self.ratio = ratio
+        self.window = window
+        self.min_retries = min_retries
+        self.requests: Deque[float] = deque()
+        self.retries: Deque[float] = deque()
+
+    def _expire(self, now: float):
+        for events in (self.requests, self.retries):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def record_request(self):
+        now = time.monotonic()
+        self._expire(now)
+        self.requests.append(now)
+
+    def try_retry(self) -> bool:
+        now = time.monotonic()
+        self._expire(now)
+        if len(self.retries) >= self.min_retries + self.ratio * len(self.requests):
+            return False
+        self.retries.append(now)
+        return True
+
+
+class RetryMetrics:
+    """Счетчики повторов по хостам (снимок попадает в статистику мониторов)."""
+
+    FIELDS = ("calls", "retries", "succeeded_after_retry", "gave_up", "fatal", "budget_exhausted")
+
+    def __init__(self):
+        self.hosts: Dict[str, Dict[str, int]] = {}
+
+    def inc(self, host: str, field: str):
+        counters = self.hosts.get(host)
+        if counters is None:
+            counters = self.hosts[host] = dict.fromkeys(self.FIELDS, 0)
+        counters[field] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        return {host: dict(counters) for host, counters in self.hosts.items()}
+
+
+retry_metrics = RetryMetrics()
+retry_budgets: Dict[str, RetryBudget] = {}
+
+
+def _budget(host: str) -> RetryBudget:
+    budget = retry_budgets.get(host)
+    if budget is None:
+        budget = retry_budgets[host] = RetryBudget()
+    return budget
+
+
+def _next_delay(previous: float, base: float, cap: float) -> float:
+    """Decorrelated jitter: случайная пауза между base и 3x предыдущей, не больше cap."""
+    return min(cap, random.uniform(base, previous * 3))
+
+
 def retry_async(
-    attempts: int = None,  
+    attempts: int = None,
     delay: float = 1.0,
     backoff: float = 2.0,
     default_value: Any = None,
+    host: str = "default",
+    max_delay: float = 30.0,
+    classifier: Callable[[BaseException], str] = classify,
 ):
     """
-    Async retry decorator with exponential backoff.
-    If attempts is not provided, uses SETTINGS.ATTEMPTS from config.
+    Async retry decorator с decorrelated jitter.
+
+    - Повторяются только ошибки, которые classifier считает временными (RETRY)
+    - Retry-After из ответа сервера важнее собственной паузы
+    - Повторы ограничены бюджетом хоста (RetryBudget), счетчики - в retry_metrics
+    - Пауза, не укладывающаяся в дедлайн вызывающего (utils.deadline), не делается
+    If attempts is not provided, uses Config.ATTEMPTS.
+
+    Args:
+        delay: минимальная пауза перед повтором
+        backoff: множитель для верхней границы первой паузы (delay * backoff)
+        host: ключ бюджета и метрик (например, "data-api")
+        max_delay: потолок паузы (и Retry-After)
     """
     def decorator(func: Callable[..., T]) -> Callable[..., T]:
         @wraps(func)
         async def wrapper(*args, **kwargs):
             retry_attempts = attempts if attempts is not None else Config.ATTEMPTS
-            current_delay = delay
+            budget = _budget(host)
+            current_delay = delay * max(1.0, backoff) / 3
 
             for attempt in range(retry_attempts):
+                retry_metrics.inc(host, "calls")
+                budget.record_request()
                 try:
-                    return await func(*args, **kwargs)
+                    result = await func(*args, **kwargs)
+                    if attempt:
+                        retry_metrics.inc(host, "succeeded_after_retry")
+                    return result
                 except Exception as e:
-                    if attempt < retry_attempts - 1:  
-                        CustomPrint().warning(
-                            f"Attempt {attempt + 1}/{retry_attempts} failed for {func.__name__}: {str(e)}. "
-                            f"Retrying in {current_delay:.1f} seconds..."
-                        )
-                        await asyncio.sleep(current_delay)
-                        current_delay *= backoff
-                    else:
-                        CustomPrint().warning(
+                    if classifier(e) == FATAL:
+                        retry_metrics.inc(host, "fatal")
+                        raise
+
+                    if attempt >= retry_attempts - 1:
+                        retry_metrics.inc(host, "gave_up")
+                        _printer.warning(
                             f"All {retry_attempts} attempts failed for {func.__name__}: {str(e)}"
                         )
-                        raise e
+                        raise
+
+                    if not budget.try_retry():
+                        retry_metrics.inc(host, "budget_exhausted")
+                        _printer.warning(
+                            f"Retry budget for {host} exhausted, {func.__name__} failed: {str(e)}"
+                        )
+                        raise
+
+                    current_delay = _next_delay(current_delay, delay, max_delay)
+                    server_delay = retry_after(e)
+                    if server_delay is not None:
+                        current_delay = min(max_delay, max(current_delay, server_delay))
+
+                    left = remaining()
+                    if left is not None and left <= current_delay:
+                        retry_metrics.inc(host, "gave_up")
+                        _printer.warning(
+                            f"Deadline leaves no time to retry {func.__name__}: {str(e)}"
+                        )
+                        raise
+
+                    retry_metrics.inc(host, "retries")
+                    _printer.warning(
+                        f"Attempt {attempt + 1}/{retry_attempts} failed for {func.__name__}: {str(e)}. "
+                        f"Retrying in {current_delay:.1f} seconds..."
+                    )
+                    await asyncio.sleep(current_delay)
 
             return default_value
 
         return wrapper
 
-    return decorator
\ No newline at end of file
+    return decorator